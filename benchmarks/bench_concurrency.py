@@ -0,0 +1,25 @@
+"""Wall time of running many short commands with N concurrent
+runners through `Cmd2Func.map`."""
+import time
+
+from common import NullWriter, python_cmd
+from cmd2func import cmd2func
+
+
+def run(quick: bool = False) -> dict:
+    n_items = 16 if quick else 128
+    sink = NullWriter()
+    func = cmd2func(
+        python_cmd("import time; time.sleep({t})"),
+        print_cmd=False, out_stream=sink, err_stream=sink)
+    results = {}
+    for n_workers in (1, 2, 4, 8, 16):
+        t0 = time.perf_counter()
+        res = func.map([0.05] * n_items, max_workers=n_workers)
+        elapsed = time.perf_counter() - t0
+        assert all(r.ret == 0 for r in res)
+        results[f"workers_{n_workers}"] = {
+            "seconds": elapsed,
+            "commands_per_sec": n_items / elapsed,
+        }
+    return results
@@ -0,0 +1,42 @@
+"""Peak RSS of the parent when the consumer of the stream is slow.
+Each measurement runs in a fresh interpreter, which reports its own
+max RSS."""
+import sys
+import json
+import subprocess as subp
+
+import common
+
+
+CONSUMER = """
+import sys, time, json, resource
+sys.path.insert(0, {root!r})
+from cmd2func.runner import RUNNERS
+base = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+runner = RUNNERS[{runner!r}]({cmd!r})
+runner.run()
+for i, _ in enumerate(runner.stream()):
+    if i % 100 == 0:
+        time.sleep({delay})
+peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({{"base_kb": base, "peak_kb": peak}}))
+"""
+
+
+def run(quick: bool = False) -> dict:
+    if sys.platform == "win32":  # pragma: no cover
+        return {}
+    n_lines = 20_000 if quick else 500_000
+    cmd = common.producer_cmd(n_lines, 1024)
+    results = {}
+    for runner in ("thread", "selector"):
+        code = CONSUMER.format(
+            root=common.ROOT, runner=runner, cmd=cmd, delay=0.002)
+        out = subp.check_output([sys.executable, "-c", code])
+        res = json.loads(out)
+        # ru_maxrss is in KiB on Linux, bytes on macOS
+        if sys.platform == "darwin":  # pragma: no cover
+            res = {k: v // 1024 for k, v in res.items()}
+        res["growth_kb"] = res["peak_kb"] - res["base_kb"]
+        results[runner] = res
+    return results
@@ -0,0 +1,57 @@
+"""Time from `Cmd2Func.__call__` to `Popen` for the string,
+decorator and generator forms. The runner stops right before spawning,
+so only the Python side overhead is measured."""
+import time
+import typing as T
+
+import common  # noqa: F401
+from cmd2func import cmd2func
+from cmd2func.runner import ProcessRunner
+
+
+class _StopBeforeSpawn(Exception):
+    pass
+
+
+class TimingRunner(ProcessRunner):
+    spawn_time = 0.0
+
+    def popen(self, *args, **kwargs):
+        TimingRunner.spawn_time = time.perf_counter()
+        raise _StopBeforeSpawn()
+
+
+def _measure(func: T.Callable, number: int) -> float:
+    times = []
+    for _ in range(number):
+        t0 = time.perf_counter()
+        try:
+            func(1, 2)
+        except _StopBeforeSpawn:
+            pass
+        times.append(TimingRunner.spawn_time - t0)
+    times.sort()
+    return times[len(times) // 2] * 1e6
+
+
+def run(quick: bool = False) -> dict:
+    number = 200 if quick else 20000
+    kwargs = dict(print_cmd=False, runner=TimingRunner)
+    string_form = cmd2func("tool -a {a} -b {b}", **kwargs)
+
+    @cmd2func(**kwargs)
+    def decorator_form(a, b):
+        return f"tool -a {a} -b {b}"
+
+    @cmd2func(**kwargs)
+    def generator_form(a, b):
+        yield f"tool -a {a} -b {b}"
+
+    return {
+        name + "_median_us": _measure(func, number)
+        for name, func in (
+            ("string", string_form),
+            ("decorator", decorator_form),
+            ("generator", generator_form),
+        )
+    }
@@ -0,0 +1,64 @@
+"""Spawn latency (time spent in Popen) from a parent with a large heap,
+with the default spawn path and the `fast_spawn` path.
+
+The measurement runs in a fresh interpreter which allocates and touches
+`heap_mb` MiB before spawning.
+
+Usage: python benchmarks/bench_spawn.py [--heap-mb N] [--number N]
+"""
+import sys
+import json
+import argparse
+import subprocess as subp
+
+import common
+from cmd2func.runner import ProcessRunner
+
+
+PAGE = 4096
+
+
+def measure(heap_mb: int, number: int) -> dict:
+    heap = bytearray(heap_mb * 1024 * 1024)
+    for i in range(0, len(heap), PAGE):
+        heap[i] = 1  # touch the pages, so they are resident
+    cmd = common.python_cmd("pass")
+    results = {"heap_mb": heap_mb}
+    for name, fast_spawn in (("default", False), ("fast_spawn", True)):
+        latencies = []
+        for _ in range(number):
+            runner = ProcessRunner(cmd)
+            runner.run(
+                capture_stdout=False, capture_stderr=False,
+                fast_spawn=fast_spawn)
+            runner.wait()
+            latencies.append(runner.stats.spawn_latency)
+        latencies.sort()
+        results[name + "_median_ms"] = latencies[len(latencies) // 2] * 1e3
+    return results
+
+
+def run(quick: bool = False, heap_mb: int = 0, number: int = 0) -> dict:
+    heap_mb = heap_mb or (64 if quick else 2048)
+    number = number or (5 if quick else 50)
+    out = subp.check_output([
+        sys.executable, __file__, "--child",
+        "--heap-mb", str(heap_mb), "--number", str(number)])
+    return json.loads(out)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--heap-mb", type=int, default=2048)
+    parser.add_argument("--number", type=int, default=50)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        res = measure(args.heap_mb, args.number)
+    else:
+        res = run(heap_mb=args.heap_mb, number=args.number)
+    print(json.dumps(res, indent=2))
+
+
+if __name__ == "__main__":
+    main()
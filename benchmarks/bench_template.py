@@ -0,0 +1,85 @@
+"""Microbenchmark of the per-call cost of formatting a command string,
+before (parse_pass_in + replace_vals + Command.format) and after
+(CompiledTemplate.render), the per-row cost of the bulk rendering
+(render_bulk on a dict of columns), and the cost of compiling a template
+with and without the template cache.
+
+Usage: python benchmarks/bench_template.py [--number N]
+"""
+import argparse
+import json
+import timeit
+import typing as T
+
+import common  # noqa: F401
+from cmd2func.template import (
+    CompiledTemplate, compile_template, replace_vals
+)
+from cmd2func.bulk import render_bulk
+
+
+TEMPLATE = "tool {verbose} --threads {threads} -i {input} -o {output}"
+CONFIG = {
+    "inputs": {
+        "verbose": {
+            "type": "bool",
+            "true_insert": "-v",
+            "false_insert": "",
+        },
+        "threads": {
+            "type": "int",
+            "default": 4,
+        },
+    },
+    "inputs_order": ["input", "output", "threads", "verbose"],
+}
+
+
+def run(quick: bool = False, number: T.Optional[int] = None) -> dict:
+    number = number or (2000 if quick else 100000)
+    tpl = CompiledTemplate(TEMPLATE, CONFIG)
+    call_args = ("in.txt", "out.txt")
+    call_kwargs = {"verbose": True}
+
+    def legacy():
+        vals = tpl.desc.parse_pass_in(call_args, call_kwargs)
+        vals = replace_vals(vals, tpl.desc)
+        return tpl.command.format(vals)
+
+    def compiled():
+        return tpl.render(call_args, call_kwargs)
+
+    assert legacy() == compiled()
+    results = {}
+    for name, func in (("legacy", legacy), ("compiled", compiled)):
+        t = min(timeit.repeat(func, number=number, repeat=5))
+        results[name + "_us_per_call"] = t / number * 1e6
+    results["speedup"] = \
+        results["legacy_us_per_call"] / results["compiled_us_per_call"]
+    columns = {
+        "input": ["in.txt"] * number, "output": ["out.txt"] * number,
+        "verbose": [True] * number,
+    }
+    assert next(render_bulk(tpl, columns)) == compiled()
+    t = min(timeit.repeat(
+        lambda: sum(1 for _ in render_bulk(tpl, columns)),
+        number=1, repeat=5))
+    results["bulk_us_per_row"] = t / number * 1e6
+    n = max(number // 100, 1)
+    for name, func in (
+            ("compile", lambda: CompiledTemplate(TEMPLATE, CONFIG)),
+            ("compile_cached", lambda: compile_template(TEMPLATE, CONFIG))):
+        t = min(timeit.repeat(func, number=n, repeat=5))
+        results[name + "_us_per_call"] = t / n * 1e6
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--number", type=int, default=100000)
+    args = parser.parse_args()
+    print(json.dumps(run(number=args.number), indent=2))
+
+
+if __name__ == "__main__":
+    main()
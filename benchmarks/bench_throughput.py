@@ -0,0 +1,39 @@
+"""Lines/sec and MB/sec through `write_stream_until_stop`,
+for small-line and long-line outputs, and a single line of 40 MB
+read in many chunks, with each runner."""
+import time
+
+from common import NullWriter, producer_cmd
+from cmd2func.runner import RUNNERS
+
+
+CASES = {
+    # name: (n_lines, line_size)
+    "small_lines": (2_000_000, 16),
+    "long_lines": (20_000, 16384),
+    "one_line": (1, 40 << 20),
+}
+
+
+def run(quick: bool = False) -> dict:
+    results = {}
+    for case, (n_lines, line_size) in CASES.items():
+        if quick and (n_lines >= 100):
+            n_lines //= 100
+        elif quick:
+            line_size //= 100
+        cmd = producer_cmd(n_lines, line_size)
+        for runner_name, runner_cls in RUNNERS.items():
+            sink = NullWriter()
+            t0 = time.perf_counter()
+            runner = runner_cls(cmd)
+            runner.run()
+            ret = runner.write_stream_until_stop(sink, sink)
+            elapsed = time.perf_counter() - t0
+            assert ret == 0
+            results[f"{case}_{runner_name}"] = {
+                "seconds": elapsed,
+                "lines_per_sec": n_lines / elapsed,
+                "mb_per_sec": n_lines * line_size / elapsed / 1e6,
+            }
+    return results
@@ -0,0 +1,36 @@
+"""Helpers shared by the benchmarks."""
+import io
+import os
+import sys
+import shlex
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+PYTHON = shlex.quote(sys.executable)
+
+
+class NullWriter(io.TextIOBase):
+    """Text sink which drop everything, to measure the runner alone."""
+    def write(self, s: str) -> int:
+        return len(s)
+
+
+def python_cmd(code: str) -> str:
+    return f"{PYTHON} -c {shlex.quote(code)}"
+
+
+def producer_cmd(n_lines: int, line_size: int) -> str:
+    """Command which write `n_lines` lines of `line_size` bytes."""
+    per_block = max(1, 65536 // line_size)
+    n_block, rest = divmod(n_lines, per_block)
+    code = (
+        "import sys\n"
+        f"line = b'x' * {line_size - 1} + b'\\n'\n"
+        "w = sys.stdout.buffer.write\n"
+        f"block = line * {per_block}\n"
+        f"for _ in range({n_block}): w(block)\n"
+        f"w(line * {rest})\n"
+    )
+    return python_cmd(code)
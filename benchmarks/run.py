@@ -0,0 +1,76 @@
+"""Run the benchmark suite and write the results as JSON.
+
+Usage:
+    python benchmarks/run.py [--quick] [--only NAME ...] [--output FILE]
+"""
+import sys
+import json
+import time
+import argparse
+import platform
+import subprocess as subp
+
+import common
+import bench_template
+import bench_overhead
+import bench_throughput
+import bench_memory
+import bench_concurrency
+import bench_spawn
+
+
+BENCHMARKS = {
+    "format": bench_template.run,
+    "overhead": bench_overhead.run,
+    "throughput": bench_throughput.run,
+    "memory": bench_memory.run,
+    "concurrency": bench_concurrency.run,
+    "spawn": bench_spawn.run,
+}
+
+
+def git_revision() -> str:
+    try:
+        out = subp.check_output(
+            ["git", "rev-parse", "HEAD"], cwd=common.ROOT,
+            stderr=subp.DEVNULL)
+        return out.decode().strip()
+    except (OSError, subp.CalledProcessError):
+        return ""
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--quick", action="store_true",
+        help="Use small sizes, for checking the suite works.")
+    parser.add_argument(
+        "--only", nargs="+", choices=list(BENCHMARKS),
+        help="Run only these benchmarks.")
+    parser.add_argument(
+        "--output", help="Write the results to this file, default stdout.")
+    args = parser.parse_args()
+
+    results = {
+        "meta": {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": sys.version,
+            "platform": platform.platform(),
+            "revision": git_revision(),
+            "quick": args.quick,
+        },
+        "benchmarks": {},
+    }
+    for name in (args.only or BENCHMARKS):
+        print(f"Running {name}...", file=sys.stderr)
+        results["benchmarks"][name] = BENCHMARKS[name](args.quick)
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
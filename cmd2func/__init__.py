@@ -3,7 +3,31 @@ __email__ = 'vet.xwz@gmail.com'
 __version__ = '0.2.1'
 
 
-from .core import cmd2func
+__all__ = ["cmd2func", "pipeline"]
 
+# The public names are imported from their modules on first access,
+# so `import cmd2func` does not import funcdesc, subprocess, asyncio...
+_LAZY_ATTRS = {
+    "cmd2func": ".core",
+    "pipeline": ".compose",
+}
 
-__all__ = ["cmd2func"]
+
+def __getattr__(name: str):
+    if name in _LAZY_ATTRS:
+        import importlib
+        module = importlib.import_module(_LAZY_ATTRS[name], __name__)
+        value = getattr(module, name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
+
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:  # pragma: no cover
+    from .core import cmd2func
+    from .compose import pipeline
@@ -0,0 +1,127 @@
+import os
+import time
+import typing as T
+from collections import deque
+from concurrent.futures import (
+    ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+)
+from threading import Lock
+
+from .utils import PrefixedWriter
+
+if T.TYPE_CHECKING:  # pragma: no cover
+    from .core import Cmd2Func
+
+
+SinkFactory = T.Callable[[int, T.Any], T.TextIO]
+SinkSpec = T.Union[T.TextIO, SinkFactory]
+
+
+class MapResult(T.NamedTuple):
+    """Result of one item of `Cmd2Func.map` / `Cmd2Func.imap`."""
+    idx: int
+    item: T.Any
+    ret: T.Any
+    start: float
+    elapsed: float
+
+
+def split_item(item: T.Any) -> T.Tuple[tuple, dict]:
+    """Convert an item of the map iterable to (args, kwargs).
+    dict is used as keyword arguments, tuple or list as positional
+    arguments, other objects as the only positional argument."""
+    if isinstance(item, dict):
+        return (), item
+    elif isinstance(item, (tuple, list)):
+        return tuple(item), {}
+    else:
+        return (item,), {}
+
+
+class _SinkMaker(object):
+    """Create the output stream for each item."""
+    def __init__(
+            self, sink: T.Optional[SinkSpec],
+            default: T.TextIO, prefix: T.Optional[str]):
+        self.sink = sink
+        self.default = default
+        self.prefix = prefix
+        self.lock = Lock()
+
+    def __call__(self, index: int, item: T.Any) -> T.TextIO:
+        if callable(self.sink):
+            return self.sink(index, item)
+        file = self.sink or self.default
+        if self.prefix is None:
+            return file
+        prefix = self.prefix.format(index=index, item=item)
+        return T.cast(T.TextIO, PrefixedWriter(file, prefix, self.lock))
+
+
+def imap(
+        func: "Cmd2Func",
+        iterable: T.Iterable[T.Any],
+        max_workers: T.Optional[int] = None,
+        ordered: bool = True,
+        out_stream: T.Optional[SinkSpec] = None,
+        err_stream: T.Optional[SinkSpec] = None,
+        prefix: T.Optional[str] = None,
+        ) -> T.Iterator[MapResult]:
+    """Run `func` over the argument sets in `iterable`
+    with at most `max_workers` commands at once.
+
+    Args:
+        func: The Cmd2Func object.
+        iterable: The argument sets, it is consumed lazily.
+            See `split_item` for how an item is passed to `func`.
+        max_workers: Max number of concurrent runs.
+            default: os.cpu_count().
+        ordered: If True, results are yielded in the order of `iterable`,
+            otherwise in the order they finish. default: True.
+        out_stream: The stream for stdout, or a callable
+            `(index, item) -> stream` to create a stream for each item.
+            default: `func.out_stream`.
+        err_stream: Same as `out_stream`, for stderr.
+        prefix: If provided, each line written to a shared stream is
+            prefixed by `prefix.format(index=index, item=item)`,
+            for example "[{index}] ". default: None.
+    """
+    max_workers = max_workers or os.cpu_count() or 1
+    make_out = _SinkMaker(out_stream, func.out_stream, prefix)
+    make_err = _SinkMaker(err_stream, func.err_stream, prefix)
+
+    def run_one(index: int, item: T.Any) -> MapResult:
+        args, kwargs = split_item(item)
+        out, err = make_out(index, item), make_err(index, item)
+        start = time.time()
+        t0 = time.perf_counter()
+        try:
+            ret = func._call(args, kwargs, out, err)
+        finally:
+            for s in (out, err):
+                if isinstance(s, PrefixedWriter):
+                    s.flush()
+        return MapResult(index, item, ret, start, time.perf_counter() - t0)
+
+    items = enumerate(iterable)
+    with ThreadPoolExecutor(max_workers) as pool:
+        pending: T.Deque[Future] = deque()
+
+        def submit():
+            while len(pending) < max_workers:
+                try:
+                    index, item = next(items)
+                except StopIteration:
+                    break
+                pending.append(pool.submit(run_one, index, item))
+
+        submit()
+        while pending:
+            if ordered:
+                yield pending.popleft().result()
+            else:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    pending.remove(fut)
+                    yield fut.result()
+            submit()
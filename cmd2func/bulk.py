@@ -0,0 +1,221 @@
+"""Render the command strings of many argument sets at once, and write
+them to a shell script or a job list for a batch system."""
+import os
+import stat
+import functools
+import itertools
+import typing as T
+
+from funcdesc.desc import NotDef
+
+from .template import CompiledTemplate, tuple_getter
+
+
+Rows = T.Iterable[T.Mapping[str, T.Any]]
+Columns = T.Mapping[str, T.Iterable[T.Any]]
+
+TRUE_STRINGS = {"true", "1", "yes", "y", "on"}
+FALSE_STRINGS = {"false", "0", "no", "n", "off", ""}
+
+
+def parse_bool(value: str) -> bool:
+    """Parse a boolean from a string, like a CSV field."""
+    lower = value.strip().lower()
+    if lower in TRUE_STRINGS:
+        return True
+    elif lower in FALSE_STRINGS:
+        return False
+    raise ValueError(f"Can not parse {value!r} as bool.")
+
+
+def _check_names(template: CompiledTemplate, names: T.Iterable[str]):
+    names = set(names)
+    unknown = names - set(template.names)
+    if unknown:
+        raise ValueError(f"Unknown columns: {sorted(unknown)}")
+    missing = [
+        n for n, d in zip(template.names, template.defaults)
+        if (d is NotDef) and (n not in names)]
+    if missing:
+        raise ValueError(f"Missing columns: {missing}")
+
+
+def _columns(
+        template: CompiledTemplate, data: T.Any,
+        ) -> T.Tuple[T.List[str], T.List[T.Iterator[T.Any]]]:
+    """The names and the iterators of the dict of columns or the record
+    array, missing columns repeat the default values."""
+    if hasattr(data, "dtype"):  # numpy structured/record array
+        columns = {n: data[n].tolist() for n in data.dtype.names}
+    else:
+        columns = data
+    _check_names(template, columns)
+    lengths = {len(c) for c in columns.values() if hasattr(c, "__len__")}
+    if len(lengths) > 1:
+        raise ValueError(f"Columns have different lengths: {lengths}")
+    names = list(columns)
+    iters = [iter(columns[n]) for n in names]
+    for name, default in zip(template.names, template.defaults):
+        if name not in columns:
+            names.append(name)
+            iters.append(itertools.repeat(default))
+    return names, iters
+
+
+def _rows(
+        template: CompiledTemplate, rows: Rows,
+        ) -> T.Tuple[T.List[str], T.Iterator[T.Sequence[T.Any]]]:
+    """The names and the value tuples of the records. Every record is
+    checked, missing columns take the default values."""
+    defaults = dict(zip(template.names, template.defaults))
+    it = iter(rows)
+    first = next(it, None)
+    if first is None:
+        return list(template.names), iter([])
+    _check_names(template, first.keys())
+    present = [n for n in template.names if n in first]
+    absent = [n for n in template.names if n not in first]
+    names = present + absent
+    getter = tuple_getter(present)
+    absent_defaults = tuple(defaults[n] for n in absent)
+
+    def values() -> T.Iterator[T.Sequence[T.Any]]:
+        for row in itertools.chain([first], it):
+            # same number of keys and all present ones: same columns
+            if len(row) == len(present):
+                try:
+                    yield getter(row) + absent_defaults
+                    continue
+                except KeyError:
+                    pass
+            _check_names(template, row.keys())
+            yield tuple(row[n] if n in row else defaults[n] for n in names)
+
+    return names, values()
+
+
+def _convert(
+        template: CompiledTemplate, name: str, is_bool: bool,
+        val: T.Any) -> T.Any:
+    if is_bool and isinstance(val, str):
+        val = parse_bool(val)
+    if (val is True) and (name in template.true_inserts):
+        return template.true_inserts[name]
+    if (val is False) and (name in template.false_inserts):
+        return template.false_inserts[name]
+    return val
+
+
+def _converters(
+        template: CompiledTemplate,
+        ) -> T.List[T.Tuple[str, T.Callable[[T.Any], T.Any]]]:
+    """Per-argument value conversions: parse string booleans
+    (from CSV) and apply `true_insert`/`false_insert`."""
+    convs: T.List[T.Tuple[str, T.Callable[[T.Any], T.Any]]] = []
+    inputs = template.config["inputs"]
+    for name in template.names:
+        is_bool = inputs[name].get("type") == "bool"
+        if is_bool or (name in template.true_inserts) or \
+                (name in template.false_inserts):
+            convs.append((
+                name, functools.partial(_convert, template, name, is_bool)))
+    return convs
+
+
+def render_bulk(
+        template: CompiledTemplate,
+        data: T.Union[Columns, Rows, T.Any],
+        ) -> T.Iterator[str]:
+    """Lazily render the command strings of many argument sets.
+    The columns are checked and the conversions are set up once,
+    so each row only fills the printf-style pattern of the template.
+
+    Args:
+        template: The compiled template, see `compile_template`.
+        data: A dict of columns (lists or iterables), a numpy record
+            array, or an iterable of records (dicts), for example the
+            rows of `csv.DictReader`.
+    """
+    convs = dict(_converters(template))
+    rows: T.Iterator[T.Sequence[T.Any]]
+    if hasattr(data, "dtype") or isinstance(data, T.Mapping):
+        names, iters = _columns(template, data)
+        for i, name in enumerate(names):
+            if name in convs:
+                iters[i] = map(convs[name], iters[i])
+        rows = zip(*iters)
+    else:
+        names, rows = _rows(template, data)
+        if convs:
+            rows = map(functools.partial(
+                _convert_row,
+                [(i, convs[n]) for i, n in enumerate(names) if n in convs]),
+                rows)
+    if template.plan is not None:
+        pattern, _, fields = template.plan
+        getter = tuple_getter([names.index(f) for f in fields])
+        for row in rows:
+            yield pattern % getter(row)
+    else:
+        for row in rows:
+            yield template.format(dict(zip(names, row)))
+
+
+def _convert_row(
+        convs: T.List[T.Tuple[int, T.Callable[[T.Any], T.Any]]],
+        row: T.Sequence[T.Any]) -> T.List[T.Any]:
+    converted = list(row)
+    for i, conv in convs:
+        converted[i] = conv(converted[i])
+    return converted
+
+
+def _open(file: T.Union[str, os.PathLike, T.TextIO]):
+    if isinstance(file, (str, os.PathLike)):
+        return open(file, "w"), True
+    return file, False
+
+
+def write_job_list(
+        cmds: T.Iterable[str],
+        file: T.Union[str, os.PathLike, T.TextIO]) -> int:
+    """Write the commands to a job list file, one per line, for example
+    for `parallel` or an array job. Return the number of commands."""
+    f, should_close = _open(file)
+    n = 0
+    try:
+        for cmd in cmds:
+            if "\n" in cmd:
+                raise ValueError(
+                    f"Command with newline can not be in a job list: {cmd!r}")
+            f.write(cmd + "\n")
+            n += 1
+    finally:
+        if should_close:
+            f.close()
+    return n
+
+
+def write_script(
+        cmds: T.Iterable[str],
+        file: T.Union[str, os.PathLike, T.TextIO],
+        shebang: str = "#!/bin/sh",
+        exit_on_error: bool = True) -> int:
+    """Write the commands to a shell script, the file is made executable
+    if it is a path. Return the number of commands."""
+    f, should_close = _open(file)
+    n = 0
+    try:
+        f.write(shebang + "\n")
+        if exit_on_error:
+            f.write("set -e\n")
+        for cmd in cmds:
+            f.write(cmd + "\n")
+            n += 1
+    finally:
+        if should_close:
+            f.close()
+    if isinstance(file, (str, os.PathLike)):
+        mode = os.stat(file).st_mode
+        os.chmod(file, mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+    return n
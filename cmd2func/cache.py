@@ -0,0 +1,178 @@
+import os
+import json
+import hashlib
+import tempfile
+import typing as T
+from io import TextIOBase
+
+
+PathLike = T.Union[str, "os.PathLike[str]"]
+TMP_PREFIX = ".tmp-"
+
+
+def fingerprint(
+        path: PathLike, hash_contents: bool = False) -> T.List[T.Any]:
+    """Fingerprint of a file: the size and mtime, and optionally the
+    sha256 of the content. A missing path has None as fingerprint."""
+    path = os.fspath(path)
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return [path, None]
+    fp: T.List[T.Any] = [path, st.st_size, st.st_mtime_ns]
+    if hash_contents and os.path.isfile(path):
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        fp.append(h.hexdigest())
+    return fp
+
+
+class RecordingWriter(TextIOBase):
+    """Write to the stream and record the text to the cache entry."""
+    def __init__(
+            self, file: T.TextIO, label: str, recorder: "CacheRecorder"):
+        self.file = file
+        self.label = label
+        self.recorder = recorder
+
+    def write(self, s: str) -> int:
+        self.recorder.record(self.label, s)
+        return self.file.write(s)
+
+    def flush(self) -> None:
+        self.file.flush()
+
+
+class CacheRecorder(object):
+    """Record the output of a run to a temporary file, which is moved
+    to the cache entry atomically when committed."""
+    def __init__(self, cache: "ResultCache", key: str):
+        self.cache = cache
+        self.key = key
+        fd, self.tmp_path = tempfile.mkstemp(
+            dir=cache.directory, prefix=TMP_PREFIX)
+        self.file = os.fdopen(fd, "w")
+
+    def wrap(self, file: T.TextIO, label: str) -> T.TextIO:
+        return T.cast(T.TextIO, RecordingWriter(file, label, self))
+
+    def record(self, label: str, s: str):
+        self.file.write(json.dumps([label, s]) + "\n")
+
+    def commit(self, ret_code: int):
+        if (ret_code != 0) and (not self.cache.cache_failures):
+            return self.abort()
+        self.file.write(json.dumps({"ret_code": ret_code}) + "\n")
+        self.file.close()
+        os.replace(self.tmp_path, self.cache.entry_path(self.key))
+        self.cache.evict()
+
+    def abort(self):
+        self.file.close()
+        os.remove(self.tmp_path)
+
+
+class ResultCache(object):
+    """On-disk cache of command results, keyed by the command string,
+    the fingerprints of the input paths and the environment variables
+    and working directory of the run.
+
+    Each entry is a single file written atomically, which records the
+    stdout/stderr and the return code of a run. When the total size
+    exceed `max_size`, the least recently used entries are removed.
+    Several processes can share the same directory.
+
+    Args:
+        directory: The cache directory.
+        max_size: Max total size of the entries in bytes. default: 1GiB.
+        hash_inputs: If True, the sha256 of the input files is part of
+            the key, otherwise only their size and mtime. default: False.
+        cache_failures: If True, also cache the runs with non-zero
+            return code. default: False.
+    """
+    def __init__(
+            self, directory: PathLike,
+            max_size: int = 1 << 30,
+            hash_inputs: bool = False,
+            cache_failures: bool = False):
+        self.directory = os.fspath(directory)
+        os.makedirs(self.directory, exist_ok=True)
+        self.max_size = max_size
+        self.hash_inputs = hash_inputs
+        self.cache_failures = cache_failures
+
+    def key(
+            self, cmd_str: str,
+            input_paths: T.Sequence[PathLike] = (),
+            popen_kwargs: T.Optional[T.Mapping[str, T.Any]] = None) -> str:
+        """The key of a run, the `env`, `cwd` and `shell` in
+        `popen_kwargs` are part of it, as they change the result."""
+        fps = [fingerprint(p, self.hash_inputs) for p in input_paths]
+        kwargs = popen_kwargs or {}
+        env, cwd = kwargs.get("env"), kwargs.get("cwd")
+        context = [
+            None if env is None else sorted(env.items()),
+            None if cwd is None else os.fspath(cwd),
+            bool(kwargs.get("shell")),
+        ]
+        data = json.dumps([cmd_str, fps, context], default=str)
+        return hashlib.sha256(data.encode()).hexdigest()
+
+    def entry_path(self, key: str) -> str:
+        return os.path.join(self.directory, key)
+
+    def replay(
+            self, key: str,
+            out_stream: T.TextIO, err_stream: T.TextIO,
+            ) -> T.Optional[int]:
+        """Write the recorded output of the entry to the streams and
+        return the recorded return code, None if not cached."""
+        path = self.entry_path(key)
+        try:
+            f = open(path)
+        except FileNotFoundError:
+            return None
+        ret_code = None
+        with f:
+            for line in f:
+                record = json.loads(line)
+                if isinstance(record, dict):
+                    ret_code = record["ret_code"]
+                else:
+                    src, s = record
+                    (out_stream if src == "stdout" else err_stream).write(s)
+        try:
+            os.utime(path)  # mark as recently used
+        except FileNotFoundError:  # pragma: no cover
+            pass
+        return ret_code
+
+    def recorder(self, key: str) -> CacheRecorder:
+        return CacheRecorder(self, key)
+
+    def evict(self):
+        """Remove the least recently used entries
+        until the total size is below `max_size`."""
+        entries = []
+        total = 0
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.startswith(TMP_PREFIX):
+                    continue
+                try:
+                    st = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((st.st_mtime_ns, st.st_size, entry.path))
+                total += st.st_size
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
@@ -0,0 +1,77 @@
+import os
+import json
+import hashlib
+import threading
+import typing as T
+
+from .cache import fingerprint
+from .workflow import Command, Task
+
+
+class Journal(object):
+    """Journal of the completed steps of generator workflows, a JSON
+    lines file appended after each successful step, so the progress
+    survive a crash.
+
+    A step is keyed by the command string and the fingerprints of its
+    declared inputs and outputs after the run. On the next run, a step
+    with the same key is skipped and its recorded return code is sent
+    back to the generator. Only the steps returning 0 are recorded.
+
+    Args:
+        path: Path of the journal file.
+        hash_contents: If True, the contents of the input and output
+            files are hashed, instead of comparing size and mtime only.
+    """
+    def __init__(
+            self, path: T.Union[str, os.PathLike],
+            hash_contents: bool = False) -> None:
+        self.path = os.fspath(path)
+        self.hash_contents = hash_contents
+        self.lock = threading.Lock()
+        self.entries: T.Dict[str, int] = {}
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # truncated by a crash
+                    self.entries[entry["key"]] = entry["ret_code"]
+
+    def __reduce__(self) -> tuple:
+        # reloaded from the file
+        return (self.__class__, (self.path, self.hash_contents))
+
+    def key(self, cmd: Command) -> str:
+        if isinstance(cmd, Task):
+            cmd_str, inputs, outputs = cmd.cmd, cmd.inputs, cmd.outputs
+        else:
+            cmd_str, inputs, outputs = cmd, [], []
+        data = json.dumps([
+            cmd_str,
+            [fingerprint(p, self.hash_contents) for p in inputs],
+            [fingerprint(p, self.hash_contents) for p in outputs],
+        ])
+        return hashlib.sha256(data.encode()).hexdigest()
+
+    def lookup(self, cmd: Command) -> T.Optional[int]:
+        """The recorded return code if the step is completed and
+        unchanged, else None."""
+        with self.lock:
+            return self.entries.get(self.key(cmd))
+
+    def record(self, cmd: Command, ret_code: int):
+        """Record the step after it is run."""
+        if ret_code != 0:
+            return
+        key = self.key(cmd)
+        cmd_str = cmd.cmd if isinstance(cmd, Task) else cmd
+        line = json.dumps(
+            {"key": key, "cmd": cmd_str, "ret_code": ret_code}) + "\n"
+        with self.lock:
+            with open(self.path, "a") as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+            self.entries[key] = ret_code
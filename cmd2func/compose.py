@@ -0,0 +1,97 @@
+import typing as T
+
+from .runner import PipelineRunner
+
+if T.TYPE_CHECKING:  # pragma: no cover
+    from .core import Cmd2Func
+
+
+class BoundCommand(object):
+    """A Cmd2Func object with bound arguments,
+    can be composed to a pipeline with `|`."""
+    def __init__(self, func: "Cmd2Func", args: tuple, kwargs: dict):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+
+    def get_cmd_str(self) -> str:
+        cmd_str = self.func.get_cmd_str(*self.args, **self.kwargs)
+        if not isinstance(cmd_str, str):
+            raise TypeError(
+                "Only function which return a command string "
+                "can be used in pipeline.")
+        return self.func.process_cmd_str(cmd_str)
+
+    def __call__(self) -> T.Any:
+        return self.func(*self.args, **self.kwargs)
+
+    def __or__(self, other: "StageLike") -> "Pipeline":
+        return Pipeline([self, other])
+
+
+StageLike = T.Union[BoundCommand, "Cmd2Func", "Pipeline"]
+
+
+def as_stages(obj: StageLike) -> T.List[BoundCommand]:
+    if isinstance(obj, Pipeline):
+        return obj.stages
+    elif isinstance(obj, BoundCommand):
+        return [obj]
+    else:
+        return [BoundCommand(obj, (), {})]
+
+
+class Pipeline(object):
+    """Commands connected with OS pipes, like the `|` in shell.
+
+    The stdout of each stage is the stdin of the next stage,
+    the stdout of the last stage is written to `out_stream`, and the
+    stderr of all stages to `err_stream`. Calling the pipeline return
+    the list of return codes of all stages.
+
+    Args:
+        stages: The stages, Cmd2Func objects or the bound ones.
+        out_stream: default: the `out_stream` of the last stage.
+        err_stream: default: the `err_stream` of the last stage.
+    """
+    def __init__(
+            self, stages: T.Sequence[StageLike],
+            out_stream: T.Optional[T.TextIO] = None,
+            err_stream: T.Optional[T.TextIO] = None):
+        self.stages: T.List[BoundCommand] = []
+        for stage in stages:
+            self.stages.extend(as_stages(stage))
+        if not self.stages:
+            raise ValueError("Pipeline should have at least one stage.")
+        self.out_stream = out_stream
+        self.err_stream = err_stream
+
+    def __or__(self, other: StageLike) -> "Pipeline":
+        return Pipeline(
+            [self, other], self.out_stream, self.err_stream)
+
+    def get_cmd_strs(self) -> T.List[str]:
+        return [stage.get_cmd_str() for stage in self.stages]
+
+    def __call__(self) -> T.List[int]:
+        last = self.stages[-1].func
+        cmd_strs = self.get_cmd_strs()
+        runner = PipelineRunner(cmd_strs)
+        if last.is_print_cmd:
+            print(f"Run command: {runner.command}")
+        runner.run(stages_kwargs=[
+            stage.func.get_popen_kwargs() for stage in self.stages])
+        ret_codes = runner.write_stream_until_stop(
+            self.out_stream or last.out_stream,
+            self.err_stream or last.err_stream,
+            last.flush_streams_each_time)
+        return T.cast(T.List[int], ret_codes)
+
+
+def pipeline(
+        *stages: StageLike,
+        out_stream: T.Optional[T.TextIO] = None,
+        err_stream: T.Optional[T.TextIO] = None,
+        ) -> Pipeline:
+    """Compose the stages to a pipeline, see `Pipeline`."""
+    return Pipeline(stages, out_stream, err_stream)
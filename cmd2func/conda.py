@@ -0,0 +1,138 @@
+import os
+import sys
+import json
+import glob
+import shlex
+import typing as T
+import subprocess as subp
+from threading import Lock
+
+
+CONDA_EXE = os.environ.get("CONDA_EXE", "conda")
+
+_env_prefixes: T.Dict[str, str] = {}
+Activation = T.Tuple[str, T.Dict[str, str]]
+_activation_cache: T.Dict[str, T.Tuple[tuple, Activation]] = {}
+_cache_lock = Lock()
+
+
+def is_env_prefix(path: str) -> bool:
+    return os.path.isdir(os.path.join(path, "conda-meta"))
+
+
+def list_env_prefixes() -> T.Dict[str, str]:
+    """Query conda for the environments, return a dict of name to prefix.
+    """
+    out = subp.check_output([CONDA_EXE, "info", "--json"])
+    info = json.loads(out)
+    prefixes = {os.path.basename(p): p for p in info.get("envs", [])}
+    if "root_prefix" in info:
+        prefixes["base"] = info["root_prefix"]
+    return prefixes
+
+
+def find_env_prefix(env: str) -> str:
+    """Get the prefix of a conda environment by its name or path."""
+    if is_env_prefix(env):
+        return os.path.abspath(env)
+    with _cache_lock:
+        if env not in _env_prefixes:
+            _env_prefixes.update(list_env_prefixes())
+        if env not in _env_prefixes:
+            raise ValueError(f"Conda environment {env} is not found.")
+        return _env_prefixes[env]
+
+
+def bin_dirs(prefix: str) -> T.List[str]:
+    """The directories which conda activate prepend to PATH."""
+    if sys.platform == "win32":  # pragma: no cover
+        return [
+            prefix,
+            os.path.join(prefix, "Library", "mingw-w64", "bin"),
+            os.path.join(prefix, "Library", "usr", "bin"),
+            os.path.join(prefix, "Library", "bin"),
+            os.path.join(prefix, "Scripts"),
+            os.path.join(prefix, "bin"),
+        ]
+    return [os.path.join(prefix, "bin")]
+
+
+def _activate_scripts(prefix: str) -> T.List[str]:
+    return sorted(glob.glob(
+        os.path.join(prefix, "etc", "conda", "activate.d", "*.sh")))
+
+
+def _state_stamp(prefix: str) -> tuple:
+    """Modification times which invalidate the cached activation."""
+    paths = [
+        os.path.join(prefix, "conda-meta"),
+        os.path.join(prefix, "conda-meta", "state"),
+        os.path.join(prefix, "etc", "conda", "activate.d"),
+    ] + _activate_scripts(prefix)
+    stamp: T.List[T.Optional[int]] = []
+    for path in paths:
+        try:
+            stamp.append(os.stat(path).st_mtime_ns)
+        except FileNotFoundError:
+            stamp.append(None)
+    return tuple(stamp)
+
+
+def compute_activation(prefix: str) -> Activation:
+    """Compute the environment variables which `conda activate` set.
+    Return the part prepended to PATH, and the other variables
+    changed relative to the current os.environ."""
+    base = dict(os.environ)
+    env = dict(base)
+    env["PATH"] = os.pathsep.join(bin_dirs(prefix) + [base.get("PATH", "")])
+    env["CONDA_PREFIX"] = prefix
+    env["CONDA_DEFAULT_ENV"] = os.path.basename(prefix)
+    state_path = os.path.join(prefix, "conda-meta", "state")
+    if os.path.exists(state_path):
+        with open(state_path) as f:
+            env.update(json.load(f).get("env_vars", {}))
+    scripts = _activate_scripts(prefix)
+    if scripts:
+        dump = f"{shlex.quote(sys.executable)} -c " + \
+            "'import os, json; print(json.dumps(dict(os.environ)))'"
+        sources = "".join(f". {shlex.quote(s)}; " for s in scripts)
+        out = subp.check_output(["sh", "-c", sources + dump], env=env)
+        env = json.loads(out)
+    changes = {
+        k: v for k, v in env.items() if (base.get(k) != v) and k != "PATH"}
+    new_path, base_path = env.get("PATH", ""), base.get("PATH", "")
+    if base_path and new_path.endswith(base_path):
+        path_prefix = new_path[:-len(base_path)]
+    else:
+        path_prefix = ""
+        changes["PATH"] = new_path
+    return path_prefix, changes
+
+
+def get_activation(env: str) -> Activation:
+    """Get the activation variables of a conda environment.
+    The result is cached per environment, and recomputed when the
+    `conda-meta` or the activate scripts of the environment change."""
+    prefix = find_env_prefix(env)
+    stamp = _state_stamp(prefix)
+    with _cache_lock:
+        cached = _activation_cache.get(prefix)
+    if (cached is not None) and (cached[0] == stamp):
+        return cached[1]
+    activation = compute_activation(prefix)
+    with _cache_lock:
+        _activation_cache[prefix] = (stamp, activation)
+    return activation
+
+
+def activated_env(
+        env: str,
+        base_env: T.Optional[T.Mapping[str, str]] = None,
+        ) -> T.Dict[str, str]:
+    """Environment variables for running a command in the conda
+    environment, based on `base_env` (default: os.environ)."""
+    path_prefix, changes = get_activation(env)
+    new_env = dict(os.environ if base_env is None else base_env)
+    new_env["PATH"] = path_prefix + new_env.get("PATH", "")
+    new_env.update(changes)
+    return new_env
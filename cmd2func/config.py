@@ -1,5 +1,6 @@
 import typing as T
 import sys
+import functools
 if sys.version_info < (3, 11):  # pragma: no cover
     from typing_extensions import TypedDict, NotRequired
 else:  # pragma: no cover
@@ -16,10 +17,20 @@ class ArgDef(TypedDict):
     false_insert: NotRequired[T.Any]
 
 
+class ResourceDef(TypedDict):
+    """Resources needed by a run of the command. A string value is
+    formatted with the argument values and evaluated as an arithmetic
+    expression, for example "{threads} * 2", memory can have a unit
+    suffix like "4G"."""
+    cpus: NotRequired[T.Union[float, str]]
+    memory: NotRequired[T.Union[int, str]]
+
+
 class CLIConfig(TypedDict):
     name: NotRequired[str]
     inputs: T.Dict[str, ArgDef]
     inputs_order: NotRequired[T.List[str]]
+    resources: NotRequired[ResourceDef]
 
 
 def extrace_key(d: dict, key, default) -> T.Any:
@@ -29,6 +40,12 @@ def extrace_key(d: dict, key, default) -> T.Any:
         return default
 
 
+@functools.lru_cache(maxsize=None)
+def eval_type(type_str: str) -> T.Any:
+    """Evaluate the type string in the config, cached."""
+    return eval(type_str)
+
+
 def config_to_desc(config: CLIConfig) -> Description:
     """Convert a config to a funcdesc's Description object."""
     args_conf = config['inputs'].copy()
@@ -40,7 +57,7 @@ def config_to_desc(config: CLIConfig) -> Description:
         _tp = extrace_key(pc, 'type', None)
         _default = extrace_key(pc, 'default', NotDef)
         val = Value(
-            type_=eval(_tp),
+            type_=eval_type(_tp),
             default=_default,
             name=n,
             **pc
@@ -2,35 +2,27 @@ import inspect
 import sys
 import typing as T
 import functools
+import contextlib
+import subprocess as subp
 
-from funcdesc import Description
+from .config import CLIConfig, ResourceDef
+from .runner import ProcessRunner, RUNNERS, InputData
+from .template import (  # noqa: F401
+    compile_template, compose_signature, replace_vals
+)
+from .workflow import Step, Command, Task, as_parallel
+from .stats import RunStats
 
-from .config import CLIConfig, config_to_desc
-from .runner import ProcessRunner
-from .cmd import Command
-
-
-def compose_signature(desc: Description) -> inspect.Signature:
-    parameters = []
-    for arg in desc.inputs:
-        param = inspect.Parameter(
-            arg.name, inspect.Parameter.POSITIONAL_OR_KEYWORD,
-            default=arg.default, annotation=arg)
-        parameters.append(param)
-    sig = inspect.Signature(parameters)
-    return sig
-
-
-def replace_vals(vals: dict, desc: Description) -> dict:
-    vals = vals.copy()
-    name_to_arg = {v.name: v for v in desc.inputs}
-    for key, val in vals.items():
-        arg_obj = name_to_arg[key]
-        if (val is True) and ('true_insert' in arg_obj.kwargs):
-            vals[key] = arg_obj.kwargs['true_insert']
-        if (val is False) and ('false_insert' in arg_obj.kwargs):
-            vals[key] = arg_obj.kwargs['false_insert']
-    return vals
+if T.TYPE_CHECKING:  # pragma: no cover
+    # the optional features (and asyncio, concurrent.futures) are
+    # imported where they are used, to keep the import fast for CLIs
+    from .batch import MapResult, SinkSpec
+    from .compose import BoundCommand, Pipeline
+    from .cache import ResultCache
+    from .checkpoint import Journal
+    from .parsers import Parser, Records
+    from .scheduler import ResourceScheduler
+    from .trace import Tracer
 
 
 class CommandFormater(object):
@@ -38,44 +30,89 @@ class CommandFormater(object):
             self, command: str,
             config: T.Optional[CLIConfig] = None,
             ) -> None:
-        self.command = Command(command)
-        if config is None:
-            config = self.command.infer_config()
-        else:
-            config = self.command.complete_config(config)
-        self.config = config
-        self.desc = config_to_desc(config)
-        self.command.check_placeholder([v.name for v in self.desc.inputs])
-        self.signature = compose_signature(self.desc)
+        self.template = compile_template(command, config)
+        self.command = self.template.command
+        self.config = self.template.config
+        self.desc = self.template.desc
+        self.signature = self.template.signature
 
     def get_cmd_str(self, *args, **kwargs) -> str:
         """Get the command string from the arguments."""
-        vals = self.desc.parse_pass_in(args, kwargs)
-        vals = replace_vals(vals, self.desc)
-        cmd_str = self.command.format(vals)
-        return cmd_str
+        return self.template.render(args, kwargs)
+
+    def render_bulk(self, data: T.Any) -> T.Iterator[str]:
+        """Lazily get the command strings of many argument sets,
+        see `bulk.render_bulk`."""
+        from .bulk import render_bulk
+        return render_bulk(self.template, data)
+
+    def __reduce__(self):
+        # the compiled template is not pickled, it is compiled again
+        return (self.__class__, (self.command.template, self.config))
+
+
+class _StdStream(object):
+    """Pickled placeholder of `sys.stdout`/`sys.stderr`, which is
+    re-bound to the standard stream of the unpickling process."""
+    def __init__(self, name: str) -> None:
+        self.name = name
+
+    @staticmethod
+    def wrap(stream: T.Any) -> T.Any:
+        for name in ("stdout", "stderr"):
+            if (stream is getattr(sys, name)) or \
+                    (stream is getattr(sys, f"__{name}__")):
+                return _StdStream(name)
+        return stream
+
+    @staticmethod
+    def unwrap(stream: T.Any) -> T.Any:
+        if isinstance(stream, _StdStream):
+            return getattr(sys, stream.name)
+        return stream
 
 
 StrFunc = T.Callable[..., str]
-CmdGen = T.Generator[str, int, T.Any]
+CmdGen = T.Generator[Step, T.Any, T.Any]
 StrGenFunc = T.Callable[..., CmdGen]
+AsyncCmdGen = T.AsyncGenerator[Step, T.Any]
+AsyncStrGenFunc = T.Callable[..., AsyncCmdGen]
+FuncTypes = T.Union[str, StrFunc, StrGenFunc, AsyncStrGenFunc]
+RunnerFactory = T.Callable[[str], ProcessRunner]
+# shared by the calls when not tracing, entering it costs nothing
+NULL_SPAN = contextlib.nullcontext()
 
 
 class Cmd2Func(object):
     def __init__(
-            self, cmd_or_func: T.Union[str, StrFunc, StrGenFunc],
+            self, cmd_or_func: FuncTypes,
             config: T.Optional[CLIConfig] = None,
             print_cmd=True,
             out_stream=sys.stdout,
             err_stream=sys.stderr,
             conda_env: T.Optional[str] = None,
             flush_streams_each_time=False,
-            popen_kwargs: T.Optional[dict] = None,):
+            popen_kwargs: T.Optional[dict] = None,
+            runner: T.Union[str, RunnerFactory] = "thread",
+            passthrough_fds: bool = False,
+            conda_mode: str = "run",
+            max_parallel: T.Optional[int] = None,
+            cache: "T.Optional[ResultCache]" = None,
+            cache_inputs: T.Optional[T.List[str]] = None,
+            stats_callback: T.Optional[T.Callable[[RunStats], T.Any]] = None,
+            parser: "T.Optional[Parser]" = None,
+            scheduler: "T.Optional[ResourceScheduler]" = None,
+            resources: T.Optional[ResourceDef] = None,
+            checkpoint: "T.Union[Journal, str, None]" = None,
+            tracer: "T.Optional[Tracer]" = None,
+            ):
         """Convert a command to a function.
 
         Args:
             cmd_or_func: The command string or a function that returns the
                 command string or a generator that yields the command string.
+                Coroutine functions and async generator functions are
+                supported by `acall`.
             config: The config of the command. If not provided, it will be
                 inferred from the command string. This is only used when
                 cmd_or_func is a command string. default: None.
@@ -91,11 +128,70 @@ class Cmd2Func(object):
                 after writing to them. default: False.
             popen_kwargs: The keyword arguments for subprocess.Popen.
                 default: None.
+            runner: The runner used to run the command, "thread" for
+                `ProcessRunner`, "selector" for `SelectorProcessRunner`, or
+                a callable which receive the command string and return a
+                runner, for example: `functools.partial(
+                SelectorProcessRunner, high_water_mark=1024)`.
+                "session" run commands in a long-lived shell owned by this
+                function (see `ShellSessionPool`), which avoid starting a
+                new process for each command. default: "thread".
+            passthrough_fds: If True, when `out_stream`/`err_stream` is
+                backed by a real file (has a `fileno()`), its file
+                descriptor is passed to the child process directly, so
+                the output does not pass through Python. When it is a
+                `Tee` of real files, the bytes are spliced to the files
+                in large chunks without decoding. default: False.
+            conda_mode: How to run the command in `conda_env`. "run" to
+                prefix the command with `conda run`, "activate" to resolve
+                the activation variables of the env once (cached until the
+                env changes) and run the command directly with them.
+                default: "run".
+            max_parallel: Max number of commands run at once, when a
+                generator yield a group of commands (a list, a dict or
+                a `Parallel` object). default: None, all commands of
+                the group are run at once.
+            cache: If provided, the results are cached in it, a run with
+                the same command string and unchanged input files replay
+                the recorded output and return code without running the
+                command. default: None.
+            cache_inputs: Names of the arguments whose values are input
+                paths (or lists of paths), their fingerprints are part of
+                the cache key. default: None.
+            stats_callback: If provided, it is called with the `RunStats`
+                of each run. default: None.
+            parser: If provided, the stdout is parsed by it incrementally,
+                and calling the function return a lazy `Records` iterator
+                of the parsed records instead of the return code, which
+                is set to `Records.ret_code` after the iteration.
+                For example `JSONLinesParser()`, `CSVParser()` or
+                `RegexParser(pattern)` in `cmd2func.parsers`. Only the
+                single command functions support it. default: None.
+            scheduler: If provided, each call waits until its resources
+                fit in the budget of the scheduler, the calls of different
+                functions are queued fairly. default: None.
+            resources: The resources needed by a call, like
+                `{"cpus": "{threads}", "memory": "4G"}`, strings are
+                formatted with the argument values. default: the
+                "resources" of the config, or 1 CPU.
+            checkpoint: A `Journal` or the path of its file. If provided,
+                the steps of a generator function completed successfully
+                are recorded in it, and on the next call the steps whose
+                command string and declared inputs and outputs (see
+                `Task`) are unchanged are skipped, their recorded return
+                code is sent to the generator. default: None.
+            tracer: If provided, the timeline of the calls is recorded
+                in it as nested spans: call → workflow → step → run →
+                process, see `trace.Tracer`. default: None.
 
         Attributes:
             lastest_cmd_str: The lastest command string that is run.
+            last_run_stats: The `RunStats` of the last run: spawn latency,
+                wall time, CPU time, max RSS and streamed lines/bytes.
+            last_call_stats: The `RunStats` of all runs of the last call,
+                one per step for a generator function.
         """
-        self.get_cmd_str: T.Union[StrFunc, StrGenFunc]
+        self.get_cmd_str: T.Union[StrFunc, StrGenFunc, AsyncStrGenFunc]
         if isinstance(cmd_or_func, str):
             self.formater = CommandFormater(cmd_or_func, config)
             self.get_cmd_str = self.formater.get_cmd_str
@@ -110,47 +206,570 @@ class Cmd2Func(object):
         self.conda_env = conda_env
         self.flush_streams_each_time = flush_streams_each_time
         self.kwargs_popen = popen_kwargs or dict()
+        if runner == "session":
+            from .session import ShellSessionPool
+            runner = ShellSessionPool(1).runner
+        elif isinstance(runner, str):
+            runner = RUNNERS[runner]
+        self.runner_factory = runner
+        self.passthrough_fds = passthrough_fds
+        if conda_mode not in ("run", "activate"):
+            raise ValueError(f"Unknown conda_mode: {conda_mode}")
+        self.conda_mode = conda_mode
+        self.max_parallel = max_parallel
+        self.cache = cache
+        self.cache_inputs = cache_inputs or []
+        self.stats_callback = stats_callback
+        if (parser is not None) and (cache is not None):
+            raise ValueError("parser can not be used with cache.")
+        self.parser = parser
+        if (parser is not None) and (scheduler is not None):
+            raise ValueError("parser can not be used with scheduler.")
+        self.scheduler = scheduler
+        if (resources is None) and hasattr(self, "formater"):
+            resources = self.formater.config.get("resources")
+        self.resources = resources
+        if isinstance(checkpoint, str):
+            from .checkpoint import Journal
+            checkpoint = Journal(checkpoint)
+        self.checkpoint = checkpoint
+        self.tracer = tracer
+        self.last_run_stats: T.Optional[RunStats] = None
+        self.last_call_stats: T.List[RunStats] = []
         self.lastest_cmd_str: T.Optional[str] = None
 
+    def __reduce_ex__(self, protocol: T.SupportsIndex) -> T.Any:
+        # a decorated module level function is pickled by reference
+        module = sys.modules.get(self.__dict__.get("__module__", ""))
+        qualname = self.__dict__.get("__qualname__", "")
+        obj: T.Any = module
+        for name in qualname.split("."):
+            obj = getattr(obj, name, None)
+        if obj is self:
+            return qualname
+        return super().__reduce_ex__(protocol)
+
+    def __getstate__(self) -> dict:
+        """Standard streams are replaced with placeholders, and the
+        runtime states (stats, the bound `get_cmd_str`) are dropped."""
+        state = self.__dict__.copy()
+        state["out_stream"] = _StdStream.wrap(self.out_stream)
+        state["err_stream"] = _StdStream.wrap(self.err_stream)
+        state["last_run_stats"] = None
+        state["last_call_stats"] = []
+        if "formater" in state:
+            del state["get_cmd_str"]
+            del state["__signature__"]
+        return state
+
+    def __setstate__(self, state: dict):
+        state["out_stream"] = _StdStream.unwrap(state["out_stream"])
+        state["err_stream"] = _StdStream.unwrap(state["err_stream"])
+        self.__dict__.update(state)
+        if "formater" in state:
+            self.get_cmd_str = self.formater.get_cmd_str
+            self.__signature__ = self.formater.signature
+
+    def span(self, name: str, **args: T.Any) -> T.ContextManager:
+        """A span of the tracer, a no-op context if not tracing."""
+        if self.tracer is None:
+            return NULL_SPAN
+        return self.tracer.span(name, **args)
+
+    def new_runner(self, cmd_str: str) -> ProcessRunner:
+        runner = self.runner_factory(cmd_str)
+        if self.tracer is not None:
+            runner.tracer = self.tracer
+        return runner
+
     def process_cmd_str(self, cmd_str: str) -> str:
-        if self.conda_env is not None:
+        if (self.conda_env is not None) and (self.conda_mode == "run"):
             cmd_str = "conda run --no-capture-output " + \
                 f"-n {self.conda_env} {cmd_str}"
         return cmd_str
 
-    def run_cmd(self, cmd_str: str) -> int:
-        """Run the command and return the return code."""
+    def get_popen_kwargs(self, input: T.Optional[InputData] = None) -> dict:
+        """The keyword arguments passed to `ProcessRunner.run`."""
+        kwargs = dict(self.kwargs_popen)
+        if input is not None:
+            kwargs["input"] = input
+        if (self.conda_env is not None) and (self.conda_mode == "activate"):
+            from .conda import activated_env
+            kwargs["env"] = activated_env(self.conda_env, kwargs.get("env"))
+        return kwargs
+
+    def bind_args(self, args: tuple, kwargs: dict) -> T.Dict[str, T.Any]:
+        """Bind the arguments to the parameter names."""
+        if hasattr(self, "formater"):
+            return self.formater.template.bind(args, kwargs)
+        bound = inspect.signature(self.get_cmd_str).bind(*args, **kwargs)
+        bound.apply_defaults()
+        return bound.arguments
+
+    def get_resources(self, args: tuple, kwargs: dict) -> T.Dict[str, float]:
+        """Evaluate the resources needed by the call."""
+        from .scheduler import eval_resources
+        return eval_resources(self.resources, self.bind_args(args, kwargs))
+
+    def get_input_paths(self, args: tuple, kwargs: dict) -> T.List[str]:
+        """Get the values of the `cache_inputs` arguments."""
+        if not self.cache_inputs:
+            return []
+        vals = self.bind_args(args, kwargs)
+        paths: T.List[str] = []
+        for name in self.cache_inputs:
+            val = vals[name]
+            if isinstance(val, (list, tuple)):
+                paths.extend(val)
+            elif val is not None:
+                paths.append(val)
+        return paths
+
+    def run_cmd(
+            self, cmd_str: str,
+            out_stream: T.Optional[T.TextIO] = None,
+            err_stream: T.Optional[T.TextIO] = None,
+            input_paths: T.Sequence[str] = (),
+            input: T.Optional[InputData] = None,
+            ) -> int:
+        """Run the command and return the return code.
+        `out_stream` and `err_stream` override the streams of this object.
+        `input_paths` are used in the cache key. `input` is written to the
+        stdin of the command, a run with input is not cached."""
         cmd_str = self.process_cmd_str(cmd_str)
         self.lastest_cmd_str = cmd_str
+        out_stream = out_stream or self.out_stream
+        err_stream = err_stream or self.err_stream
+        with self.span("run", cmd=cmd_str):
+            if (self.cache is None) or (input is not None):
+                return self._execute(cmd_str, out_stream, err_stream, input)
+            return self._run_cached(
+                cmd_str, out_stream, err_stream, input_paths)
+
+    def _replay(
+            self, cmd_str: str,
+            out_stream: T.TextIO, err_stream: T.TextIO,
+            input_paths: T.Sequence[str],
+            ) -> T.Tuple[str, T.Optional[int]]:
+        """Replay the cached run, return the key and the recorded
+        return code, None if not cached."""
+        assert self.cache is not None
+        key = self.cache.key(
+            cmd_str, input_paths, self.get_popen_kwargs())
+        ret_code = self.cache.replay(key, out_stream, err_stream)
+        if ret_code is not None:
+            if self.is_print_cmd:
+                print(f"Cached command: {cmd_str}")
+            if self.tracer is not None:
+                self.tracer.instant("cache hit", cmd=cmd_str)
+        return key, ret_code
+
+    def _run_cached(
+            self, cmd_str: str,
+            out_stream: T.TextIO, err_stream: T.TextIO,
+            input_paths: T.Sequence[str]) -> int:
+        assert self.cache is not None
+        key, ret_code = self._replay(
+            cmd_str, out_stream, err_stream, input_paths)
+        if ret_code is not None:
+            return ret_code
+        recorder = self.cache.recorder(key)
+        try:
+            ret_code = self._execute(
+                cmd_str,
+                recorder.wrap(out_stream, "stdout"),
+                recorder.wrap(err_stream, "stderr"))
+        except BaseException:
+            recorder.abort()
+            raise
+        recorder.commit(ret_code)
+        return ret_code
+
+    def run_parsed(
+            self, cmd_str: str,
+            err_stream: T.Optional[T.TextIO] = None,
+            input: T.Optional[InputData] = None) -> "Records":
+        """Start the command and return the lazy iterator of the records
+        parsed from its stdout."""
+        assert self.parser is not None
+        cmd_str = self.process_cmd_str(cmd_str)
+        self.lastest_cmd_str = cmd_str
+        if self.is_print_cmd:
+            print(f"Run command: {cmd_str}")
+        runner = self.new_runner(cmd_str)
+        # the records may be consumed slowly, or not at all
+        runner.bound_queue()
+        runner.run(**self.get_popen_kwargs(input))
+        from .parsers import Records
+        return Records(
+            runner, self.parser, err_stream or self.err_stream,
+            self.flush_streams_each_time,
+            on_finish=lambda _: self.record_stats(runner.stats))
+
+    def _execute(
+            self, cmd_str: str,
+            out_stream: T.TextIO, err_stream: T.TextIO,
+            input: T.Optional[InputData] = None) -> int:
         if self.is_print_cmd:
             print(f"Run command: {cmd_str}")
-        runner = ProcessRunner(cmd_str)
-        runner.run(**self.kwargs_popen)
-        ret_code = runner.write_stream_until_stop(
-            self.out_stream, self.err_stream,
-            self.flush_streams_each_time)
+        runner = self.new_runner(cmd_str)
+        out_fds = err_fds = None
+        if self.passthrough_fds:
+            from .utils import get_fds
+            out_fds, err_fds = get_fds(out_stream), get_fds(err_stream)
+        if (out_fds is not None) or (err_fds is not None):
+            ret_code = self._run_passthrough(
+                runner, out_stream, err_stream, out_fds, err_fds, input)
+        else:
+            runner.run(**self.get_popen_kwargs(input))
+            ret_code = runner.write_stream_until_stop(
+                out_stream, err_stream,
+                self.flush_streams_each_time)
+        self.record_stats(runner.stats)
         return ret_code
 
-    def iter_and_run(self, generator: CmdGen) -> T.Any:
-        cmd = next(generator)
-        while True:
-            ret_code = self.run_cmd(cmd)
+    def record_stats(self, stats: RunStats):
+        self.last_run_stats = stats
+        self.last_call_stats.append(stats)
+        if self.stats_callback is not None:
+            self.stats_callback(stats)
+
+    def _run_passthrough(
+            self, runner: ProcessRunner,
+            out_stream: T.TextIO, err_stream: T.TextIO,
+            out_fds: T.Optional[T.List[int]],
+            err_fds: T.Optional[T.List[int]],
+            input: T.Optional[InputData] = None) -> int:
+        # Single fd is passed to the child, multiple fds (Tee) are
+        # spliced, which require both streams backed by files.
+        splice = (out_fds is not None) and (err_fds is not None) and \
+            max(len(out_fds), len(err_fds)) > 1
+        kwargs = self.get_popen_kwargs(input)
+        for label, fds, stream in (
+                ("stdout", out_fds, out_stream),
+                ("stderr", err_fds, err_stream)):
+            if fds is None:
+                continue
+            if len(fds) == 1:
+                kwargs[label] = fds[0]
+            elif splice:
+                kwargs[label] = subp.PIPE
+            else:
+                continue
+            kwargs["capture_" + label] = False
+            stream.flush()
+        runner.run(**kwargs)
+        if splice:
+            return runner.splice_until_stop(out_fds, err_fds)
+        else:
+            return runner.write_stream_until_stop(
+                out_stream, err_stream, self.flush_streams_each_time)
+
+    def run_task(
+            self, task: Command,
+            out_stream: T.Optional[T.TextIO] = None,
+            err_stream: T.Optional[T.TextIO] = None,
+            input_paths: T.Sequence[str] = (),
+            ) -> int:
+        """Run a command of a step, it is skipped if it is completed
+        according to the checkpoint journal."""
+        cmd_str = task.cmd if isinstance(task, Task) else task
+        if self.checkpoint is None:
+            return self.run_cmd(cmd_str, out_stream, err_stream, input_paths)
+        ret_code = self.checkpoint.lookup(task)
+        if ret_code is not None:
+            if self.is_print_cmd:
+                print(f"Skipped completed command: {cmd_str}")
+            if self.tracer is not None:
+                self.tracer.instant("checkpoint hit", cmd=cmd_str)
+            return ret_code
+        ret_code = self.run_cmd(cmd_str, out_stream, err_stream, input_paths)
+        self.checkpoint.record(task, ret_code)
+        return ret_code
+
+    def run_step(
+            self, step: Step,
+            out_stream: T.Optional[T.TextIO] = None,
+            err_stream: T.Optional[T.TextIO] = None,
+            input_paths: T.Sequence[str] = (),
+            ) -> T.Any:
+        """Run a step yielded by a generator, a command string or a group
+        of commands. For a group, the commands are run concurrently and
+        the return codes are returned in the shape of the group."""
+        group = as_parallel(step)
+        if group is None:
+            with self.span("step"):
+                return self.run_task(
+                    T.cast(Command, step), out_stream, err_stream,
+                    input_paths)
+        from concurrent.futures import ThreadPoolExecutor
+        max_workers = group.max_workers or self.max_parallel or \
+            max(len(group.cmds), 1)
+        with self.span("step", n_cmds=len(group.cmds)), \
+                ThreadPoolExecutor(max_workers) as pool:
+            futures = [
+                pool.submit(
+                    self.run_task, cmd, out_stream, err_stream, input_paths)
+                for cmd in group.cmds]
+            return group.pack([f.result() for f in futures])
+
+    def iter_and_run(
+            self, generator: CmdGen,
+            out_stream: T.Optional[T.TextIO] = None,
+            err_stream: T.Optional[T.TextIO] = None,
+            input_paths: T.Sequence[str] = (),
+            ) -> T.Any:
+        with self.span("workflow"):
+            with self.span("generate"):
+                cmd = next(generator)
+            while True:
+                ret_code = self.run_step(
+                    cmd, out_stream, err_stream, input_paths)
+                try:
+                    with self.span("generate"):
+                        cmd = generator.send(ret_code)
+                except StopIteration as e:
+                    return e.value
+
+    def _call(
+            self, args: tuple, kwargs: dict,
+            out_stream: T.Optional[T.TextIO] = None,
+            err_stream: T.Optional[T.TextIO] = None,
+            input: T.Optional[InputData] = None,
+            ) -> T.Union[int, T.Any]:
+        with self.span("call", func=getattr(self, "__name__", None)):
+            if self.scheduler is None:
+                return self._call_now(
+                    args, kwargs, out_stream, err_stream, input)
+            request = self.get_resources(args, kwargs)
+            with self.span("wait resources", **request):
+                granted = self.scheduler.acquire(request, caller=self)
             try:
-                cmd = generator.send(ret_code)
-            except StopIteration as e:
-                return e.value
+                return self._call_now(
+                    args, kwargs, out_stream, err_stream, input)
+            finally:
+                self.scheduler.release(granted)
+
+    def _call_now(
+            self, args: tuple, kwargs: dict,
+            out_stream: T.Optional[T.TextIO] = None,
+            err_stream: T.Optional[T.TextIO] = None,
+            input: T.Optional[InputData] = None,
+            ) -> T.Union[int, T.Any]:
+        self.last_call_stats = []
+        with self.span("format"):
+            cmd_or_gen = self.get_cmd_str(*args, **kwargs)
+        if (input is not None) and not isinstance(cmd_or_gen, str):
+            raise TypeError(
+                "input is only supported by single command functions.")
+        input_paths = []
+        if self.cache is not None:
+            input_paths = self.get_input_paths(args, kwargs)
+        if self.parser is not None:
+            if not isinstance(cmd_or_gen, str):
+                raise TypeError(
+                    "parser is only supported by single command functions.")
+            return self.run_parsed(cmd_or_gen, err_stream, input)
+        if isinstance(cmd_or_gen, str):
+            cmd_str = cmd_or_gen
+            return self.run_cmd(
+                cmd_str, out_stream, err_stream, input_paths, input)
+        elif inspect.isasyncgen(cmd_or_gen) or inspect.isawaitable(cmd_or_gen):
+            raise TypeError(
+                "Async function should be called with `acall`.")
+        else:
+            return self.iter_and_run(
+                T.cast(CmdGen, cmd_or_gen), out_stream, err_stream,
+                input_paths)
 
     def __call__(self, *args, **kwargs) -> T.Union[int, T.Any]:
+        return self._call(args, kwargs)
+
+    def call_with_input(
+            self, input: InputData, *args, **kwargs) -> T.Union[int, T.Any]:
+        """Call the function, with `input` streamed to the stdin of the
+        command: bytes, a buffer, a string, a file object or an iterator
+        of chunks. It is written alongside the reading of the output, at
+        the pace the command consumes it."""
+        return self._call(args, kwargs, input=input)
+
+    def render_bulk(self, data: T.Any) -> T.Iterator[str]:
+        """Lazily get the command strings of many argument sets without
+        running them, for example to submit them to a batch system.
+        `data` is a dict of columns, a record array or an iterable of
+        records (like the rows of `csv.DictReader`), see
+        `bulk.render_bulk`. Only the template string form support it."""
+        if not hasattr(self, "formater"):
+            raise TypeError(
+                "render_bulk is only supported by template strings.")
+        cmds = self.formater.render_bulk(data)
+        if self.conda_env is None:
+            return cmds
+        return map(self.process_cmd_str, cmds)
+
+    def bind(self, *args, **kwargs) -> "BoundCommand":
+        """Bind the arguments, the result can be composed to a pipeline
+        with `|`, for example: `(f1.bind(a=1) | f2.bind(b=2))()`"""
+        from .compose import BoundCommand
+        return BoundCommand(self, args, kwargs)
+
+    def __or__(
+            self, other: T.Union["BoundCommand", "Cmd2Func"]) -> "Pipeline":
+        from .compose import Pipeline
+        return Pipeline([self, other])
+
+    def imap(
+            self, iterable: T.Iterable[T.Any],
+            max_workers: T.Optional[int] = None,
+            ordered: bool = True,
+            out_stream: "T.Optional[SinkSpec]" = None,
+            err_stream: "T.Optional[SinkSpec]" = None,
+            prefix: T.Optional[str] = None,
+            ) -> "T.Iterator[MapResult]":
+        """Lazily run this function over the argument sets in `iterable`
+        with at most `max_workers` processes at once. See `batch.imap`."""
+        from .batch import imap
+        return imap(
+            self, iterable, max_workers, ordered,
+            out_stream, err_stream, prefix)
+
+    def map(
+            self, iterable: T.Iterable[T.Any],
+            max_workers: T.Optional[int] = None,
+            ordered: bool = True,
+            out_stream: "T.Optional[SinkSpec]" = None,
+            err_stream: "T.Optional[SinkSpec]" = None,
+            prefix: T.Optional[str] = None,
+            ) -> "T.List[MapResult]":
+        """Run this function over the argument sets in `iterable`
+        and return all results. See `batch.imap`."""
+        return list(self.imap(
+            iterable, max_workers, ordered, out_stream, err_stream, prefix))
+
+    async def arun_cmd(
+            self, cmd_str: str, input_paths: T.Sequence[str] = ()) -> int:
+        """Run the command in asyncio and return the return code."""
+        cmd_str = self.process_cmd_str(cmd_str)
+        self.lastest_cmd_str = cmd_str
+        out_stream, err_stream = self.out_stream, self.err_stream
+        if self.cache is None:
+            return await self._aexecute(cmd_str, out_stream, err_stream)
+        key, ret_code = self._replay(
+            cmd_str, out_stream, err_stream, input_paths)
+        if ret_code is not None:
+            return ret_code
+        recorder = self.cache.recorder(key)
+        try:
+            ret_code = await self._aexecute(
+                cmd_str,
+                recorder.wrap(out_stream, "stdout"),
+                recorder.wrap(err_stream, "stderr"))
+        except BaseException:
+            recorder.abort()
+            raise
+        recorder.commit(ret_code)
+        return ret_code
+
+    async def _aexecute(
+            self, cmd_str: str,
+            out_stream: T.TextIO, err_stream: T.TextIO) -> int:
+        if self.is_print_cmd:
+            print(f"Run command: {cmd_str}")
+        runner = self.new_runner(cmd_str)
+        await runner.arun(**self.get_popen_kwargs())
+        ret_code = await runner.awrite_stream_until_stop(
+            out_stream, err_stream, self.flush_streams_each_time)
+        self.record_stats(runner.stats)
+        return ret_code
+
+    async def arun_task(
+            self, task: Command, input_paths: T.Sequence[str] = ()) -> int:
+        """Async version of `run_task`."""
+        cmd_str = task.cmd if isinstance(task, Task) else task
+        if self.checkpoint is None:
+            return await self.arun_cmd(cmd_str, input_paths)
+        ret_code = self.checkpoint.lookup(task)
+        if ret_code is not None:
+            if self.is_print_cmd:
+                print(f"Skipped completed command: {cmd_str}")
+            return ret_code
+        ret_code = await self.arun_cmd(cmd_str, input_paths)
+        self.checkpoint.record(task, ret_code)
+        return ret_code
+
+    async def arun_step(
+            self, step: Step, input_paths: T.Sequence[str] = ()) -> T.Any:
+        """Async version of `run_step`."""
+        group = as_parallel(step)
+        if group is None:
+            return await self.arun_task(T.cast(Command, step), input_paths)
+        import asyncio
+        limit = group.max_workers or self.max_parallel or \
+            max(len(group.cmds), 1)
+        semaphore = asyncio.Semaphore(limit)
+
+        async def run(cmd: Command) -> int:
+            async with semaphore:
+                return await self.arun_task(cmd, input_paths)
+
+        ret_codes = await asyncio.gather(*[run(c) for c in group.cmds])
+        return group.pack(list(ret_codes))
+
+    async def aiter_and_run(
+            self, generator: T.Union[CmdGen, AsyncCmdGen],
+            input_paths: T.Sequence[str] = ()) -> T.Any:
+        """Drive a generator or an async generator in asyncio.
+        Async generator can not return a value, so the return code of
+        its last command is returned."""
+        if not inspect.isasyncgen(generator):
+            gen = T.cast(CmdGen, generator)
+            cmd = next(gen)
+            while True:
+                ret_code = await self.arun_step(cmd, input_paths)
+                try:
+                    cmd = gen.send(ret_code)
+                except StopIteration as e:
+                    return e.value
+        agen = T.cast(AsyncCmdGen, generator)
+        cmd = await agen.__anext__()
+        while True:
+            ret_code = await self.arun_step(cmd, input_paths)
+            try:
+                cmd = await agen.asend(ret_code)
+            except StopAsyncIteration:
+                return ret_code
+
+    async def acall(self, *args, **kwargs) -> T.Union[int, T.Any]:
+        """Async version of `__call__`, the wrapped function can also be
+        a coroutine function or an async generator function."""
+        if self.scheduler is None:
+            return await self._acall(args, kwargs)
+        request = self.get_resources(args, kwargs)
+        granted = await self.scheduler.aacquire(request, self)
+        try:
+            return await self._acall(args, kwargs)
+        finally:
+            self.scheduler.release(granted)
+
+    async def _acall(self, args: tuple, kwargs: dict) -> T.Union[int, T.Any]:
+        if self.parser is not None:
+            raise TypeError(
+                "parser is not supported by acall, use __call__.")
+        self.last_call_stats = []
         cmd_or_gen = self.get_cmd_str(*args, **kwargs)
+        if inspect.isawaitable(cmd_or_gen):
+            cmd_or_gen = await cmd_or_gen
+        input_paths = []
+        if self.cache is not None:
+            input_paths = self.get_input_paths(args, kwargs)
         if isinstance(cmd_or_gen, str):
-            cmd_str = cmd_or_gen
-            return self.run_cmd(cmd_str)
+            return await self.arun_cmd(cmd_or_gen, input_paths)
         else:
-            return self.iter_and_run(cmd_or_gen)
+            return await self.aiter_and_run(cmd_or_gen, input_paths)
 
 
 def cmd2func(
-        cmd_or_func: T.Union[str, StrFunc, StrGenFunc, None] = None,
+        cmd_or_func: T.Optional[FuncTypes] = None,
         config: T.Optional[CLIConfig] = None,
         print_cmd=True,
         out_stream=sys.stdout,
@@ -158,6 +777,18 @@ def cmd2func(
         conda_env: T.Optional[str] = None,
         flush_streams_each_time=False,
         popen_kwargs: T.Optional[dict] = None,
+        runner: T.Union[str, RunnerFactory] = "thread",
+        passthrough_fds: bool = False,
+        conda_mode: str = "run",
+        max_parallel: T.Optional[int] = None,
+        cache: "T.Optional[ResultCache]" = None,
+        cache_inputs: T.Optional[T.List[str]] = None,
+        stats_callback: T.Optional[T.Callable[[RunStats], T.Any]] = None,
+        parser: "T.Optional[Parser]" = None,
+        scheduler: "T.Optional[ResourceScheduler]" = None,
+        resources: T.Optional[ResourceDef] = None,
+        checkpoint: "T.Union[Journal, str, None]" = None,
+        tracer: "T.Optional[Tracer]" = None,
         ) -> Cmd2Func:
     if cmd_or_func is None:
         return functools.partial(  # type: ignore
@@ -165,11 +796,19 @@ def cmd2func(
             out_stream=out_stream, err_stream=err_stream,
             conda_env=conda_env,
             flush_streams_each_time=flush_streams_each_time,
-            popen_kwargs=popen_kwargs)
+            popen_kwargs=popen_kwargs, runner=runner,
+            passthrough_fds=passthrough_fds, conda_mode=conda_mode,
+            max_parallel=max_parallel, cache=cache,
+            cache_inputs=cache_inputs, stats_callback=stats_callback,
+            parser=parser, scheduler=scheduler, resources=resources,
+            checkpoint=checkpoint, tracer=tracer)
     else:
         return Cmd2Func(
             cmd_or_func, config, print_cmd, out_stream, err_stream,
-            conda_env, flush_streams_each_time, popen_kwargs
+            conda_env, flush_streams_each_time, popen_kwargs, runner,
+            passthrough_fds, conda_mode, max_parallel, cache, cache_inputs,
+            stats_callback, parser, scheduler, resources, checkpoint,
+            tracer,
         )
 
 
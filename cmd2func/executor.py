@@ -0,0 +1,344 @@
+"""Executor backends, which decide where the commands are run.
+
+A backend is a callable which receive the command string and return a
+runner, so it can be passed as the `runner` of `cmd2func`:
+
+- `LocalBackend`: run the commands in this process, like `runner="thread"`.
+- `AgentBackend`: send the commands to `WorkerAgent` servers over TCP,
+  each command go to the least loaded agent.
+- `ProcessPoolBackend`: an `AgentBackend` with agents started as local
+  subprocesses.
+
+Start an agent on a worker machine with:
+`CMD2FUNC_AGENT_TOKEN=SECRET python -m cmd2func.executor --host 0.0.0.0
+--port 7000`, the token can also be passed with `--token`, which is
+visible to the other users in `ps`.
+"""
+import os
+import sys
+import json
+import hmac
+import secrets
+import socket
+import argparse
+import ipaddress
+import threading
+import socketserver
+import typing as T
+import subprocess as subp
+
+from .runner import ProcessRunner, BlockingRunner, BatchGen, RUNNERS
+
+
+Address = T.Tuple[str, int]
+TOKEN_ENV = "CMD2FUNC_AGENT_TOKEN"
+
+
+class LocalBackend(object):
+    """Run the commands in this process with the runner of `name` in
+    `RUNNERS` ("thread" or "selector")."""
+    def __init__(self, runner: str = "thread") -> None:
+        self.runner_cls = RUNNERS[runner]
+
+    def __call__(self, command: str) -> ProcessRunner:
+        return self.runner_cls(command)
+
+
+def _send(wfile: T.IO[bytes], msg: T.Any):
+    wfile.write(json.dumps(msg).encode() + b"\n")
+
+
+class _AgentHandler(socketserver.StreamRequestHandler):
+    """Protocol, JSON lines over a connection per command.
+    request: {"token", "cmd", "shell", "kwargs"}
+    reply: ["stdout"|"stderr", lines]..., then ["exit", ret_code, stats]
+    or ["error", message]."""
+    server: "_AgentServer"
+
+    def handle(self):
+        req = json.loads(self.rfile.readline())
+        agent = self.server.agent
+        if not hmac.compare_digest(req.get("token", ""), agent.token):
+            _send(self.wfile, ["error", "Invalid token."])
+            return
+        runner = RUNNERS[agent.runner](req["cmd"])
+        try:
+            runner.run(shell=req.get("shell", False), **req["kwargs"])
+        except Exception as e:
+            _send(self.wfile, ["error", f"{type(e).__name__}: {e}"])
+            return
+        g = runner.stream_batches()
+        try:
+            while True:
+                try:
+                    src, lines = next(g)
+                except StopIteration as e:
+                    ret_code = e.value
+                    break
+                _send(self.wfile, [src, lines])
+                self.wfile.flush()
+        except OSError:
+            # the client is gone
+            assert runner.proc is not None
+            runner.proc.kill()
+            g.close()
+            runner.wait()
+            return
+        _send(self.wfile, ["exit", ret_code, runner.stats.to_dict()])
+
+
+class _AgentServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    agent: "WorkerAgent"
+
+
+def _is_loopback(host: str) -> bool:
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:  # a host name
+        return False
+
+
+class WorkerAgent(object):
+    """Server which run the command strings received over TCP,
+    and stream the output and the return code back.
+    Commands are run at once, in a thread per connection.
+
+    Args:
+        host: The host to listen on. Anyone can connect to it can run
+            commands as the user of the agent, so `token` is required
+            if it is not a loopback address.
+        port: The port to listen on, 0 to choose a free port.
+        token: The token that the clients must send.
+
+    Raises:
+        ValueError: If `host` is not a loopback address and `token`
+            is empty.
+        runner: The name of the runner in `RUNNERS`.
+    """
+    def __init__(
+            self, host: str = "127.0.0.1", port: int = 0,
+            token: str = "", runner: str = "thread") -> None:
+        if (not token) and (not _is_loopback(host)):
+            raise ValueError(
+                f"A token is required to listen on {host!r}, "
+                "which is not a loopback address.")
+        self.token = token
+        self.runner = runner
+        self.server = _AgentServer((host, port), _AgentHandler)
+        self.server.agent = self
+        self.thread: T.Optional[threading.Thread] = None
+
+    @property
+    def address(self) -> Address:
+        host, port = self.server.server_address[:2]
+        return str(host), int(port)
+
+    def serve_forever(self):
+        self.server.serve_forever()
+
+    def start(self) -> "WorkerAgent":
+        """Serve in a background thread."""
+        self.thread = threading.Thread(
+            target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def close(self):
+        if self.thread is not None:
+            self.server.shutdown()
+        self.server.server_close()
+
+
+class AgentBackend(object):
+    """Run the commands on `WorkerAgent`s, each command is sent to the
+    agent with the fewest running commands. An agent which can not be
+    connected is skipped.
+
+    Args:
+        addresses: The (host, port) of the agents.
+        token: The token of the agents.
+        timeout: Timeout of connecting to an agent in seconds.
+    """
+    def __init__(
+            self, addresses: T.Sequence[Address], token: str = "",
+            timeout: float = 10.0) -> None:
+        if not addresses:
+            raise ValueError("No agent address.")
+        self.addresses = [(str(h), int(p)) for h, p in addresses]
+        self.token = token
+        self.timeout = timeout
+        self.loads = [0] * len(self.addresses)
+        self.lock = threading.Lock()
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        del state["lock"]
+        state["loads"] = [0] * len(self.addresses)
+        return state
+
+    def __setstate__(self, state: dict):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def __call__(self, command: str) -> "AgentRunner":
+        return AgentRunner(command, self)
+
+    def acquire(self, exclude: T.Container[int] = ()) -> T.Optional[int]:
+        """Choose the least loaded agent and increase its load."""
+        with self.lock:
+            candidates = [
+                i for i in range(len(self.addresses)) if i not in exclude]
+            if not candidates:
+                return None
+            idx = min(candidates, key=self.loads.__getitem__)
+            self.loads[idx] += 1
+            return idx
+
+    def release(self, idx: int):
+        with self.lock:
+            self.loads[idx] -= 1
+
+    def connect(self) -> T.Tuple[int, socket.socket]:
+        """Connect to the least loaded agent which is reachable."""
+        failed: T.List[int] = []
+        while True:
+            idx = self.acquire(failed)
+            if idx is None:
+                raise ConnectionError(
+                    f"Can not connect to any agent of {self.addresses}")
+            try:
+                sock = socket.create_connection(
+                    self.addresses[idx], self.timeout)
+            except OSError:
+                self.release(idx)
+                failed.append(idx)
+                continue
+            sock.settimeout(None)
+            return idx, sock
+
+
+class AgentRunner(BlockingRunner):
+    """Run the command on an agent of the `AgentBackend`,
+    provide the same `stream` as `ProcessRunner`."""
+    def __init__(self, command: str, backend: AgentBackend) -> None:
+        super().__init__(command)
+        self.backend = backend
+        self.agent_idx: T.Optional[int] = None
+        self.sock: T.Optional[socket.socket] = None
+
+    def run(
+            self,
+            capture_stdout: bool = True,
+            capture_stderr: bool = True,
+            shell: bool = False,
+            **kwargs: T.Any):
+        """Send the command to an agent.
+
+        Args:
+            capture_stdout: Must be True.
+            capture_stderr: Must be True.
+            shell: If True, run the command using the shell.
+            **kwargs: JSON serializable keyword arguments for
+                subprocess.Popen on the agent, like `env` and `cwd`.
+        """
+        if not (capture_stdout and capture_stderr):
+            raise ValueError("Output of agent is always captured.")
+        if kwargs.pop("input", None) is not None:
+            raise ValueError("input is not supported by agents.")
+        req = json.dumps({
+            "token": self.backend.token, "cmd": self.command,
+            "shell": shell, "kwargs": kwargs,
+        }).encode() + b"\n"
+        self.stats.spawn_start()
+        self.agent_idx, self.sock = self.backend.connect()
+        self.sock.sendall(req)
+        self.stats.spawn_end()
+
+    def stream_batches(self) -> BatchGen:
+        assert (self.sock is not None) and (self.agent_idx is not None)
+        try:
+            with self.sock, self.sock.makefile("rb") as rfile:
+                for line in rfile:
+                    msg = json.loads(line)
+                    if msg[0] == "exit":
+                        _, ret_code, stats = msg
+                        self.stats.__dict__.update(stats)
+                        self.trace()
+                        return ret_code
+                    elif msg[0] == "error":
+                        raise RuntimeError(
+                            f"Agent {self.backend.addresses[self.agent_idx]}"
+                            f" failed to run {self.command!r}: {msg[1]}")
+                    src, lines = msg
+                    yield src, lines
+            raise ConnectionError(
+                f"Connection to agent "
+                f"{self.backend.addresses[self.agent_idx]} is closed.")
+        finally:
+            self.backend.release(self.agent_idx)
+            self.sock = None
+
+
+class ProcessPoolBackend(AgentBackend):
+    """Run the commands in `n_workers` local agent processes, which keep
+    the spawning and the streaming of the commands out of this process.
+
+    Args:
+        n_workers: Number of worker processes.
+        runner: The name of the runner used by the workers.
+    """
+    def __init__(self, n_workers: int = 2, runner: str = "thread") -> None:
+        self.procs: T.List[subp.Popen] = []
+        addresses = []
+        # a random token, passed in the environment to keep it out of ps
+        token = secrets.token_hex(16)
+        env = dict(os.environ, **{TOKEN_ENV: token})
+        for _ in range(n_workers):
+            proc = subp.Popen(
+                [sys.executable, "-m", "cmd2func.executor",
+                 "--runner", runner], stdout=subp.PIPE, env=env)
+            self.procs.append(proc)
+            assert proc.stdout is not None
+            host, port = proc.stdout.readline().split()
+            addresses.append((host.decode(), int(port)))
+        super().__init__(addresses, token)
+
+    def __getstate__(self) -> dict:
+        # the unpickled backend use the agents, but does not own them
+        state = super().__getstate__()
+        state["procs"] = []
+        return state
+
+    def close(self):
+        for proc in self.procs:
+            proc.terminate()
+            proc.wait()
+            if proc.stdout is not None:
+                proc.stdout.close()
+
+
+def main(argv: T.Optional[T.List[str]] = None):
+    parser = argparse.ArgumentParser(
+        description="Start a worker agent of cmd2func.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument(
+        "--token", default=os.environ.pop(TOKEN_ENV, ""),
+        help=f"default: the {TOKEN_ENV} environment variable")
+    parser.add_argument("--runner", default="thread", choices=list(RUNNERS))
+    args = parser.parse_args(argv)
+    try:
+        agent = WorkerAgent(args.host, args.port, args.token, args.runner)
+    except ValueError as e:
+        parser.error(str(e))
+    host, port = agent.address
+    print(host, port, flush=True)
+    agent.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+import re
+import csv
+import json
+import operator
+import typing as T
+
+from .runner import ProcessRunner
+
+
+Parser = T.Callable[[T.Iterable[str]], T.Iterable[T.Any]]
+
+
+class JSONLinesParser(object):
+    """Parse each non-blank line as a JSON value."""
+    def __call__(self, lines: T.Iterable[str]) -> T.Iterator[T.Any]:
+        loads = json.loads
+        for line in lines:
+            if line.strip():
+                yield loads(line)
+
+
+class CSVParser(object):
+    """Parse CSV/TSV lines with the `csv` module, quoted fields
+    spanning lines are supported.
+
+    Args:
+        delimiter: The field delimiter, "\\t" for TSV.
+        header: If True, the first row is the header and the records
+            are dicts, otherwise the records are lists of fields.
+        fieldnames: The keys of the records, if provided the records
+            are dicts and the first row is not a header.
+        **fmtparams: Other format parameters of `csv.reader`.
+    """
+    def __init__(
+            self, delimiter: str = ",", header: bool = True,
+            fieldnames: T.Optional[T.Sequence[str]] = None,
+            **fmtparams: T.Any) -> None:
+        self.delimiter = delimiter
+        self.header = header
+        self.fieldnames = fieldnames
+        self.fmtparams = fmtparams
+
+    def __call__(self, lines: T.Iterable[str]) -> T.Iterator[T.Any]:
+        if self.header or (self.fieldnames is not None):
+            return csv.DictReader(
+                lines, fieldnames=self.fieldnames,
+                delimiter=self.delimiter, **self.fmtparams)
+        return csv.reader(lines, delimiter=self.delimiter, **self.fmtparams)
+
+
+class RegexParser(object):
+    """Match each line with a regex, the records are the dict of named
+    groups, or the tuple of groups if the pattern has no named group,
+    or the matched string if it has no group.
+
+    Args:
+        pattern: The regex pattern, searched in each line.
+        flags: The regex flags.
+        skip_unmatched: If False, raise ValueError on a line that
+            does not match.
+    """
+    def __init__(
+            self, pattern: T.Union[str, T.Pattern[str]], flags: int = 0,
+            skip_unmatched: bool = True) -> None:
+        self.regex = re.compile(pattern, flags)
+        self.skip_unmatched = skip_unmatched
+
+    def __call__(self, lines: T.Iterable[str]) -> T.Iterator[T.Any]:
+        search = self.regex.search
+        if self.regex.groupindex:
+            get = operator.methodcaller("groupdict")
+        elif self.regex.groups:
+            get = operator.methodcaller("groups")
+        else:
+            get = operator.methodcaller("group", 0)
+        for line in lines:
+            m = search(line)
+            if m is not None:
+                yield get(m)
+            elif not self.skip_unmatched:
+                raise ValueError(f"Line not match {self.regex.pattern}: "
+                                 f"{line!r}")
+
+
+class Records(object):
+    """Lazy iterator of the records parsed from the stdout of a running
+    process, records are yielded as the lines arrive.
+    The stderr is written to `err_file` meanwhile.
+    `ret_code` is set when the iteration is finished.
+
+    Args:
+        runner: A runner which is already started by `run`.
+        parser: A callable which receive an iterable of lines and
+            return an iterable of records, for example `JSONLinesParser()`.
+        err_file: The file to write stderr to, None to discard it.
+        flush_streams_each_time: Whether to flush `err_file` after
+            each write.
+        on_finish: Called with this object when the process is finished.
+    """
+    def __init__(
+            self, runner: ProcessRunner, parser: Parser,
+            err_file: T.Optional[T.TextIO] = None,
+            flush_streams_each_time: bool = False,
+            on_finish: T.Optional[T.Callable[["Records"], T.Any]] = None,
+            ) -> None:
+        self.runner = runner
+        self.err_file = err_file
+        self.flush_streams_each_time = flush_streams_each_time
+        self.on_finish = on_finish
+        self.ret_code: T.Optional[T.Any] = None
+        self._lines = self._stdout_lines()
+        self._records = iter(parser(self._lines))
+
+    def _stdout_lines(self) -> T.Iterator[str]:
+        g = self.runner.stream_batches()
+        while True:
+            try:
+                src, lines = next(g)
+            except StopIteration as e:
+                self.ret_code = e.value
+                break
+            if src == "stdout":
+                yield from lines
+            elif self.err_file is not None:
+                self.err_file.write("".join(lines))
+                if self.flush_streams_each_time:
+                    self.err_file.flush()
+        if self.on_finish is not None:
+            self.on_finish(self)
+
+    def __iter__(self) -> "Records":
+        return self
+
+    def __next__(self) -> T.Any:
+        try:
+            return next(self._records)
+        except StopIteration:
+            # the parser may stop before the end of output
+            for _ in self._lines:
+                pass
+            raise
+
+    def close(self):
+        """Stop the process if it is still running, and wait it."""
+        proc = self.runner.proc
+        if (proc is not None) and (proc.poll() is None):
+            proc.kill()
+        for _ in self._lines:
+            pass
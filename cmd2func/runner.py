@@ -1,18 +1,202 @@
+import os
+import sys
+import codecs
 import shlex
+import shutil
+import functools
+import selectors
 import typing as T
 import subprocess as subp
+from collections import deque
 from threading import Thread
 from queue import Queue
 
+from .stats import RunStats, exit_code
+
+if T.TYPE_CHECKING:  # pragma: no cover
+    # asyncio is imported by the async methods, it is slow to import
+    import asyncio
+    from .trace import Tracer
+
+
+CHUNK_SIZE = 65536
+HIGH_WATER_MARK = 1024 * 1024
+ASYNC_QUEUE_SIZE = 1024
+# batches buffered for a slow consumer, each one is at most CHUNK_SIZE bytes
+BOUNDED_QUEUE_SIZE = 64
+
+Batch = T.Tuple[str, T.List[str]]
+BatchGen = T.Generator[Batch, None, T.Any]
+InputData = T.Union[
+    bytes, bytearray, memoryview, str, T.IO, T.Iterable[T.Union[bytes, str]]]
+
+
+@functools.lru_cache(maxsize=256)
+def _which(name: str, path: T.Optional[str]) -> T.Optional[str]:
+    return shutil.which(name, path=path)
+
+
+def resolve_executable(
+        name: str, env: T.Optional[T.Mapping[str, str]] = None) -> str:
+    """Resolve the executable to an absolute path from the PATH of
+    `env` (default os.environ), cached. Return `name` unchanged if it
+    already contain a directory or it is not found."""
+    if os.path.dirname(name):
+        return name
+    path = (os.environ if env is None else env).get("PATH")
+    resolved = _which(name, path)
+    if (resolved is not None) and not os.path.exists(resolved):
+        # the cached executable is removed, resolve again
+        _which.cache_clear()
+        resolved = _which(name, path)
+    return name if resolved is None else resolved
+
+
+def fast_spawn_argv(
+        command: str, kwargs: T.Dict[str, T.Any]) -> T.List[str]:
+    """Get the argv of the fast spawn path, and update the Popen
+    kwargs in place. The executable is resolved to an absolute path
+    with cache, so PATH is not searched for each spawn.
+
+    Before Python 3.10, `subprocess` fork the parent, which is slow for
+    a parent with a large heap, so `close_fds` defaults to False there,
+    which let `subprocess` use `os.posix_spawn` instead. Fds opened by
+    Python are non-inheritable (PEP 446), so only the fds explicitly made
+    inheritable are passed to the child. Since Python 3.10 `subprocess`
+    use vfork, which is faster than its posix_spawn path.
+    """
+    argv = shlex.split(command)
+    if argv and ("executable" not in kwargs):
+        argv[0] = resolve_executable(argv[0], kwargs.get("env"))
+    if sys.version_info < (3, 10):  # pragma: no cover
+        kwargs.setdefault("close_fds", False)
+    return argv
+
+
+def iter_input(
+        data: InputData, encoding: str = "utf-8",
+        chunk_size: int = CHUNK_SIZE,
+        ) -> T.Iterator[T.Union[bytes, memoryview]]:
+    """Iterate the input data in chunks: bytes-like objects are sliced
+    without copy, file objects are read in chunks, and the chunks of an
+    iterator are passed through. Strings are encoded."""
+    if isinstance(data, str):
+        data = data.encode(encoding)
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        view = memoryview(data).cast("B")
+        for i in range(0, len(view), chunk_size):
+            yield view[i:i + chunk_size]
+        return
+    if hasattr(data, "read"):
+        read = data.read  # type: ignore
+        chunks: T.Iterable[T.Union[bytes, str]] = iter(
+            lambda: read(chunk_size) or None, None)
+    else:
+        chunks = T.cast(T.Iterable[T.Union[bytes, str]], data)
+    for chunk in chunks:
+        if not chunk:
+            continue
+        yield chunk.encode(encoding) if isinstance(chunk, str) else chunk
+
+
+def iter_lines(batches: BatchGen):
+    """Flatten the batches of lines to (src, line),
+    return the return value of `batches`."""
+    while True:
+        try:
+            src, lines = next(batches)
+        except StopIteration as e:
+            return e.value
+        for line in lines:
+            yield src, line
+
 
 class ProcessRunner(object):
-    """Subprocess runner, allow stream stdout and stderr."""
-    def __init__(self, command: str) -> None:
+    """Subprocess runner, allow stream stdout and stderr.
+
+    The output is decoded with `encoding` and `errors` by an incremental
+    decoder per pipe, so a multibyte character split between reads is
+    decoded correctly.
+
+    If `tracer` is set, the spans of the process are added to it
+    when the process is waited.
+    """
+    tracer: "T.Optional[Tracer]" = None
+
+    def __init__(
+            self, command: str,
+            encoding: str = "utf-8", errors: str = "replace") -> None:
         self.command = command
-        self.queue: Queue[T.Tuple[T.IO[bytes], bytes]] = Queue(0)
+        self.encoding = encoding
+        self.errors = errors
+        self.queue: Queue[T.Optional[T.Tuple[str, T.List[str], int]]] = \
+            Queue(0)
         self.proc: T.Optional[subp.Popen] = None
         self.t_stdout: T.Optional[Thread] = None
         self.t_stderr: T.Optional[Thread] = None
+        self.t_stdin: T.Optional[Thread] = None
+        self.input_error: T.Optional[BaseException] = None
+        self.stdin_task: T.Optional[asyncio.Future] = None
+        self.aproc: T.Optional[asyncio.subprocess.Process] = None
+        self.stats = RunStats(command)
+
+    def popen(
+            self,
+            capture_stdout: bool = True,
+            capture_stderr: bool = True,
+            shell: bool = False,
+            fast_spawn: bool = False,
+            **kwargs: T.Any) -> subp.Popen:
+        """Start the process, with stdout/stderr connected to pipes
+        if they are captured. If not captured, the `stdout`/`stderr`
+        in kwargs are passed to Popen, for example a file descriptor
+        to let the child write to it directly.
+        If `fast_spawn` is True, see `fast_spawn_argv`."""
+        exe: T.Union[str, T.List[str]]
+        if shell:
+            exe = self.command
+        elif fast_spawn:
+            exe = fast_spawn_argv(self.command, kwargs)
+        else:
+            exe = shlex.split(self.command)
+        sout = subp.PIPE if capture_stdout else kwargs.pop("stdout", None)
+        serr = subp.PIPE if capture_stderr else kwargs.pop("stderr", None)
+        self.stats.spawn_start()
+        self.proc = subp.Popen(
+            exe, stdout=sout, stderr=serr, shell=shell, **kwargs)
+        self.stats.spawn_end()
+        return self.proc
+
+    def wait(self) -> int:
+        """Wait the process and return the return code, the resource
+        usage of the process is recorded to `self.stats` if `os.wait4`
+        is available."""
+        assert self.proc is not None
+        if hasattr(os, "wait4") and (self.proc.returncode is None):
+            try:
+                _, status, rusage = os.wait4(self.proc.pid, 0)
+            except ChildProcessError:  # pragma: no cover
+                self.proc.wait()
+            else:
+                self.proc.returncode = exit_code(status)
+                self.stats.record_rusage(rusage)
+        ret_code = self.proc.wait()
+        self.stats.finish(ret_code)
+        self.trace()
+        self.join_writer()
+        return ret_code
+
+    def trace(self):
+        """Add the spans of the finished run to the tracer."""
+        if self.tracer is not None:
+            self.tracer.add_run(self.stats)
+
+    def join_writer(self):
+        """Wait the stdin writer, raise the error of reading input."""
+        if self.t_stdin is not None:
+            self.t_stdin.join()
+        if self.input_error is not None:
+            raise self.input_error
 
     def run(
             self,
@@ -26,50 +210,108 @@ class ProcessRunner(object):
             capture_stdout: If True, capture stdout.
             capture_stderr: If True, capture stderr.
             shell: If True, run the command using the shell.
-            **kwargs: other keyword arguments for subprocess.Popen
+            **kwargs: other keyword arguments for subprocess.Popen,
+                and `fast_spawn`, see `fast_spawn_argv`, and `input`,
+                the data written to the stdin, see `iter_input`.
         """
-        exe: T.Union[str, T.List[str]]
-        if shell:
-            exe = self.command
-        else:
-            exe = shlex.split(self.command)
-        sout = subp.PIPE if capture_stdout else None
-        serr = subp.PIPE if capture_stderr else None
-        self.proc = subp.Popen(
-            exe, stdout=sout, stderr=serr, shell=shell, **kwargs)
+        input = kwargs.pop("input", None)
+        if input is not None:
+            kwargs["stdin"] = subp.PIPE
+        proc = self.popen(capture_stdout, capture_stderr, shell, **kwargs)
+        if input is not None:
+            self.start_writer(proc.stdin, input)
         if capture_stdout:
             self.t_stdout = Thread(
                 target=self.reader_func,
-                args=(self.proc.stdout, "stdout", self.queue))
+                args=(proc.stdout, "stdout", self.queue, self.new_decoder()))
             self.t_stdout.start()
         if capture_stderr:
             self.t_stderr = Thread(
                 target=self.reader_func,
-                args=(self.proc.stderr, "stderr", self.queue))
+                args=(proc.stderr, "stderr", self.queue, self.new_decoder()))
             self.t_stderr.start()
 
+    def new_decoder(
+            self, max_line: T.Optional[int] = None) -> "LineDecoder":
+        return LineDecoder(self.encoding, self.errors, max_line)
+
+    def start_writer(self, pipe: T.Optional[T.IO[bytes]], input: InputData):
+        """Write the input to the pipe in a thread, which run alongside
+        the reading of the output. A blocking write wait when the pipe is
+        full, so the input is consumed at the pace of the child."""
+        assert pipe is not None
+        self.t_stdin = Thread(
+            target=self.writer_func,
+            args=(pipe, iter_input(input, self.encoding)))
+        self.t_stdin.start()
+
+    def writer_func(
+            self, pipe: T.IO[bytes],
+            chunks: T.Iterator[T.Union[bytes, memoryview]]):
+        fd = pipe.fileno()
+        try:
+            for chunk in chunks:
+                view = memoryview(chunk)
+                while view:
+                    view = view[os.write(fd, view):]
+        except BrokenPipeError:
+            pass  # the child exit without reading all input
+        except BaseException as e:
+            self.input_error = e
+        finally:
+            pipe.close()
+
+    def bound_queue(self, size: int = BOUNDED_QUEUE_SIZE):
+        """Buffer at most `size` batches of the output, the reader
+        threads then wait the consumer, and the process wait on the full
+        pipe. Call it before `run`."""
+        assert self.proc is None
+        self.queue = Queue(size)
+
     @staticmethod
-    def reader_func(pipe: T.IO[bytes], label: str, queue: "Queue"):
-        """https://stackoverflow.com/a/31867499/8500469"""
+    def reader_func(
+            pipe: T.IO[bytes], label: str, queue: "Queue",
+            decoder: "LineDecoder", chunk_size: int = CHUNK_SIZE):
+        """Read the pipe in chunks, put the decoded lines of each chunk
+        to the queue as a batch.
+        https://stackoverflow.com/a/31867499/8500469"""
         try:
             with pipe:
-                for line in iter(pipe.readline, b''):
-                    queue.put((label, line))
+                fd = pipe.fileno()
+                while True:
+                    chunk = os.read(fd, chunk_size)
+                    if not chunk:
+                        break
+                    queue.put((label, decoder.feed(chunk), len(chunk)))
+                queue.put((label, decoder.flush(), 0))
         finally:
             queue.put(None)
 
     def stream(self):
-        """https://stackoverflow.com/a/31867499/8500469"""
+        """Yield the output as (src, line), return the return code."""
+        return (yield from iter_lines(self.stream_batches()))
+
+    def stream_batches(self) -> BatchGen:
+        """Yield the output as (src, lines), the lines decoded from
+        one read of the pipe are yielded together, which save the
+        per-line overhead for the commands print many short lines.
+        Return the return code."""
         num_end_signals = 0
         if self.t_stdout is not None:
             num_end_signals += 1
         if self.t_stderr is not None:
             num_end_signals += 1
+        yield from self.stream_queue(num_end_signals)
+        return self.wait()
+
+    def stream_queue(self, num_end_signals: int):
+        """Yield the batches put by the reader threads until all of them
+        put the end signal."""
         for _ in range(num_end_signals):
-            for src, line in iter(self.queue.get, None):
-                line_decoded = line.decode()
-                yield src, line_decoded
-        return self.proc.wait()
+            for src, lines, n_bytes in iter(self.queue.get, None):
+                self.stats.count_batch(src, len(lines), n_bytes)
+                if lines:
+                    yield src, lines
 
     def write_stream_until_stop(
             self,
@@ -77,20 +319,534 @@ class ProcessRunner(object):
             err_file: T.TextIO,
             flush_streams_each_time: bool = False,
             ) -> int:
-        g = self.stream()
+        """Write the output to the files until the process stop,
+        each batch of lines is written with one call.
+        Return the return code."""
+        g = self.stream_batches()
         retcode = None
         while True:
             try:
-                src, line = next(g)
+                src, lines = next(g)
                 if src == 'stdout':
                     ofile = out_file
                 else:
                     assert src == 'stderr'
                     ofile = err_file
-                ofile.write(line)
+                ofile.write("".join(lines))
                 if flush_streams_each_time:
                     ofile.flush()
             except StopIteration as e:
                 retcode = e.value
                 break
         return retcode
+
+    @staticmethod
+    def splice_func(
+            pipe: T.IO[bytes], fds: T.List[int],
+            chunk_size: int = CHUNK_SIZE):
+        """Copy bytes from the pipe to the file descriptors
+        in large chunks, without decoding."""
+        with pipe:
+            in_fd = pipe.fileno()
+            while True:
+                chunk = os.read(in_fd, chunk_size)
+                if not chunk:
+                    break
+                for fd in fds:
+                    view = memoryview(chunk)
+                    while view:
+                        view = view[os.write(fd, view):]
+
+    def splice_until_stop(
+            self,
+            out_fds: T.Optional[T.List[int]],
+            err_fds: T.Optional[T.List[int]],
+            chunk_size: int = CHUNK_SIZE,
+            ) -> int:
+        """Splice the stdout/stderr pipes, which are opened by passing
+        `stdout=subprocess.PIPE`/`stderr=subprocess.PIPE` with
+        `capture_stdout=False`/`capture_stderr=False` to `run`, to the
+        file descriptors until the process stop.
+        Return the return code."""
+        assert self.proc is not None
+        threads = []
+        for pipe, fds in ((self.proc.stdout, out_fds),
+                          (self.proc.stderr, err_fds)):
+            if pipe is None:
+                continue
+            assert fds is not None
+            t = Thread(
+                target=self.splice_func, args=(pipe, fds, chunk_size))
+            t.start()
+            threads.append(t)
+        for t in threads:
+            t.join()
+        return self.wait()
+
+    async def arun(
+            self,
+            capture_stdout: bool = True,
+            capture_stderr: bool = True,
+            shell: bool = False,
+            **kwargs: T.Any):
+        """Run the command using asyncio subprocess.
+
+        Args:
+            capture_stdout: If True, capture stdout.
+            capture_stderr: If True, capture stderr.
+            shell: If True, run the command using the shell.
+            **kwargs: other keyword arguments for
+                asyncio.create_subprocess_exec, and `input`, see `run`.
+        """
+        import asyncio
+        input = kwargs.pop("input", None)
+        if input is not None:
+            kwargs["stdin"] = subp.PIPE
+        sout = subp.PIPE if capture_stdout else None
+        serr = subp.PIPE if capture_stderr else None
+        fast_spawn = kwargs.pop("fast_spawn", False)
+        self.stats.spawn_start()
+        if shell:
+            self.aproc = await asyncio.create_subprocess_shell(
+                self.command, stdout=sout, stderr=serr, **kwargs)
+        else:
+            if fast_spawn:
+                argv = fast_spawn_argv(self.command, kwargs)
+            else:
+                argv = shlex.split(self.command)
+            self.aproc = await asyncio.create_subprocess_exec(
+                *argv, stdout=sout, stderr=serr, **kwargs)
+        self.stats.spawn_end()
+        if input is not None:
+            self.stdin_task = asyncio.ensure_future(self.awriter_func(
+                self.aproc.stdin, iter_input(input, self.encoding)))
+
+    @staticmethod
+    async def awriter_func(
+            pipe: "T.Optional[asyncio.StreamWriter]",
+            chunks: T.Iterator[T.Union[bytes, memoryview]]):
+        """Write the chunks to the stdin, wait when the pipe is full."""
+        assert pipe is not None
+        try:
+            for chunk in chunks:
+                pipe.write(chunk)
+                await pipe.drain()
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # the child exit without reading all input
+        finally:
+            pipe.close()
+
+    @staticmethod
+    async def areader_func(
+            pipe: "asyncio.StreamReader", label: str, queue: "asyncio.Queue",
+            decoder: "LineDecoder"):
+        try:
+            while True:
+                chunk = await pipe.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                await queue.put((label, decoder.feed(chunk), len(chunk)))
+            await queue.put((label, decoder.flush(), 0))
+        finally:
+            await queue.put(None)
+
+    async def astream_batches(self) -> T.AsyncIterator[Batch]:
+        """Async version of `stream_batches`, the return code can be
+        got from `self.aproc.returncode` after the iteration."""
+        import asyncio
+        assert self.aproc is not None
+        queue: asyncio.Queue = asyncio.Queue(ASYNC_QUEUE_SIZE)
+        tasks = [
+            asyncio.ensure_future(self.areader_func(
+                pipe, label, queue, self.new_decoder()))
+            for pipe, label in (
+                (self.aproc.stdout, "stdout"), (self.aproc.stderr, "stderr"))
+            if pipe is not None
+        ]
+        done = False
+        try:
+            for _ in tasks:
+                while True:
+                    item = await queue.get()
+                    if item is None:
+                        break
+                    src, lines, n_bytes = item
+                    self.stats.count_batch(src, len(lines), n_bytes)
+                    if lines:
+                        yield src, lines
+            done = True
+        finally:
+            for task in tasks:
+                task.cancel()
+            if not done:  # closed early, stop the process and wait it
+                if self.aproc.returncode is None:
+                    try:
+                        self.aproc.kill()
+                    except ProcessLookupError:
+                        pass
+                await self.aproc.wait()
+                if self.stdin_task is not None:
+                    self.stdin_task.cancel()
+        self.stats.finish(await self.aproc.wait())
+        self.trace()
+        if self.stdin_task is not None:
+            await self.stdin_task
+
+    async def astream(self) -> T.AsyncIterator[T.Tuple[str, str]]:
+        """Async version of `stream`, the return code can be
+        got from `self.aproc.returncode` after the iteration."""
+        async for src, lines in self.astream_batches():
+            for line in lines:
+                yield src, line
+
+    async def awrite_stream_until_stop(
+            self,
+            out_file: T.TextIO,
+            err_file: T.TextIO,
+            flush_streams_each_time: bool = False,
+            ) -> int:
+        """Async version of `write_stream_until_stop`."""
+        async for src, lines in self.astream_batches():
+            ofile = out_file if src == 'stdout' else err_file
+            ofile.write("".join(lines))
+            if flush_streams_each_time:
+                ofile.flush()
+        assert self.aproc is not None
+        retcode = self.aproc.returncode
+        assert retcode is not None
+        return retcode
+
+
+class BlockingRunner(ProcessRunner):
+    """Base of the runners which do not spawn a local process with
+    asyncio, the async methods run the blocking ones in threads."""
+    async def arun(self, *args: T.Any, **kwargs: T.Any):
+        """Run `run` in a thread."""
+        import asyncio
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(
+            None, functools.partial(self.run, *args, **kwargs))
+
+    async def awrite_stream_until_stop(
+            self,
+            out_file: T.TextIO,
+            err_file: T.TextIO,
+            flush_streams_each_time: bool = False,
+            ) -> int:
+        """Run `write_stream_until_stop` in a thread."""
+        import asyncio
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            None, self.write_stream_until_stop,
+            out_file, err_file, flush_streams_each_time)
+
+
+class LineSplitter(object):
+    """Split chunks of a byte stream into lines,
+    keep the incomplete tail until more data arrives.
+    The tail is kept in pieces, joined when its newline arrives,
+    so a line read in many chunks costs linear time."""
+    def __init__(self) -> None:
+        self.pieces: T.List[bytes] = []
+
+    def feed(self, chunk: bytes) -> T.List[bytes]:
+        *lines, tail = chunk.split(b"\n")
+        if not lines:
+            if tail:
+                self.pieces.append(tail)
+            return []
+        if self.pieces:
+            self.pieces.append(lines[0])
+            lines[0] = b"".join(self.pieces)
+        self.pieces = [tail] if tail else []
+        return [line + b"\n" for line in lines]
+
+    def flush(self) -> T.List[bytes]:
+        rest = b"".join(self.pieces)
+        self.pieces = []
+        return [rest] if rest else []
+
+
+class LineDecoder(object):
+    """Incremental decoder which split the decoded text into lines,
+    keep the incomplete tail until more data arrives. Like
+    `LineSplitter`, only the newly decoded text is searched.
+
+    Args:
+        encoding: The encoding of the byte stream.
+        errors: The error handling scheme of the decoder,
+            "replace" avoid `UnicodeDecodeError` on bad output.
+        max_line: If the incomplete tail reach this length,
+            it is returned as a line, to keep memory bounded.
+    """
+    def __init__(
+            self, encoding: str = "utf-8", errors: str = "replace",
+            max_line: T.Optional[int] = None) -> None:
+        self.decoder = codecs.getincrementaldecoder(encoding)(errors)
+        self.max_line = max_line
+        self.pieces: T.List[str] = []
+        self.size = 0
+
+    def feed(self, chunk: bytes) -> T.List[str]:
+        *lines, tail = self.decoder.decode(chunk).split("\n")
+        if lines:
+            if self.pieces:
+                self.pieces.append(lines[0])
+                lines[0] = "".join(self.pieces)
+            lines = [line + "\n" for line in lines]
+            self.pieces, self.size = [], 0
+        if tail:
+            self.pieces.append(tail)
+            self.size += len(tail)
+        if (self.max_line is not None) and (self.size >= self.max_line):
+            lines.append("".join(self.pieces))
+            self.pieces, self.size = [], 0
+        return lines
+
+    def flush(self) -> T.List[str]:
+        self.pieces.append(self.decoder.decode(b"", final=True))
+        rest = "".join(self.pieces)
+        self.pieces, self.size = [], 0
+        return [rest] if rest else []
+
+
+class PipeWriter(object):
+    """Write the chunks to a nonblocking pipe when it is ready.
+    An error of reading the chunks is stored in `error`."""
+    def __init__(
+            self, chunks: T.Iterator[T.Union[bytes, memoryview]]) -> None:
+        self.chunks = chunks
+        self.pending = memoryview(b"")
+        self.error: T.Optional[Exception] = None
+
+    def write_ready(self, fd: int) -> bool:
+        """Write until the pipe is full, return True if all chunks
+        are written, the reader is closed or reading the chunks
+        failed."""
+        try:
+            while True:
+                if not self.pending:
+                    chunk = next(self.chunks, None)
+                    if chunk is None:
+                        return True
+                    self.pending = memoryview(chunk)
+                self.pending = self.pending[os.write(fd, self.pending):]
+        except BlockingIOError:
+            return False
+        except BrokenPipeError:
+            return True
+        except Exception as e:
+            self.error = e
+            return True
+
+
+class SelectorProcessRunner(ProcessRunner):
+    """Subprocess runner which read stdout and stderr from the
+    calling thread with `selectors`, no reader thread is started.
+
+    Read chunks are decoded to lines and kept in a buffer bounded by
+    `high_water_mark` bytes.
+    When the buffer is full the pipes are not read until the consumer
+    of `stream` catches up, so a fast writer is slowed down by the
+    pipe (backpressure) instead of growing the memory.
+    """
+    def __init__(
+            self, command: str,
+            high_water_mark: int = HIGH_WATER_MARK,
+            chunk_size: int = CHUNK_SIZE,
+            encoding: str = "utf-8", errors: str = "replace") -> None:
+        super().__init__(command, encoding, errors)
+        self.high_water_mark = high_water_mark
+        self.chunk_size = chunk_size
+        self.buffer: T.Deque[T.Tuple[str, T.List[str], int]] = deque()
+        self.buffered_bytes = 0
+        self.selector: T.Optional[selectors.BaseSelector] = None
+
+    def run(
+            self,
+            capture_stdout: bool = True,
+            capture_stderr: bool = True,
+            shell: bool = False,
+            **kwargs: T.Any):
+        """Run the command using subprocess.Popen.
+
+        Args:
+            capture_stdout: If True, capture stdout.
+            capture_stderr: If True, capture stderr.
+            shell: If True, run the command using the shell.
+            **kwargs: other keyword arguments for subprocess.Popen,
+                and `input`, the data written to the stdin without
+                blocking when the pipe is ready, see `iter_input`.
+        """
+        input = kwargs.pop("input", None)
+        if input is not None:
+            kwargs["stdin"] = subp.PIPE
+        proc = self.popen(capture_stdout, capture_stderr, shell, **kwargs)
+        self.selector = selectors.DefaultSelector()
+        for pipe, label in ((proc.stdout, "stdout"), (proc.stderr, "stderr")):
+            if pipe is not None:
+                self.selector.register(
+                    pipe, selectors.EVENT_READ,
+                    (label, self.new_decoder(self.high_water_mark), pipe))
+        if input is not None:
+            assert proc.stdin is not None
+            os.set_blocking(proc.stdin.fileno(), False)
+            self.selector.register(
+                proc.stdin, selectors.EVENT_WRITE,
+                ("stdin", PipeWriter(iter_input(input, self.encoding)),
+                 proc.stdin))
+
+    def _push(self, label: str, lines: T.List[str], n_bytes: int):
+        self.buffer.append((label, lines, n_bytes))
+        self.buffered_bytes += n_bytes
+
+    def _read_ready(self, timeout: T.Optional[float]) -> None:
+        """Read from the ready pipes, until the buffer reach the
+        high water mark or no more data is ready."""
+        assert self.selector is not None
+        while self.selector.get_map():
+            events = self.selector.select(timeout)
+            if not events:
+                return
+            for key, _ in events:
+                label, decoder, pipe = key.data
+                if label == "stdin":
+                    if decoder.write_ready(key.fd):
+                        self.selector.unregister(pipe)
+                        pipe.close()
+                        # raised by `wait`, like the thread runner
+                        self.input_error = decoder.error
+                    continue
+                chunk = os.read(key.fd, self.chunk_size)
+                if chunk:
+                    self._push(label, decoder.feed(chunk), len(chunk))
+                else:
+                    self._push(label, decoder.flush(), 0)
+                    self.selector.unregister(pipe)
+                    pipe.close()
+            if self.buffered_bytes >= self.high_water_mark:
+                return
+            timeout = 0
+
+    def stream_batches(self) -> BatchGen:
+        assert self.selector is not None
+        while self.buffer or self.selector.get_map():
+            if not self.buffer:
+                self._read_ready(None)
+                continue
+            src, lines, n_bytes = self.buffer.popleft()
+            self.buffered_bytes -= n_bytes
+            self.stats.count_batch(src, len(lines), n_bytes)
+            if lines:
+                yield src, lines
+        self.selector.close()
+        return self.wait()
+
+
+class PipelineRunner(ProcessRunner):
+    """Run commands connected with OS pipes, the stdout of each command
+    is the stdin of the next one. Only the stdout of the last command
+    and the stderr of all commands are streamed, `stream` return the
+    list of return codes."""
+    def __init__(
+            self, commands: T.List[str],
+            encoding: str = "utf-8", errors: str = "replace") -> None:
+        super().__init__(" | ".join(commands), encoding, errors)
+        self.commands = commands
+        self.procs: T.List[subp.Popen] = []
+        self.threads: T.List[Thread] = []
+
+    def run(
+            self,
+            capture_stdout: bool = True,
+            capture_stderr: bool = True,
+            shell: bool = False,
+            stages_kwargs: T.Optional[T.List[dict]] = None,
+            **kwargs: T.Any):
+        """Run the commands using subprocess.Popen.
+
+        Args:
+            capture_stdout: If True, capture stdout of the last command.
+            capture_stderr: If True, capture stderr of all commands.
+            shell: If True, run the commands using the shell, can be
+                overridden by `shell` in `stages_kwargs`.
+            stages_kwargs: keyword arguments for subprocess.Popen
+                of each command, override the `kwargs`. `stdin` and
+                `stdout` are not allowed, as the commands are connected
+                by the pipeline.
+            **kwargs: other keyword arguments for subprocess.Popen,
+                and `input`, the data written to the stdin of the first
+                command.
+        """
+        stages_kwargs = stages_kwargs or [{} for _ in self.commands]
+        for stage_kwargs in stages_kwargs:
+            for key in ("stdin", "stdout"):
+                if key in stage_kwargs:
+                    raise ValueError(
+                        f"{key} of a pipeline stage is connected by the "
+                        "pipeline, it can not be set.")
+        input = kwargs.pop("input", None)
+        stdin = kwargs.pop("stdin", None)
+        if input is not None:
+            stdin = subp.PIPE
+        n_last = len(self.commands) - 1
+        try:
+            for i, (cmd, stage_kwargs) in enumerate(
+                    zip(self.commands, stages_kwargs)):
+                stage_kwargs = {**kwargs, **stage_kwargs}
+                stage_shell = stage_kwargs.pop("shell", shell)
+                if i < n_last:
+                    stage_kwargs["stdout"] = subp.PIPE
+                proc = ProcessRunner(cmd).popen(
+                    capture_stdout and (i == n_last), capture_stderr,
+                    stage_shell, stdin=stdin, **stage_kwargs)
+                if i > 0:
+                    # close the parent's copy, so the writer get SIGPIPE
+                    # if the reader exit early
+                    stdin.close()
+                elif input is not None:
+                    self.start_writer(proc.stdin, input)
+                stdin = proc.stdout
+                self.procs.append(proc)
+                if capture_stderr:
+                    self._start_reader(proc.stderr, "stderr")
+        except BaseException:
+            self._abort()
+            raise
+        self.proc = self.procs[-1]
+        if capture_stdout:
+            self._start_reader(self.proc.stdout, "stdout")
+
+    def _abort(self):
+        """Kill and wait the stages started before a stage failed
+        to spawn."""
+        if self.procs and (self.procs[-1].stdout is not None):
+            self.procs[-1].stdout.close()
+        for proc in self.procs:
+            if proc.poll() is None:
+                proc.kill()
+            proc.wait()
+        for t in self.threads:
+            t.join()
+        if self.t_stdin is not None:
+            self.t_stdin.join()
+
+    def _start_reader(self, pipe: T.Optional[T.IO[bytes]], label: str):
+        assert pipe is not None
+        t = Thread(
+            target=self.reader_func,
+            args=(pipe, label, self.queue, self.new_decoder()))
+        t.start()
+        self.threads.append(t)
+
+    def stream_batches(self) -> BatchGen:
+        yield from self.stream_queue(len(self.threads))
+        ret_codes = [proc.wait() for proc in self.procs]
+        self.join_writer()
+        return ret_codes
+
+
+RUNNERS: T.Dict[str, T.Callable[[str], ProcessRunner]] = {
+    "thread": ProcessRunner,
+    "selector": SelectorProcessRunner,
+}
@@ -0,0 +1,220 @@
+import os
+import re
+import ast
+import asyncio
+import operator
+import threading
+import typing as T
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+from .config import ResourceDef
+
+
+MEMORY_UNITS = {"": 1, "K": 1 << 10, "M": 1 << 20, "G": 1 << 30, "T": 1 << 40}
+
+_BIN_OPS: T.Dict[type, T.Callable[[T.Any, T.Any], T.Any]] = {
+    ast.Add: operator.add, ast.Sub: operator.sub,
+    ast.Mult: operator.mul, ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+}
+
+
+def _eval_node(node: ast.AST) -> float:
+    if isinstance(node, ast.Constant) and \
+            isinstance(node.value, (int, float)):
+        return node.value
+    elif isinstance(node, ast.BinOp) and (type(node.op) in _BIN_OPS):
+        return _BIN_OPS[type(node.op)](
+            _eval_node(node.left), _eval_node(node.right))
+    elif isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+        return -_eval_node(node.operand)
+    raise ValueError(f"Unsupported expression: {ast.dump(node)}")
+
+
+def eval_amount(
+        value: T.Union[int, float, str], vals: T.Mapping[str, T.Any],
+        units: T.Optional[T.Dict[str, int]] = None) -> float:
+    """Evaluate a resource amount, a string is formatted with `vals` and
+    evaluated as an arithmetic expression with an optional unit suffix,
+    for example "{threads} * 2" or "{size_gb}G"."""
+    if not isinstance(value, str):
+        return value
+    expr = value.format(**vals).strip()
+    scale = 1
+    if units is not None:
+        m = re.fullmatch(r"(.*?)\s*([KMGT]?)i?B?", expr, re.IGNORECASE)
+        if m is not None:
+            expr, scale = m.group(1), units[m.group(2).upper()]
+    return _eval_node(ast.parse(expr, mode="eval").body) * scale
+
+
+def eval_resources(
+        resources: T.Optional[ResourceDef],
+        vals: T.Mapping[str, T.Any]) -> T.Dict[str, float]:
+    """Evaluate the declared resources with the argument values,
+    by default a run needs 1 CPU and no memory."""
+    resources = resources or {}
+    return {
+        "cpus": eval_amount(resources.get("cpus", 1), vals),
+        "memory": eval_amount(
+            resources.get("memory", 0), vals, MEMORY_UNITS),
+    }
+
+
+def _wake(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+
+class _Ticket(object):
+    def __init__(
+            self, request: T.Dict[str, float],
+            future: T.Optional[asyncio.Future] = None) -> None:
+        self.request = request
+        self.granted = False
+        self.skips = 0
+        self.future = future
+
+    def grant(self):
+        self.granted = True
+        if self.future is not None:
+            self.future.get_loop().call_soon_threadsafe(_wake, self.future)
+
+
+class ResourceScheduler(object):
+    """Admit the runs only when their resources fit in the budget.
+
+    Waiting runs are queued per caller, and the callers are served in
+    round robin, so a caller submitting many runs does not starve the
+    others. A run which does not fit is skipped while smaller runs of
+    other callers fit, to keep the resources used, until it has been
+    skipped `max_skips` times, then the resources are reserved for it:
+    no other run is admitted before it. A request larger than the budget
+    is reduced to the budget, so it runs alone.
+
+    Args:
+        cpus: The number of CPUs in the budget. default: os.cpu_count().
+        memory: The memory in bytes in the budget. default: None,
+            unlimited.
+        max_skips: The number of times a run can be skipped by smaller
+            runs. default: 8.
+    """
+    def __init__(
+            self, cpus: T.Optional[float] = None,
+            memory: T.Optional[float] = None,
+            max_skips: int = 8) -> None:
+        self.budget = {
+            "cpus": float(cpus or os.cpu_count() or 1),
+            "memory": float("inf") if memory is None else float(memory),
+        }
+        self.max_skips = max_skips
+        self.used = {k: 0.0 for k in self.budget}
+        self.cond = threading.Condition()
+        self.queues: T.OrderedDict[T.Hashable, T.Deque[_Ticket]] = \
+            OrderedDict()
+
+    def __reduce__(self):
+        # the budget is pickled, not the runs using it
+        return (self.__class__, (
+            self.budget["cpus"], self.budget["memory"], self.max_skips))
+
+    def _clamp(self, request: T.Dict[str, float]) -> T.Dict[str, float]:
+        return {
+            k: min(request.get(k, 0.0), self.budget[k]) for k in self.budget}
+
+    def _fits(self, request: T.Dict[str, float]) -> bool:
+        return all(
+            self.used[k] + request[k] <= self.budget[k] for k in self.budget)
+
+    def _grant(self, caller: T.Hashable):
+        queue = self.queues.pop(caller)
+        ticket = queue.popleft()
+        for k, v in ticket.request.items():
+            self.used[k] += v
+        ticket.grant()
+        # move the served caller to the end
+        if queue:
+            self.queues[caller] = queue
+
+    def _dispatch(self):
+        """Grant the head runs of the callers in round robin order,
+        the runs skipped too many times first."""
+        any_granted = False
+        granted = True
+        while granted and self.queues:
+            granted = False
+            starving = [
+                c for c, q in self.queues.items()
+                if q[0].skips >= self.max_skips]
+            if starving:
+                if not self._fits(self.queues[starving[0]][0].request):
+                    break  # reserve the resources for it
+                self._grant(starving[0])
+                any_granted = granted = True
+                continue
+            for caller in list(self.queues):
+                if not self._fits(self.queues[caller][0].request):
+                    continue
+                self._grant(caller)
+                any_granted = granted = True
+        if any_granted:
+            for queue in self.queues.values():
+                if not self._fits(queue[0].request):
+                    queue[0].skips += 1
+        self.cond.notify_all()
+
+    def acquire(
+            self, request: T.Dict[str, float],
+            caller: T.Hashable = None) -> T.Dict[str, float]:
+        """Block until the request fits, return the (clamped) request
+        which should be passed to `release`."""
+        ticket = _Ticket(self._clamp(request))
+        with self.cond:
+            self.queues.setdefault(caller, deque()).append(ticket)
+            self._dispatch()
+            while not ticket.granted:
+                self.cond.wait()
+        return ticket.request
+
+    async def aacquire(
+            self, request: T.Dict[str, float],
+            caller: T.Hashable = None) -> T.Dict[str, float]:
+        """Async version of `acquire`, wait without a thread. If the
+        waiting is cancelled, the run is removed from the queue, or the
+        granted resources are released."""
+        future = asyncio.get_running_loop().create_future()
+        ticket = _Ticket(self._clamp(request), future)
+        with self.cond:
+            self.queues.setdefault(caller, deque()).append(ticket)
+            self._dispatch()
+        try:
+            await future
+        except BaseException:
+            with self.cond:
+                if ticket.granted:
+                    for k, v in ticket.request.items():
+                        self.used[k] -= v
+                else:
+                    queue = self.queues[caller]
+                    queue.remove(ticket)
+                    if not queue:
+                        del self.queues[caller]
+                self._dispatch()
+            raise
+        return ticket.request
+
+    def release(self, request: T.Dict[str, float]):
+        with self.cond:
+            for k, v in request.items():
+                self.used[k] -= v
+            self._dispatch()
+
+    @contextmanager
+    def use(self, request: T.Dict[str, float], caller: T.Hashable = None):
+        """Context manager of `acquire` and `release`."""
+        granted = self.acquire(request, caller)
+        try:
+            yield granted
+        finally:
+            self.release(granted)
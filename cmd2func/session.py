@@ -0,0 +1,220 @@
+import os
+import shlex
+import uuid
+import selectors
+import typing as T
+import subprocess as subp
+from queue import Queue
+
+from .runner import (
+    BlockingRunner, LineSplitter, BatchGen, CHUNK_SIZE,
+)
+
+
+class ShellSession(object):
+    """A long-lived shell process, which run the commands sent over its
+    stdin, so a command does not cost the startup of a new shell.
+    POSIX only.
+
+    Each command is run by `eval` in a subshell with stdin from
+    /dev/null, so a command which can not be parsed (an unbalanced quote)
+    fails with a non-zero return code instead of leaving the shell
+    waiting for the rest. The end of its output and its return code are
+    found by an unique sentinel printed after it.
+    """
+    def __init__(self, shell: str = "/bin/sh") -> None:
+        self.shell = shell
+        self.proc: T.Optional[subp.Popen] = None
+        self.selector: T.Optional[selectors.BaseSelector] = None
+
+    def __getstate__(self) -> dict:
+        # the shell is not pickled, it is started on the first command
+        return {"shell": self.shell}
+
+    def __setstate__(self, state: dict):
+        self.__init__(state["shell"])  # type: ignore
+
+    @property
+    def alive(self) -> bool:
+        return (self.proc is not None) and (self.proc.poll() is None)
+
+    def start(self):
+        self.close()
+        self.proc = subp.Popen(
+            [self.shell], stdin=subp.PIPE,
+            stdout=subp.PIPE, stderr=subp.PIPE)
+        self.selector = selectors.DefaultSelector()
+        for pipe, label in (
+                (self.proc.stdout, "stdout"), (self.proc.stderr, "stderr")):
+            self.selector.register(
+                pipe, selectors.EVENT_READ, (label, LineSplitter()))
+
+    def close(self):
+        if self.selector is not None:
+            self.selector.close()
+            self.selector = None
+        if self.proc is not None:
+            for pipe in (self.proc.stdin, self.proc.stdout, self.proc.stderr):
+                if pipe is not None:
+                    pipe.close()
+            if self.proc.poll() is None:
+                self.proc.kill()
+            self.proc.wait()
+            self.proc = None
+
+    def send(self, command: str, sentinel: str):
+        """Send the command to the shell, start a new shell if
+        the old one is dead."""
+        if not self.alive:
+            self.start()
+        assert (self.proc is not None) and (self.proc.stdin is not None)
+        script = (
+            f"( eval {shlex.quote(command)}\n) </dev/null; "
+            f"printf '%s %d\\n' '{sentinel}' $?; "
+            f"printf '%s\\n' '{sentinel}' >&2\n"
+        )
+        try:
+            self.proc.stdin.write(script.encode())
+            self.proc.stdin.flush()
+        except BrokenPipeError:
+            pass  # the shell is dead, found by reading EOF
+
+    def read_until(self, sentinel: str):
+        """Yield the (src, data) of each read until the sentinel of the
+        command, data is the complete lines read. Return the return code.
+        """
+        assert self.selector is not None
+        mark = sentinel.encode()
+        ret_code = None
+        n_done = 0
+        while n_done < 2:
+            for key, _ in self.selector.select():
+                label, splitter = key.data
+                chunk = os.read(key.fd, CHUNK_SIZE)
+                if not chunk:
+                    # the shell is dead
+                    yield label, b"".join(splitter.flush())
+                    assert self.proc is not None
+                    ret_code = self.proc.wait()
+                    self.close()
+                    return ret_code
+                data = []
+                for line in splitter.feed(chunk):
+                    idx = line.find(mark)
+                    if idx < 0:
+                        data.append(line)
+                        continue
+                    data.append(line[:idx])
+                    if label == "stdout":
+                        ret_code = int(line[idx + len(mark):])
+                    n_done += 1
+                yield label, b"".join(data)
+        return ret_code
+
+
+class ShellSessionPool(object):
+    """A pool of `ShellSession`, each command use an idle session.
+
+    Use `pool.runner` as the runner of `cmd2func`, for example:
+    `cmd2func(cmd, runner=ShellSessionPool(2).runner)`.
+    """
+    def __init__(self, size: int = 1, shell: str = "/bin/sh") -> None:
+        self.sessions = [ShellSession(shell) for _ in range(size)]
+        self.idle: Queue[ShellSession] = Queue()
+        for session in self.sessions:
+            self.idle.put(session)
+
+    def __getstate__(self) -> dict:
+        return {"size": len(self.sessions), "shell": self.sessions[0].shell}
+
+    def __setstate__(self, state: dict):
+        self.__init__(state["size"], state["shell"])  # type: ignore
+
+    def runner(self, command: str) -> "SessionRunner":
+        return SessionRunner(command, self)
+
+    def close(self):
+        for session in self.sessions:
+            session.close()
+
+
+class SessionRunner(BlockingRunner):
+    """Run the command in a shell session of the pool,
+    provide the same `stream` as `ProcessRunner`."""
+    def __init__(
+            self, command: str, pool: ShellSessionPool,
+            encoding: str = "utf-8", errors: str = "replace") -> None:
+        super().__init__(command, encoding, errors)
+        self.pool = pool
+        self.session: T.Optional[ShellSession] = None
+        self.sentinel = f"__cmd2func_{uuid.uuid4().hex}__"
+
+    def run(
+            self,
+            capture_stdout: bool = True,
+            capture_stderr: bool = True,
+            shell: bool = False,
+            **kwargs: T.Any):
+        """Send the command to an idle session.
+
+        Args:
+            capture_stdout: Must be True.
+            capture_stderr: Must be True.
+            shell: Ignored, the command is always run by the shell.
+            **kwargs: `env` and `cwd` are applied in the subshell of
+                the command, `fast_spawn` is ignored.
+        """
+        if not (capture_stdout and capture_stderr):
+            raise ValueError("Output of shell session is always captured.")
+        kwargs.pop("fast_spawn", None)
+        prelude = ""
+        env = kwargs.pop("env", None)
+        if env is not None:
+            prelude += "".join(
+                f"export {k}={shlex.quote(v)}\n" for k, v in env.items()
+                if k.isidentifier())
+        cwd = kwargs.pop("cwd", None)
+        if cwd is not None:
+            prelude += f"cd {shlex.quote(os.fspath(cwd))} || exit 1\n"
+        if kwargs:
+            raise ValueError(
+                f"Arguments not supported by shell session: {list(kwargs)}")
+        self.session = self.pool.idle.get()
+        self.stats.spawn_start()
+        self.session.send(prelude + self.command, self.sentinel)
+        self.stats.spawn_end()
+
+    def stream_batches(self) -> BatchGen:
+        assert self.session is not None
+        ret_code = None
+        done = False
+        decoders = {
+            "stdout": self.new_decoder(), "stderr": self.new_decoder()}
+        try:
+            g = self.session.read_until(self.sentinel)
+            while True:
+                try:
+                    src, data = next(g)
+                except StopIteration as e:
+                    ret_code = e.value
+                    done = True
+                    break
+                lines = decoders[src].feed(data)
+                self.stats.count_batch(src, len(lines), len(data))
+                if lines:
+                    yield src, lines
+            for src, decoder in decoders.items():
+                lines = decoder.flush()
+                self.stats.count_batch(src, len(lines), 0)
+                if lines:
+                    yield src, lines
+        finally:
+            if not done:
+                # abandoned before the sentinels, the rest output of
+                # the command would be read by the next one
+                self.session.close()
+            self.pool.idle.put(self.session)
+            self.session = None
+        self.stats.finish(ret_code)
+        self.trace()
+        return ret_code
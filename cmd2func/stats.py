@@ -0,0 +1,76 @@
+import os
+import sys
+import time
+import typing as T
+
+
+def exit_code(status: int) -> int:
+    """Convert the wait status to the return code like Popen,
+    negative signal number if the process is killed by a signal."""
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+
+class RunStats(object):
+    """Resource accounting of a command run.
+
+    Attributes:
+        cmd: The command string.
+        ret_code: The return code.
+        start_time: Unix time when the process is spawned.
+        spawn_latency: Seconds spent in spawning the process.
+        first_output: Seconds from spawning to the first output is read,
+            None if there is no (captured) output.
+        wall_time: Seconds from spawning to the process is waited.
+        user_time: User CPU seconds of the process, None if unknown.
+        sys_time: System CPU seconds of the process, None if unknown.
+        max_rss: Max resident set size of the process in bytes,
+            None if unknown.
+        lines: Number of lines streamed, per stream.
+        bytes: Number of bytes streamed, per stream.
+    """
+    def __init__(self, cmd: str) -> None:
+        self.cmd = cmd
+        self.ret_code: T.Optional[int] = None
+        self.start_time: T.Optional[float] = None
+        self.spawn_latency: T.Optional[float] = None
+        self.first_output: T.Optional[float] = None
+        self.wall_time: T.Optional[float] = None
+        self.user_time: T.Optional[float] = None
+        self.sys_time: T.Optional[float] = None
+        self.max_rss: T.Optional[int] = None
+        self.lines = {"stdout": 0, "stderr": 0}
+        self.bytes = {"stdout": 0, "stderr": 0}
+        self._t0 = 0.0
+
+    def spawn_start(self):
+        self.start_time = time.time()
+        self._t0 = time.perf_counter()
+
+    def spawn_end(self):
+        self.spawn_latency = time.perf_counter() - self._t0
+
+    def count_batch(self, src: str, n_lines: int, n_bytes: int):
+        if (self.first_output is None) and n_bytes:
+            self.first_output = time.perf_counter() - self._t0
+        self.lines[src] += n_lines
+        self.bytes[src] += n_bytes
+
+    def record_rusage(self, rusage: T.Any):
+        self.user_time = rusage.ru_utime
+        self.sys_time = rusage.ru_stime
+        # ru_maxrss is in KiB on Linux, bytes on macOS
+        scale = 1 if sys.platform == "darwin" else 1024
+        self.max_rss = rusage.ru_maxrss * scale
+
+    def finish(self, ret_code: int):
+        self.ret_code = ret_code
+        self.wall_time = time.perf_counter() - self._t0
+
+    def to_dict(self) -> T.Dict[str, T.Any]:
+        return {
+            k: v for k, v in self.__dict__.items() if not k.startswith("_")}
+
+    def __repr__(self) -> str:
+        return f"RunStats({self.to_dict()})"
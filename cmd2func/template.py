@@ -0,0 +1,193 @@
+import copy
+import inspect
+import string
+import operator
+import typing as T
+from collections import OrderedDict
+from threading import Lock
+
+from funcdesc import Description
+from funcdesc.desc import NotDef
+
+from .config import CLIConfig, config_to_desc
+from .cmd import Command
+
+
+TEMPLATE_CACHE_SIZE = 256
+
+
+def compose_signature(desc: Description) -> inspect.Signature:
+    parameters = []
+    for arg in desc.inputs:
+        param = inspect.Parameter(
+            arg.name, inspect.Parameter.POSITIONAL_OR_KEYWORD,
+            default=arg.default, annotation=arg)
+        parameters.append(param)
+    sig = inspect.Signature(parameters)
+    return sig
+
+
+def replace_vals(vals: dict, desc: Description) -> dict:
+    vals = vals.copy()
+    name_to_arg = {v.name: v for v in desc.inputs}
+    for key, val in vals.items():
+        arg_obj = name_to_arg[key]
+        if (val is True) and ('true_insert' in arg_obj.kwargs):
+            vals[key] = arg_obj.kwargs['true_insert']
+        if (val is False) and ('false_insert' in arg_obj.kwargs):
+            vals[key] = arg_obj.kwargs['false_insert']
+    return vals
+
+
+def compile_format(
+        template: str, names: T.Sequence[str],
+        ) -> T.Optional[
+            T.Tuple[str, T.Callable[[dict], tuple], T.List[str]]]:
+    """Convert the `str.format` template to a printf-style pattern,
+    a getter of the values tuple and the names of the fields in order.
+    Return None if the template use format specs, conversions or fields
+    which are not plain names."""
+    pieces = []
+    fields = []
+    for literal, field, spec, conversion in \
+            string.Formatter().parse(template):
+        pieces.append(literal.replace("%", "%%"))
+        if field is None:
+            continue
+        if spec or conversion or (field not in names):
+            return None
+        pieces.append("%s")
+        fields.append(field)
+    pattern = "".join(pieces)
+    return pattern, tuple_getter(fields), fields
+
+
+def tuple_getter(keys: T.Sequence[T.Any]) -> T.Callable[[T.Any], tuple]:
+    """Like `operator.itemgetter`, but always return a tuple."""
+    if len(keys) == 0:
+        return lambda vals: ()
+    elif len(keys) == 1:
+        key = keys[0]
+        return lambda vals: (vals[key],)
+    else:
+        return operator.itemgetter(*keys)  # type: ignore
+
+
+class CompiledTemplate(object):
+    """Command template with the config, the argument binding, the
+    true/false insert tables and the placeholder layout resolved once,
+    so `render` only binds the values and fills a printf-style pattern."""
+    def __init__(
+            self, command: str,
+            config: T.Optional[CLIConfig] = None,
+            ) -> None:
+        self.command = Command(command)
+        if config is None:
+            config = self.command.infer_config()
+        else:
+            config = self.command.complete_config(copy.deepcopy(config))
+        self.config = config
+        self.desc = config_to_desc(config)
+        self.command.check_placeholder([v.name for v in self.desc.inputs])
+        self.signature = compose_signature(self.desc)
+        self.names = tuple(v.name for v in self.desc.inputs)
+        self.defaults = tuple(v.default for v in self.desc.inputs)
+        self.true_inserts = {
+            v.name: v.kwargs['true_insert'] for v in self.desc.inputs
+            if 'true_insert' in v.kwargs}
+        self.false_inserts = {
+            v.name: v.kwargs['false_insert'] for v in self.desc.inputs
+            if 'false_insert' in v.kwargs}
+        self.unbound = [
+            ph for ph in self.command.placeholders if ph not in self.names]
+        self.plan = None if self.unbound else \
+            compile_format(self.command.template, self.names)
+
+    def bind(self, args: tuple, kwargs: dict) -> T.Dict[str, T.Any]:
+        """Bind the arguments to the placeholder values,
+        same as `Description.parse_pass_in`."""
+        n_pos = len(args)
+        vals = dict(zip(self.names, args))
+        if n_pos >= len(self.names):
+            return vals
+        for name, default in zip(
+                self.names[n_pos:], self.defaults[n_pos:]):
+            if name in kwargs:
+                vals[name] = kwargs[name]
+            elif default is not NotDef:
+                vals[name] = default
+            else:
+                raise TypeError(
+                    f"{name} is not provided and has no default value.")
+        return vals
+
+    def apply_inserts(self, vals: T.Dict[str, T.Any]) -> T.Dict[str, T.Any]:
+        for name, insert in self.true_inserts.items():
+            if vals[name] is True:
+                vals[name] = insert
+        for name, insert in self.false_inserts.items():
+            if vals[name] is False:
+                vals[name] = insert
+        return vals
+
+    def format(self, vals: T.Dict[str, T.Any]) -> str:
+        if self.plan is not None:
+            pattern, getter, _ = self.plan
+            return pattern % getter(vals)
+        if self.unbound:
+            raise ValueError(
+                f"The value of placeholder {self.unbound[0]} "
+                "is not provided.")
+        return self.command.template.format_map(vals)
+
+    def render(self, args: tuple, kwargs: dict) -> str:
+        """Get the command string from the arguments."""
+        return self.format(self.apply_inserts(self.bind(args, kwargs)))
+
+
+_template_cache: "OrderedDict[T.Tuple[str, T.Hashable], CompiledTemplate]" \
+    = OrderedDict()
+_template_cache_lock = Lock()
+
+
+_SCALARS = (str, int, float, bool, type(None))
+
+
+def _freeze(obj: T.Any) -> T.Hashable:
+    """Convert a config to a hashable key, the values are tagged with
+    their types, so `[1, 2]` and `(1, 2)` (or `1` and `True`) are not
+    the same. Raise TypeError for the unsupported values."""
+    if isinstance(obj, dict):
+        items = tuple(sorted(
+            ((_freeze(k), _freeze(v)) for k, v in obj.items()), key=repr))
+        return ("dict", items)
+    if isinstance(obj, (list, tuple)):
+        return (type(obj).__name__, tuple(_freeze(v) for v in obj))
+    if type(obj) in _SCALARS:
+        return (type(obj).__name__, obj)
+    raise TypeError(f"Unsupported config value: {obj!r}")
+
+
+def compile_template(
+        command: str,
+        config: T.Optional[CLIConfig] = None,
+        ) -> CompiledTemplate:
+    """Get the compiled template from the process-wide LRU cache,
+    keyed by the template and the config. Configs with values other
+    than dicts, lists, tuples and scalars are compiled without caching.
+    """
+    try:
+        key = (command, _freeze(config))
+    except TypeError:
+        return CompiledTemplate(command, config)
+    with _template_cache_lock:
+        template = _template_cache.get(key)
+        if template is not None:
+            _template_cache.move_to_end(key)
+            return template
+    template = CompiledTemplate(command, config)
+    with _template_cache_lock:
+        _template_cache[key] = template
+        if len(_template_cache) > TEMPLATE_CACHE_SIZE:
+            _template_cache.popitem(last=False)
+    return template
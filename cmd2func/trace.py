@@ -0,0 +1,114 @@
+import os
+import json
+import time
+import threading
+import typing as T
+from contextlib import contextmanager
+
+from .stats import RunStats
+
+
+class Tracer(object):
+    """Record the timeline of the runs as spans, which can be saved in
+    the Chrome trace event format, and opened in `chrome://tracing` or
+    https://ui.perfetto.dev . The spans of a thread are nested by time:
+    call → workflow → step → run → process → spawn/drain.
+
+    Pass it as `tracer` to `cmd2func`, and save it after the calls,
+    or use it as a context manager to save it on exit:
+
+        with Tracer("trace.json") as tracer:
+            func = cmd2func("sleep {t}", tracer=tracer)
+            func(1)
+
+    Args:
+        path: The path of the trace file. default: None.
+    """
+    def __init__(self, path: T.Optional[str] = None) -> None:
+        self.path = path
+        self.pid = os.getpid()
+        self.events: T.List[T.Dict[str, T.Any]] = []
+        self.lock = threading.Lock()
+        self.tids: T.Set[int] = set()
+
+    def __reduce__(self) -> tuple:
+        # the events are not sent to the other processes
+        return (self.__class__, (self.path,))
+
+    def _append(self, event: T.Dict[str, T.Any]):
+        tid = threading.get_ident()
+        event["pid"] = self.pid
+        event["tid"] = tid
+        with self.lock:
+            if tid not in self.tids:
+                self.tids.add(tid)
+                self.events.append({
+                    "name": "thread_name", "ph": "M",
+                    "pid": self.pid, "tid": tid,
+                    "args": {"name": threading.current_thread().name},
+                })
+            self.events.append(event)
+
+    def complete(
+            self, name: str, start: float, duration: float,
+            cat: str = "cmd2func", **args: T.Any):
+        """Add a span, `start` is an unix time in seconds."""
+        self._append({
+            "name": name, "cat": cat, "ph": "X",
+            "ts": start * 1e6, "dur": duration * 1e6, "args": args,
+        })
+
+    def instant(self, name: str, ts: T.Optional[float] = None, **args):
+        """Add an instant event, at `ts` (unix time in seconds) or now."""
+        ts = time.time() if ts is None else ts
+        self._append({
+            "name": name, "cat": "cmd2func", "ph": "i", "s": "t",
+            "ts": ts * 1e6, "args": args,
+        })
+
+    @contextmanager
+    def span(self, name: str, cat: str = "cmd2func", **args: T.Any):
+        """Record the time spent in the with block as a span."""
+        start = time.time()
+        try:
+            yield args
+        finally:
+            self.complete(name, start, time.time() - start, cat, **args)
+
+    def add_run(self, stats: RunStats):
+        """Add the spans of a process from its `RunStats`: the process
+        span with the spawn and the drain (reading the output until the
+        process exit) spans, and the first output event."""
+        if (stats.start_time is None) or (stats.wall_time is None):
+            return
+        start, spawn = stats.start_time, stats.spawn_latency or 0.0
+        self.complete(
+            "process", start, stats.wall_time, "process",
+            cmd=stats.cmd, ret_code=stats.ret_code,
+            user_time=stats.user_time, sys_time=stats.sys_time,
+            max_rss=stats.max_rss)
+        self.complete("spawn", start, spawn, "process")
+        self.complete(
+            "drain", start + spawn, max(stats.wall_time - spawn, 0.0),
+            "process", lines=stats.lines, bytes=stats.bytes)
+        if stats.first_output is not None:
+            self.instant("first output", start + stats.first_output)
+
+    def to_dict(self) -> T.Dict[str, T.Any]:
+        with self.lock:
+            events = list(self.events)
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def save(self, path: T.Optional[str] = None):
+        """Write the trace file."""
+        path = path or self.path
+        if path is None:
+            raise ValueError("The path of the trace file is not provided.")
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, default=str)
+
+    def __enter__(self) -> "Tracer":
+        return self
+
+    def __exit__(self, *exc: T.Any):
+        self.save()
@@ -1,5 +1,10 @@
+import os
+import time
+import tempfile
 import typing as T
-from io import TextIOBase
+from collections import deque
+from io import TextIOBase, StringIO
+from threading import Lock, Condition, Thread
 
 
 class Tee(TextIOBase):
@@ -11,3 +16,422 @@ class Tee(TextIOBase):
         ret1 = self.file1.write(s)
         self.file2.write(s)
         return ret1
+
+    def flush(self) -> None:
+        self.file1.flush()
+        self.file2.flush()
+
+
+class PrefixedWriter(TextIOBase):
+    """Write lines to a (shared) file with a prefix.
+    Only complete lines are written, under the lock,
+    so lines from different writers are not mixed up."""
+    def __init__(
+            self, file: T.TextIO, prefix: str,
+            lock: T.Optional[Lock] = None):
+        self.file = file
+        self.prefix = prefix
+        self.lock = lock or Lock()
+        self.partial = ""
+
+    def write(self, s: str) -> int:
+        *lines, self.partial = (self.partial + s).split("\n")
+        if lines:
+            text = "".join(self.prefix + line + "\n" for line in lines)
+            with self.lock:
+                self.file.write(text)
+        return len(s)
+
+    def flush(self) -> None:
+        if self.partial:
+            self.write("\n")
+        self.file.flush()
+
+
+def get_fds(file: T.Any) -> T.Optional[T.List[int]]:
+    """Get the file descriptors which the stream write to.
+    Return None if the stream (or one of the sinks of a `Tee`)
+    is not backed by a real file."""
+    if isinstance(file, Tee):
+        fds1, fds2 = get_fds(file.file1), get_fds(file.file2)
+        if (fds1 is None) or (fds2 is None):
+            return None
+        return fds1 + fds2
+    try:
+        return [file.fileno()]
+    except (AttributeError, OSError, ValueError):
+        return None
+
+
+class TailBuffer(TextIOBase):
+    """Capture sink which keep only the tail of the output,
+    at most `max_lines` lines and `max_chars` characters.
+
+    Args:
+        max_lines: Max number of lines to keep, None for no limit.
+            default: 1000.
+        max_chars: Max number of characters to keep, None for no limit.
+            default: None.
+    """
+    def __init__(
+            self, max_lines: T.Optional[int] = 1000,
+            max_chars: T.Optional[int] = None):
+        self.max_lines = max_lines
+        self.max_chars = max_chars
+        self.lines: T.Deque[str] = deque()
+        self.partial = ""
+        self.size = 0
+
+    def write(self, s: str) -> int:
+        *lines, self.partial = (self.partial + s).split("\n")
+        for line in lines:
+            line += "\n"
+            self.lines.append(line)
+            self.size += len(line)
+        self._trim()
+        return len(s)
+
+    def _trim(self):
+        if self.max_lines is not None:
+            while len(self.lines) > self.max_lines:
+                self.size -= len(self.lines.popleft())
+        if self.max_chars is None:
+            return
+        if len(self.partial) >= self.max_chars:
+            self.partial = self.partial[len(self.partial) - self.max_chars:]
+            self.lines.clear()
+            self.size = 0
+            return
+        while self.size + len(self.partial) > self.max_chars:
+            extra = self.size + len(self.partial) - self.max_chars
+            first = self.lines.popleft()
+            self.size -= len(first)
+            if len(first) > extra:
+                # keep the tail part of the first line
+                self.lines.appendleft(first[extra:])
+                self.size += len(first) - extra
+
+    def getvalue(self) -> str:
+        return "".join(self.lines) + self.partial
+
+    def tail(self, n: int = 10) -> str:
+        """Get the last `n` lines."""
+        lines = list(self.lines)
+        if self.partial:
+            lines.append(self.partial)
+        return "".join(lines[-n:]) if n > 0 else ""
+
+
+class SpillBuffer(TextIOBase):
+    """Capture sink which keep the first `max_memory` characters in
+    memory and spill the rest to a temporary file.
+
+    Args:
+        max_memory: Max number of characters kept in memory.
+            default: 1MiB.
+        dir: The directory of the temporary file. default: None.
+    """
+    BLOCK_SIZE = 65536
+
+    def __init__(
+            self, max_memory: int = 1 << 20,
+            dir: T.Optional[str] = None):
+        self.max_memory = max_memory
+        self.dir = dir
+        self.head = StringIO()
+        self.head_size = 0
+        self.spill: T.Optional[T.BinaryIO] = None
+
+    @property
+    def spilled(self) -> bool:
+        return self.spill is not None
+
+    def write(self, s: str) -> int:
+        room = self.max_memory - self.head_size
+        if room > 0:
+            self.head.write(s[:room])
+            self.head_size += min(room, len(s))
+            rest = s[room:]
+        else:
+            rest = s
+        if rest:
+            if self.spill is None:
+                self.spill = T.cast(T.BinaryIO, tempfile.TemporaryFile(
+                    prefix="cmd2func-", dir=self.dir))
+            self.spill.write(rest.encode("utf-8", "surrogateescape"))
+        return len(s)
+
+    def getvalue(self) -> str:
+        """Get all the output, the spilled part is read into memory."""
+        value = self.head.getvalue()
+        if self.spill is not None:
+            self.spill.seek(0)
+            value += self.spill.read().decode("utf-8", "surrogateescape")
+            self.spill.seek(0, os.SEEK_END)
+        return value
+
+    def tail(self, n: int = 10) -> str:
+        """Get the last `n` lines, only the tail of the spilled file
+        is read."""
+        if n <= 0:
+            return ""
+        data = b""
+        if self.spill is not None:
+            end = self.spill.seek(0, os.SEEK_END)
+            pos = end
+            while (pos > 0) and (data.count(b"\n", 0, -1) < n):
+                step = min(self.BLOCK_SIZE, pos)
+                pos -= step
+                self.spill.seek(pos)
+                data = self.spill.read(step) + data
+            self.spill.seek(0, os.SEEK_END)
+            if pos > 0:
+                text = data.decode("utf-8", "surrogateescape")
+                return "".join(text.splitlines(True)[-n:])
+        text = self.head.getvalue() + data.decode("utf-8", "surrogateescape")
+        return "".join(text.splitlines(True)[-n:])
+
+    def close(self) -> None:
+        if self.spill is not None:
+            self.spill.close()
+        super().close()
+
+
+FANOUT_POLICIES = ("block", "drop_oldest", "spill")
+
+
+class _FanOutSink(object):
+    """A sink of `FanOut`, with its bounded buffer and flush thread."""
+    def __init__(
+            self, file: T.TextIO, max_buffer: int, policy: str,
+            spill_dir: T.Optional[str]):
+        self.file = file
+        self.max_buffer = max_buffer
+        self.policy = policy
+        self.spill_dir = spill_dir
+        self.cond = Condition()
+        self.chunks: T.Deque[T.Tuple[str, float]] = deque()
+        self.size = 0
+        self.spill: T.Optional[T.BinaryIO] = None
+        # (end offset, enqueue time) of each spilled chunk
+        self.spill_marks: T.Deque[T.Tuple[int, float]] = deque()
+        self.spill_read = 0
+        self.spill_write = 0
+        self.flush_requested = False
+        self.closed = False
+        self.busy_since: T.Optional[float] = None
+        self.error: T.Optional[BaseException] = None
+        self.written = 0
+        self.dropped = 0
+        self.spilled = 0
+        self.max_lag = 0.0
+        self.thread = Thread(target=self.flush_func, daemon=True)
+        self.thread.start()
+
+    def put(self, s: str):
+        now = time.perf_counter()
+        with self.cond:
+            if self.error is not None:
+                return
+            full = self.size and (self.size + len(s) > self.max_buffer)
+            if self.policy == "spill":
+                if full or self.spill_marks:
+                    self._spill(s, now)
+                    self.cond.notify_all()
+                    return
+            elif self.policy == "drop_oldest":
+                while self.size and (self.size + len(s) > self.max_buffer):
+                    old, _ = self.chunks.popleft()
+                    self.size -= len(old)
+                    self.dropped += len(old)
+            else:
+                while self.size and (self.size + len(s) > self.max_buffer) \
+                        and (self.error is None):
+                    self.cond.wait()
+            self.chunks.append((s, now))
+            self.size += len(s)
+            self.cond.notify_all()
+
+    def _spill(self, s: str, now: float):
+        if self.spill is None:
+            self.spill = T.cast(T.BinaryIO, tempfile.TemporaryFile(
+                prefix="cmd2func-", dir=self.spill_dir))
+        data = s.encode("utf-8", "surrogateescape")
+        os.pwrite(self.spill.fileno(), data, self.spill_write)
+        self.spill_write += len(data)
+        self.spill_marks.append((self.spill_write, now))
+        self.spilled += len(s)
+
+    def _take(self) -> T.Tuple[str, T.Any, float]:
+        """Wait for the next job: ("write", text, enqueue time),
+        ("flush", None, 0) or ("stop", None, 0)."""
+        with self.cond:
+            self.busy_since = None
+            self.cond.notify_all()
+            while not (self.chunks or self.spill_marks or
+                       self.flush_requested or self.closed):
+                self.cond.wait()
+            if self.chunks:
+                s, t = self.chunks.popleft()
+                self.size -= len(s)
+                self.busy_since = t
+                self.cond.notify_all()  # wake up the blocked writer
+                return "write", s, t
+            if self.spill_marks:
+                end, t = self.spill_marks.popleft()
+                start, self.spill_read = self.spill_read, end
+                self.busy_since = t
+                fd = T.cast(T.BinaryIO, self.spill).fileno()
+            elif self.flush_requested:
+                self.flush_requested = False
+                self.busy_since = time.perf_counter()
+                return "flush", None, 0.0
+            else:
+                return "stop", None, 0.0
+        # positional read, the writer may append to the file meanwhile
+        data = os.pread(fd, end - start, start)
+        with self.cond:
+            if self.spill_read == self.spill_write:
+                self.spill_read = self.spill_write = 0
+                os.ftruncate(fd, 0)
+        return "write", data.decode("utf-8", "surrogateescape"), t
+
+    def flush_func(self):
+        while True:
+            job, s, t = self._take()
+            if job == "stop":
+                return
+            try:
+                if job == "write":
+                    self.file.write(s)
+                else:
+                    self.file.flush()
+            except Exception as e:
+                with self.cond:
+                    # the following output of this sink is discarded
+                    self.error = e
+                    self.chunks.clear()
+                    self.spill_marks.clear()
+                    self.size = 0
+                    self.busy_since = None
+                    self.cond.notify_all()
+                return
+            if job == "write":
+                lag = time.perf_counter() - t
+                with self.cond:
+                    self.written += len(s)
+                    self.max_lag = max(self.max_lag, lag)
+
+    def pending(self) -> bool:
+        if self.error is not None:
+            return False
+        return bool(
+            self.chunks or self.spill_marks or self.flush_requested or
+            (self.busy_since is not None))
+
+    def metrics(self) -> T.Dict[str, T.Any]:
+        with self.cond:
+            times = [self.busy_since] if self.busy_since is not None else []
+            if self.chunks:
+                times.append(self.chunks[0][1])
+            if self.spill_marks:
+                times.append(self.spill_marks[0][1])
+            lag = time.perf_counter() - min(times) if times else 0.0
+            return {
+                "buffered": self.size,
+                "spill_pending": self.spill_write - self.spill_read,
+                "written": self.written,
+                "dropped": self.dropped,
+                "spilled": self.spilled,
+                "lag": lag,
+                "max_lag": max(self.max_lag, lag),
+                "error": self.error,
+            }
+
+
+class FanOut(TextIOBase):
+    """Write to any number of sinks without waiting for them.
+    Each sink has a bounded buffer which is written to the sink by its
+    own thread, so a slow sink (a network file system, a slow pipe)
+    does not hold up the other sinks and the reading of the pipes.
+
+    `flush()` only request the sinks to be flushed after the buffered
+    output, `drain()` (or `close()`) wait for it. An error of a sink is
+    raised by `drain()`, the rest output of the sink is discarded.
+
+    Args:
+        sinks: The files to write to.
+        max_buffer: Max number of characters buffered in memory for
+            each sink. default: 1MiB.
+        policy: What to do when the buffer of a sink is full,
+            "block" to wait for the sink, "drop_oldest" to discard the
+            oldest buffered output, "spill" to buffer the rest output
+            in a temporary file. default: "block".
+        spill_dir: The directory of the temporary files for the "spill"
+            policy. default: None.
+    """
+    def __init__(
+            self, *sinks: T.TextIO, max_buffer: int = 1 << 20,
+            policy: str = "block", spill_dir: T.Optional[str] = None):
+        if policy not in FANOUT_POLICIES:
+            raise ValueError(f"Unknown policy: {policy}")
+        self.sinks = list(sinks)
+        self.max_buffer = max_buffer
+        self.policy = policy
+        self._sinks = [
+            _FanOutSink(f, max_buffer, policy, spill_dir) for f in sinks]
+
+    def write(self, s: str) -> int:
+        if self.closed:
+            raise ValueError("write to closed file")
+        for sink in self._sinks:
+            sink.put(s)
+        return len(s)
+
+    def flush(self) -> None:
+        for sink in self._sinks:
+            with sink.cond:
+                sink.flush_requested = True
+                sink.cond.notify_all()
+
+    def drain(self, timeout: T.Optional[float] = None) -> bool:
+        """Wait until the buffered output is written and flushed.
+        Return False if timeout."""
+        self.flush()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for sink in self._sinks:
+            with sink.cond:
+                while sink.pending():
+                    if deadline is None:
+                        sink.cond.wait()
+                    elif not sink.cond.wait(deadline - time.monotonic()):
+                        return False
+        for sink in self._sinks:
+            if sink.error is not None:
+                raise sink.error
+        return True
+
+    def metrics(self) -> T.List[T.Dict[str, T.Any]]:
+        """Lag metrics of each sink: characters buffered in memory,
+        bytes pending in the spill file, characters written, dropped
+        and spilled, the current lag (seconds since the oldest pending
+        output is written to the `FanOut`), the max lag and the error
+        of the sink."""
+        return [sink.metrics() for sink in self._sinks]
+
+    def close(self) -> None:
+        """Drain the buffers and stop the threads,
+        the sinks are not closed."""
+        if self.closed:
+            return
+        try:
+            self.drain()
+        finally:
+            for sink in self._sinks:
+                with sink.cond:
+                    sink.closed = True
+                    sink.cond.notify_all()
+                sink.thread.join()
+                if sink.spill is not None:
+                    sink.spill.close()
+            super().close()
@@ -0,0 +1,75 @@
+import os
+import typing as T
+
+
+PathLike = T.Union[str, os.PathLike]
+
+
+class Task(object):
+    """A command yielded by a generator function, with the input and
+    output files it declares. In the checkpoint mode, a task whose
+    command, inputs and outputs are unchanged since its last successful
+    run is not run again.
+
+    Args:
+        cmd: The command string.
+        inputs: Paths of the files read by the command.
+        outputs: Paths of the files written by the command.
+    """
+    def __init__(
+            self, cmd: str,
+            inputs: T.Sequence[PathLike] = (),
+            outputs: T.Sequence[PathLike] = ()) -> None:
+        self.cmd = cmd
+        self.inputs = [os.fspath(p) for p in inputs]
+        self.outputs = [os.fspath(p) for p in outputs]
+
+    def __repr__(self) -> str:
+        return f"Task({self.cmd!r}, {self.inputs}, {self.outputs})"
+
+
+Command = T.Union[str, Task]
+
+
+class Parallel(object):
+    """A group of commands yielded by a generator function,
+    the commands are run concurrently.
+
+    The return codes are sent back to the generator in the same shape
+    as the commands: a list for a sequence, a dict for a mapping.
+
+    Args:
+        cmds: The command strings or `Task`s.
+        max_workers: Max number of commands run at once, default to
+            the `max_parallel` of the Cmd2Func object, or all at once.
+    """
+    def __init__(
+            self,
+            cmds: T.Union[T.Sequence[Command], T.Mapping[T.Any, Command]],
+            max_workers: T.Optional[int] = None):
+        self.keys: T.Optional[T.List[T.Any]]
+        if isinstance(cmds, T.Mapping):
+            self.keys = list(cmds.keys())
+            self.cmds = list(cmds.values())
+        else:
+            self.keys = None
+            self.cmds = list(cmds)
+        self.max_workers = max_workers
+
+    def pack(self, ret_codes: T.List[int]) -> T.Union[list, dict]:
+        if self.keys is None:
+            return ret_codes
+        return dict(zip(self.keys, ret_codes))
+
+
+Step = T.Union[
+    Command, T.Sequence[Command], T.Mapping[T.Any, Command], Parallel]
+
+
+def as_parallel(step: Step) -> T.Optional[Parallel]:
+    """Get the Parallel group of a step, None if it is a single command."""
+    if isinstance(step, Parallel):
+        return step
+    if isinstance(step, (list, tuple, dict)):
+        return Parallel(step)
+    return None
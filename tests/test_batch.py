@@ -0,0 +1,43 @@
+import io
+import time
+
+from cmd2func import cmd2func
+
+
+def test_map():
+    out = io.StringIO()
+    func = cmd2func(
+        "python -c 'print({a} + {b})'", out_stream=out, print_cmd=False)
+    results = func.map([(1, 2), {"a": 3, "b": 4}, [5, 6]], max_workers=2)
+    assert [r.idx for r in results] == [0, 1, 2]
+    assert [r.ret for r in results] == [0, 0, 0]
+    assert all(r.elapsed > 0 for r in results)
+    assert sorted(out.getvalue().split()) == ["11", "3", "7"]
+
+
+def test_imap_unordered():
+    func = cmd2func(
+        "python -c 'import time; time.sleep({t})'", print_cmd=False)
+    t0 = time.time()
+    results = list(func.imap([0.5, 0.1, 0.1, 0.1], max_workers=4,
+                             ordered=False))
+    assert time.time() - t0 < 1.5
+    assert results[-1].idx == 0
+    assert sorted(r.idx for r in results) == [0, 1, 2, 3]
+
+
+def test_map_sinks():
+    out = io.StringIO()
+    func = cmd2func("python -c 'print({a})'", print_cmd=False)
+    func.map(range(3), out_stream=out, prefix="[{index}] ")
+    assert sorted(out.getvalue().splitlines()) == ["[0] 0", "[1] 1", "[2] 2"]
+
+    outs = {}
+
+    def make_out(index, item):
+        outs[index] = io.StringIO()
+        return outs[index]
+
+    results = func.map(range(3), out_stream=make_out)
+    assert [r.item for r in results] == [0, 1, 2]
+    assert [outs[i].getvalue() for i in range(3)] == ["0\n", "1\n", "2\n"]
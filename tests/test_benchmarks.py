@@ -0,0 +1,19 @@
+import os
+import sys
+import json
+import subprocess as subp
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_benchmark_suite(tmp_path):
+    output = tmp_path / "bench.json"
+    subp.check_call([
+        sys.executable, os.path.join(ROOT, "benchmarks", "run.py"),
+        "--quick", "--output", str(output)])
+    results = json.loads(output.read_text())
+    assert results["meta"]["quick"] is True
+    assert set(results["benchmarks"]) == {
+        "format", "overhead", "throughput", "memory", "concurrency",
+        "spawn"}
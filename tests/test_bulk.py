@@ -0,0 +1,73 @@
+import io
+import os
+import csv
+
+import pytest
+
+from cmd2func import cmd2func
+from cmd2func.bulk import write_job_list, write_script
+
+
+CONFIG = {
+    "inputs": {
+        "a": {"type": "int"},
+        "flag": {
+            "type": "bool", "default": False,
+            "true_insert": "--flag", "false_insert": "",
+        },
+    },
+}
+
+
+def test_render_bulk():
+    func = cmd2func("tool {a} {flag}", CONFIG)
+    cmds = func.render_bulk({"a": [1, 2], "flag": [True, False]})
+    assert not isinstance(cmds, list)
+    assert list(cmds) == ["tool 1 --flag", "tool 2 "]
+    # default value
+    assert list(func.render_bulk({"a": range(2)})) == ["tool 0 ", "tool 1 "]
+    # records, from CSV
+    reader = csv.DictReader(io.StringIO("a,flag\n1,true\n2,0\n"))
+    assert list(func.render_bulk(reader)) == ["tool 1 --flag", "tool 2 "]
+    with pytest.raises(ValueError):
+        list(func.render_bulk({"a": [1], "b": [2]}))
+    with pytest.raises(ValueError):
+        list(func.render_bulk({"flag": [True]}))
+    with pytest.raises(ValueError):
+        list(func.render_bulk({"a": [1, 2], "flag": [True]}))
+    # every record is checked, missing columns take the defaults
+    assert list(func.render_bulk([{"a": 1, "flag": True}, {"a": 2}])) == [
+        "tool 1 --flag", "tool 2 "]
+    with pytest.raises(ValueError, match="Missing columns"):
+        list(func.render_bulk([{"a": 1}, {"flag": True}]))
+    with pytest.raises(ValueError, match="Unknown columns"):
+        list(func.render_bulk([{"a": 1}, {"a": 2, "b": 3}]))
+    # empty records and CSV
+    assert list(func.render_bulk([])) == []
+    reader = csv.DictReader(io.StringIO(""))
+    assert list(func.render_bulk(reader)) == []
+    func = cmd2func("tool {a}", conda_env="env1")
+    assert list(func.render_bulk([{"a": 1}])) == [
+        "conda run --no-capture-output -n env1 tool 1"]
+
+
+def test_render_bulk_record_array():
+    np = pytest.importorskip("numpy")
+    arr = np.array(
+        [(1, True), (2, False)], dtype=[("a", "i4"), ("flag", "?")])
+    func = cmd2func("tool {a} {flag}", CONFIG)
+    assert list(func.render_bulk(arr)) == ["tool 1 --flag", "tool 2 "]
+
+
+def test_writers(tmp_path):
+    func = cmd2func("echo {a}")
+    path = tmp_path / "run.sh"
+    n = write_script(func.render_bulk({"a": range(3)}), path)
+    assert n == 3
+    assert path.read_text() == "#!/bin/sh\nset -e\necho 0\necho 1\necho 2\n"
+    assert os.access(path, os.X_OK)
+    out = io.StringIO()
+    assert write_job_list(func.render_bulk({"a": ["x"]}), out) == 1
+    assert out.getvalue() == "echo x\n"
+    with pytest.raises(ValueError):
+        write_job_list(["a\nb"], io.StringIO())
@@ -0,0 +1,76 @@
+import io
+import asyncio
+import os
+
+from cmd2func import cmd2func
+from cmd2func.cache import ResultCache
+
+
+def test_result_cache(tmp_path):
+    cache = ResultCache(tmp_path / "cache")
+    counter = tmp_path / "counter"
+    infile = tmp_path / "in.txt"
+    infile.write_text("a")
+    cmd = (
+        "python -c 'import sys; open(\"{counter}\", \"a\").write(\"x\"); "
+        "print(open(\"{inp}\").read()); sys.stderr.write(\"e\")'"
+    )
+    func = cmd2func(cmd, cache=cache, cache_inputs=["inp"])
+
+    def run():
+        out, err = io.StringIO(), io.StringIO()
+        func.out_stream, func.err_stream = out, err
+        assert func(counter=counter, inp=infile) == 0
+        return out.getvalue(), err.getvalue()
+
+    assert run() == ("a\n", "e")
+    assert run() == ("a\n", "e")
+    assert counter.read_text() == "x"  # second call is not run
+    infile.write_text("b")
+    os.utime(infile, ns=(0, 0))
+    assert run() == ("b\n", "e")
+    assert counter.read_text() == "xx"
+
+
+def test_cache_failures(tmp_path):
+    cache = ResultCache(tmp_path)
+    func = cmd2func("python -c 'import sys; sys.exit(2)'", cache=cache)
+    assert func() == 2
+    assert os.listdir(tmp_path) == []
+    cache.cache_failures = True
+    assert func() == 2
+    assert len(os.listdir(tmp_path)) == 1
+
+
+def test_cache_eviction(tmp_path):
+    cache = ResultCache(tmp_path, max_size=0)
+    func = cmd2func("python -c 'print(1)'", cache=cache)
+    assert func() == 0
+    assert os.listdir(tmp_path) == []
+
+
+def test_cache_key_context(tmp_path):
+    cache = ResultCache(tmp_path / "cache")
+    out = io.StringIO()
+    func = cmd2func("pwd", cache=cache, out_stream=out, print_cmd=False)
+    for cwd in ("/", "/tmp", "/"):
+        func.kwargs_popen = {"cwd": cwd}
+        func()
+    assert out.getvalue() == "/\n/tmp\n/\n"
+    assert len(os.listdir(tmp_path / "cache")) == 2
+    assert cache.key("x", popen_kwargs={"env": {"A": "1"}}) != \
+        cache.key("x", popen_kwargs={"env": {"A": "2"}})
+
+
+def test_cache_async(tmp_path):
+    cache = ResultCache(tmp_path / "cache")
+    counter = tmp_path / "counter"
+    cmd = "python -c 'open(\"{counter}\", \"a\").write(\"x\"); print(1)'"
+    out = io.StringIO()
+    func = cmd2func(cmd, cache=cache, out_stream=out, print_cmd=False)
+    assert asyncio.run(func.acall(counter=counter)) == 0
+    assert len(os.listdir(tmp_path / "cache")) == 1
+    assert asyncio.run(func.acall(counter=counter)) == 0
+    assert func(counter=counter) == 0
+    assert counter.read_text() == "x"
+    assert out.getvalue() == "1\n" * 3
@@ -1,9 +1,11 @@
+import asyncio
 import io
 import os
 
 import pytest
 from cmd2func import cmd2func
 from cmd2func.cmd import Command
+from cmd2func.utils import Tee
 
 
 def test_cmd2func():
@@ -180,3 +182,79 @@ def test_flush_streams_each_time():
 
     test1()
     assert out.getvalue().strip() == "1"
+
+
+def test_selector_runner():
+    out = io.StringIO()
+    func = cmd2func(
+        "python -c 'print({a} + {b})'",
+        out_stream=out, runner="selector",
+    )
+    assert func(1, 2) == 0
+    assert out.getvalue().strip() == "3"
+
+
+def test_acall():
+    out = io.StringIO()
+    func = cmd2func("python -c 'print({a} + {b})'", out_stream=out)
+
+    async def main():
+        return await asyncio.gather(func.acall(1, 2), func.acall(3, 4))
+
+    assert asyncio.run(main()) == [0, 0]
+    assert sorted(out.getvalue().split()) == ["3", "7"]
+
+
+def test_acall_genfunc():
+    out = io.StringIO()
+
+    @cmd2func(out_stream=out)
+    def sum_and_product(a, b):
+        r1 = yield f'python -c "print({a} + {b})"'
+        r2 = yield f'python -c "print({a} * {b})"'
+        return r1 + r2
+
+    assert asyncio.run(sum_and_product.acall(1, 2)) == 0
+    assert out.getvalue().split() == ["3", "2"]
+
+    out = io.StringIO()
+
+    @cmd2func(out_stream=out)
+    async def async_steps(a):
+        r1 = yield f'python -c "print({a})"'
+        assert r1 == 0
+        yield 'python -c "import sys; sys.exit(3)"'
+
+    assert asyncio.run(async_steps.acall(1)) == 3
+    assert out.getvalue().split() == ["1"]
+    with pytest.raises(TypeError):
+        async_steps(1)
+
+
+def test_passthrough_fds(tmp_path):
+    cmd = "python -c 'import sys; print({a}); sys.stderr.write(\"e\")'"
+    with open(tmp_path / "out", "w") as out:
+        out.write("head\n")
+        err = io.StringIO()
+        func = cmd2func(
+            cmd, out_stream=out, err_stream=err, passthrough_fds=True)
+        assert func(1) == 0
+    assert (tmp_path / "out").read_text() == "head\n1\n"
+    assert err.getvalue() == "e"
+
+    with open(tmp_path / "o1", "w") as o1, \
+            open(tmp_path / "o2", "w") as o2, \
+            open(tmp_path / "e", "w") as e:
+        func = cmd2func(
+            cmd, out_stream=Tee(o1, o2), err_stream=e, passthrough_fds=True)
+        assert func(2) == 0
+    assert (tmp_path / "o1").read_text() == "2\n"
+    assert (tmp_path / "o2").read_text() == "2\n"
+    assert (tmp_path / "e").read_text() == "e"
+
+
+def test_call_with_input():
+    out = io.StringIO()
+    func = cmd2func("head -n {n}", out_stream=out, print_cmd=False)
+    assert func.call_with_input(iter([b"1\n", b"2\n", b"3\n"]), 2) == 0
+    assert out.getvalue() == "1\n2\n"
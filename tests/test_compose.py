@@ -0,0 +1,74 @@
+import io
+
+import pytest
+
+from cmd2func import cmd2func, pipeline
+from cmd2func.runner import PipelineRunner
+
+
+def test_pipeline_runner():
+    runner = PipelineRunner([
+        "python -c 'print(1); print(2)'",
+        "python -c 'import sys; [print(int(l) * 10) for l in sys.stdin]'",
+    ])
+    runner.run()
+    out, err = io.StringIO(), io.StringIO()
+    assert runner.write_stream_until_stop(out, err) == [0, 0]
+    assert out.getvalue() == "10\n20\n"
+
+
+def test_pipeline():
+    out, err = io.StringIO(), io.StringIO()
+    gen = cmd2func(
+        "python -c 'import sys; print({n}); sys.stderr.write(\"e\\n\")'",
+        err_stream=err)
+    mul = cmd2func(
+        "python -c 'import sys; print(int(sys.stdin.read()) * {m})'",
+        out_stream=out, err_stream=err)
+    assert (gen.bind(n=3) | mul.bind(m=2))() == [0, 0]
+    assert out.getvalue() == "6\n"
+    assert err.getvalue() == "e\n"
+
+    out2 = io.StringIO()
+    fail = cmd2func("python -c 'import sys; sys.stdin.read(); sys.exit(3)'")
+    p = pipeline(gen.bind(4), mul.bind(5), out_stream=out2)
+    assert p() == [0, 0]
+    assert out2.getvalue() == "20\n"
+    assert (p | fail)() == [0, 0, 3]
+
+
+def test_pipeline_genfunc():
+    @cmd2func
+    def steps():
+        yield "python -c 'print(1)'"
+
+    with pytest.raises(TypeError):
+        (steps | steps)()
+
+
+def test_pipeline_runner_input():
+    from cmd2func.runner import PipelineRunner
+    runner = PipelineRunner(["cat", "wc -l"])
+    runner.run(input=b"a\nb\n")
+    out = list(runner.stream())
+    assert [line.strip() for _, line in out] == ["2"]
+
+
+def test_pipeline_spawn_failure():
+    runner = PipelineRunner(["yes", "no-such-cmd-cmd2func"])
+    with pytest.raises(FileNotFoundError):
+        runner.run()
+    assert runner.procs[0].returncode is not None
+
+
+def test_pipeline_stage_kwargs():
+    out = io.StringIO()
+    gen = cmd2func(
+        "echo a b | tr ' ' '\\n'", popen_kwargs={"shell": True},
+        print_cmd=False)
+    count = cmd2func("wc -l", out_stream=out, print_cmd=False)
+    assert (gen | count)() == [0, 0]
+    assert out.getvalue().strip() == "2"
+    runner = PipelineRunner(["cat", "cat"])
+    with pytest.raises(ValueError):
+        runner.run(stages_kwargs=[{}, {"stdin": None}])
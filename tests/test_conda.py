@@ -0,0 +1,49 @@
+import io
+import os
+import json
+
+from cmd2func import cmd2func
+from cmd2func.conda import get_activation, activated_env
+
+
+def make_fake_env(path):
+    (path / "conda-meta").mkdir(parents=True)
+    (path / "bin").mkdir()
+    activate_d = path / "etc" / "conda" / "activate.d"
+    activate_d.mkdir(parents=True)
+    (activate_d / "foo.sh").write_text("export FOO=hello\n")
+    (path / "conda-meta" / "state").write_text(
+        json.dumps({"env_vars": {"BAR": "1"}}))
+    tool = path / "bin" / "mytool"
+    tool.write_text("#!/bin/sh\necho $FOO $BAR $CONDA_PREFIX\n")
+    tool.chmod(0o755)
+    return path
+
+
+def test_activation(tmp_path):
+    prefix = make_fake_env(tmp_path / "myenv")
+    path_prefix, changes = get_activation(str(prefix))
+    assert path_prefix.startswith(str(prefix / "bin"))
+    assert changes["FOO"] == "hello"
+    assert changes["BAR"] == "1"
+    assert changes["CONDA_PREFIX"] == str(prefix)
+    assert get_activation(str(prefix))[1] is changes  # cached
+    env = activated_env(str(prefix), {"PATH": "/usr/bin"})
+    assert env["PATH"] == str(prefix / "bin") + os.pathsep + "/usr/bin"
+
+    # invalidated when the conda-meta changes
+    (prefix / "conda-meta" / "state").write_text(
+        json.dumps({"env_vars": {"BAR": "2"}}))
+    os.utime(prefix / "conda-meta" / "state", ns=(0, 0))
+    assert get_activation(str(prefix))[1]["BAR"] == "2"
+
+
+def test_conda_activate_mode(tmp_path):
+    prefix = make_fake_env(tmp_path / "myenv")
+    out = io.StringIO()
+    func = cmd2func(
+        "mytool", conda_env=str(prefix), conda_mode="activate",
+        out_stream=out)
+    assert func.process_cmd_str("mytool") == "mytool"
+    assert func() == 0
+    assert out.getvalue().strip() == f"hello 1 {prefix}"
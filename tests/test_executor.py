@@ -0,0 +1,81 @@
+import io
+
+import pytest
+
+from cmd2func import cmd2func
+from cmd2func.executor import (
+    LocalBackend, AgentBackend, ProcessPoolBackend, WorkerAgent,
+)
+
+
+def test_local_backend():
+    out = io.StringIO()
+    func = cmd2func(
+        "python -c 'print({a})'", runner=LocalBackend("selector"),
+        out_stream=out, print_cmd=False)
+    assert func(1) == 0
+    assert out.getvalue() == "1\n"
+
+
+def test_agent_backend():
+    agents = [WorkerAgent(token="t").start() for _ in range(2)]
+    backend = AgentBackend([a.address for a in agents], token="t")
+    out, err = io.StringIO(), io.StringIO()
+
+    @cmd2func(
+        runner=backend, out_stream=out, err_stream=err, print_cmd=False)
+    def func(a):
+        return f"python -c 'import sys; print({a}); sys.exit({a})'"
+
+    assert func(3) == 3
+    assert out.getvalue() == "3\n"
+    assert func.last_run_stats.lines["stdout"] == 1
+    # commands are spread over the agents
+    idx, sock = backend.connect()
+    assert backend.loads[idx] == 1
+    idx2, sock2 = backend.connect()
+    assert idx2 != idx
+    for i, s in ((idx, sock), (idx2, sock2)):
+        s.close()
+        backend.release(i)
+    res = func.map(range(4), max_workers=4)
+    assert [r.ret for r in res] == [0, 1, 2, 3]
+    # wrong token
+    func.runner_factory = AgentBackend([agents[0].address])
+    try:
+        func(1)
+    except RuntimeError:
+        pass
+    else:
+        assert False
+    # unreachable agent is skipped
+    agents[1].close()
+    func.runner_factory = AgentBackend(
+        [agents[1].address, agents[0].address], token="t")
+    assert func(0) == 0
+    agents[0].close()
+
+
+def test_agent_token_required():
+    with pytest.raises(ValueError):
+        WorkerAgent("0.0.0.0")
+    WorkerAgent("localhost").close()
+    WorkerAgent("0.0.0.0", token="t").close()
+
+
+def test_process_pool_backend():
+    backend = ProcessPoolBackend(2)
+    try:
+        out = io.StringIO()
+        func = cmd2func(
+            "python -c 'print({a})'", runner=backend,
+            out_stream=out, print_cmd=False)
+        assert func(1) == 0
+        assert out.getvalue() == "1\n"
+        assert len(backend.token) == 32
+        # the agents reject the clients without the token
+        other = AgentBackend(backend.addresses)
+        with pytest.raises(RuntimeError):
+            cmd2func("echo 1", runner=other, print_cmd=False)()
+    finally:
+        backend.close()
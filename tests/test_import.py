@@ -0,0 +1,75 @@
+import sys
+import subprocess as subp
+
+
+HEAVY_MODULES = [
+    "funcdesc", "subprocess", "asyncio", "inspect", "threading", "queue",
+    "cmd2func.core",
+]
+# microseconds, `import cmd2func` itself should only cost a few ms
+IMPORT_BUDGET_US = 30000
+
+
+def _import_times():
+    proc = subp.run(
+        [sys.executable, "-X", "importtime", "-c", "import cmd2func"],
+        stderr=subp.PIPE, universal_newlines=True, check=True)
+    times = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line.split("|")
+        if cumulative.strip().isdigit():
+            times[name.strip()] = int(cumulative)
+    return times
+
+
+def test_import_is_lazy():
+    times = _import_times()
+    assert "cmd2func" in times
+    for mod in HEAVY_MODULES:
+        assert mod not in times
+    assert times["cmd2func"] < IMPORT_BUDGET_US
+
+
+def test_lazy_attrs():
+    import cmd2func
+    assert callable(cmd2func.cmd2func)
+    assert callable(cmd2func.pipeline)
+    assert "pipeline" in dir(cmd2func)
+    try:
+        cmd2func.not_exist
+    except AttributeError:
+        pass
+    else:
+        assert False
+
+
+# not needed to define and call a command function
+OPTIONAL_MODULES = [
+    "asyncio", "concurrent.futures", "cmd2func.session", "cmd2func.cache",
+    "cmd2func.checkpoint", "cmd2func.bulk", "cmd2func.parsers",
+    "cmd2func.scheduler", "cmd2func.trace", "cmd2func.batch",
+    "cmd2func.compose", "cmd2func.conda", "cmd2func.executor",
+]
+# seconds, the whole entry point of a short-lived CLI
+ENTRY_BUDGET = 0.15
+ENTRY_CODE = """
+import sys, time
+t0 = time.perf_counter()
+from cmd2func import cmd2func
+cmd2func("echo {a}")
+print(time.perf_counter() - t0)
+print(" ".join(sys.modules))
+"""
+
+
+def test_entry_point_is_lazy():
+    proc = subp.run(
+        [sys.executable, "-c", ENTRY_CODE],
+        stdout=subp.PIPE, universal_newlines=True, check=True)
+    elapsed, modules = proc.stdout.splitlines()
+    modules = modules.split()
+    for mod in OPTIONAL_MODULES:
+        assert mod not in modules
+    assert float(elapsed) < ENTRY_BUDGET
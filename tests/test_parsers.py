@@ -0,0 +1,79 @@
+import io
+import time
+import asyncio
+
+import pytest
+
+from cmd2func import cmd2func
+from cmd2func.runner import ProcessRunner, BOUNDED_QUEUE_SIZE
+from cmd2func.parsers import (
+    JSONLinesParser, CSVParser, RegexParser, Records,
+)
+
+
+def test_parsers():
+    lines = ['{"a": 1}\n', "\n", '{"a": 2}\n']
+    assert list(JSONLinesParser()(lines)) == [{"a": 1}, {"a": 2}]
+    lines = ["a\tb\n", "1\t2\n", '3\t"x\n', 'y"\n']
+    assert list(CSVParser("\t")(lines)) == [
+        {"a": "1", "b": "2"}, {"a": "3", "b": "x\ny"}]
+    assert list(CSVParser(header=False)(["1,2\n"])) == [["1", "2"]]
+    lines = ["x=1\n", "noise\n", "y=2\n"]
+    assert list(RegexParser(r"(?P<k>\w)=(?P<v>\d)")(lines)) == [
+        {"k": "x", "v": "1"}, {"k": "y", "v": "2"}]
+    assert list(RegexParser(r"(\w)=(\d)")(lines)) == [
+        ("x", "1"), ("y", "2")]
+    assert list(RegexParser(r"\d")(lines)) == ["1", "2"]
+    try:
+        list(RegexParser(r"\d", skip_unmatched=False)(lines))
+    except ValueError:
+        pass
+    else:
+        assert False
+
+
+def test_records():
+    code = "import sys; [print(i) for i in range(3)]; " \
+        "sys.stderr.write('err'); sys.exit(2)"
+    runner = ProcessRunner(f"python -c \"{code}\"")
+    runner.run()
+    err = io.StringIO()
+    records = Records(runner, RegexParser(r"\d+"), err)
+    assert records.ret_code is None
+    assert list(records) == ["0", "1", "2"]
+    assert records.ret_code == 2
+    assert err.getvalue() == "err"
+    # stop early
+    runner = ProcessRunner("python -c \"while True: print(1)\"")
+    runner.run()
+    records = Records(runner, RegexParser(r"\d+"))
+    assert next(records) == "1"
+    records.close()
+    assert records.ret_code is not None
+
+
+def test_cmd2func_parser():
+    @cmd2func(parser=JSONLinesParser(), print_cmd=False)
+    def func(n):
+        return "printf '{\"n\": %d}\\n{\"n\": 2}\\n' " + str(n)
+
+    records = func(1)
+    assert [r["n"] for r in records] == [1, 2]
+    assert records.ret_code == 0
+    assert func.last_run_stats.lines["stdout"] == 2
+    with pytest.raises(TypeError):
+        asyncio.run(func.acall(1))
+
+
+def test_records_bounded():
+    # endless output, consumed slowly
+    func = cmd2func("yes 1", parser=JSONLinesParser(), print_cmd=False)
+    records = func()
+    assert next(records) == 1
+    time.sleep(0.3)
+    queue = records.runner.queue
+    assert queue.maxsize == BOUNDED_QUEUE_SIZE
+    assert queue.qsize() <= BOUNDED_QUEUE_SIZE
+    assert records.runner.proc.poll() is None
+    records.close()
+    assert records.ret_code != 0
@@ -0,0 +1,63 @@
+import io
+import sys
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+
+from cmd2func import cmd2func
+from cmd2func.session import ShellSessionPool
+from cmd2func.scheduler import ResourceScheduler
+
+
+@cmd2func(print_cmd=False)
+def add(a, b):
+    return f"python -c 'print({a} + {b})'"
+
+
+@cmd2func(print_cmd=False)
+def steps(n):
+    for i in range(n):
+        yield f"echo {i}"
+    return 0
+
+
+def mul(a, b):
+    return f"python -c 'print({a} * {b})'"
+
+
+def _run(func, *args):
+    out = io.StringIO()
+    func.out_stream = out
+    return func(*args), out.getvalue()
+
+
+def test_pickle_string_form():
+    func = cmd2func(
+        "python -c 'print({a} * {b})'", out_stream=sys.stdout,
+        runner="session", scheduler=ResourceScheduler(cpus=2),
+        print_cmd=False)
+    assert func(1, 2) == 0
+    func2 = pickle.loads(pickle.dumps(func))
+    assert func2.out_stream is sys.stdout
+    assert func2.formater.config == func.formater.config
+    assert str(func2.__signature__) == str(func.__signature__)
+    assert func2.scheduler.budget == func.scheduler.budget
+    assert func2.last_run_stats is None
+    assert _run(func2, 2, 3) == (0, "6\n")
+
+
+def test_pickle_decorated():
+    assert pickle.loads(pickle.dumps(add)) is add
+    pool = ShellSessionPool(1)
+    func = cmd2func(mul, runner=pool.runner, print_cmd=False)
+    assert _run(pickle.loads(pickle.dumps(func)), 2, 3) == (0, "6\n")
+    pool.close()
+
+
+def test_process_pool():
+    func = cmd2func("python -c 'print({a} + {b})'", print_cmd=False)
+    with ProcessPoolExecutor(2) as pool:
+        futures = [
+            pool.submit(_run, func, 1, 2), pool.submit(_run, add, 1, 2),
+            pool.submit(_run, steps, 2)]
+        results = [f.result() for f in futures]
+    assert results == [(0, "3\n"), (0, "3\n"), (0, "0\n1\n")]
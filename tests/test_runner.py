@@ -1,4 +1,13 @@
-from cmd2func.runner import ProcessRunner
+import os
+import sys
+import time
+import asyncio
+import io
+
+from cmd2func.runner import (
+    ProcessRunner, SelectorProcessRunner,
+    resolve_executable, fast_spawn_argv,
+)
 
 
 def test_process_runner():
@@ -17,3 +26,200 @@ def test_runner_shell():
     runner.run(shell=True)
     out = list(runner.stream())
     assert len(out) == 1
+
+
+def test_selector_runner():
+    runner = SelectorProcessRunner(
+        "python -c 'import sys; print(1); sys.stderr.write(\"2\\n\")'")
+    runner.run()
+    out = list(runner.stream())
+    assert sorted(out) == [("stderr", "2\n"), ("stdout", "1\n")]
+    assert runner.proc.returncode == 0
+    runner = SelectorProcessRunner("python -c 'print(1)'")
+    runner.run(capture_stdout=False)
+    assert list(runner.stream()) == []
+
+
+def test_selector_runner_backpressure():
+    n = 20000
+    runner = SelectorProcessRunner(
+        f"python -c 'print(\"x\" * 100 * {n}, end=\"\"); print(\"\\ny\")'",
+        high_water_mark=1024, chunk_size=256)
+    runner.run()
+    g = runner.stream()
+    max_buffered = 0
+    lines = []
+    for _, line in g:
+        lines.append(line)
+        max_buffered = max(max_buffered, runner.buffered_bytes)
+    # long line is split into pieces, memory is bounded
+    assert max_buffered < 1024 + 2 * 256
+    assert "".join(lines) == "x" * 100 * n + "\ny\n"
+    out, err = io.StringIO(), io.StringIO()
+    runner = SelectorProcessRunner("python -c 'print(1)'")
+    runner.run()
+    assert runner.write_stream_until_stop(out, err) == 0
+    assert out.getvalue() == "1\n"
+
+
+def test_runner_astream():
+    async def main():
+        runner = ProcessRunner(
+            "python -c 'import sys; print(1); sys.stderr.write(\"2\")'")
+        await runner.arun()
+        out = [item async for item in runner.astream()]
+        assert sorted(out) == [("stderr", "2"), ("stdout", "1\n")]
+        assert runner.aproc.returncode == 0
+        runner = ProcessRunner("python -c \"print(1)\"")
+        await runner.arun(shell=True)
+        out, err = io.StringIO(), io.StringIO()
+        assert await runner.awrite_stream_until_stop(out, err) == 0
+        assert out.getvalue() == "1\n"
+
+    asyncio.run(main())
+
+
+def test_runner_astream_early_exit():
+    async def main():
+        runner = ProcessRunner("yes")
+        await runner.arun()
+        batches = runner.astream_batches()
+        async for src, lines in batches:
+            assert src == "stdout"
+            break
+        await batches.aclose()
+        # the endless process is killed and waited
+        assert runner.aproc.returncode is not None
+
+    asyncio.run(asyncio.wait_for(main(), 10))
+
+
+def test_fast_spawn():
+    exe = resolve_executable("python")
+    assert os.path.isabs(exe)
+    assert resolve_executable(exe) == exe
+    assert resolve_executable("not-exist-command-xyz") == \
+        "not-exist-command-xyz"
+    kwargs = {}
+    argv = fast_spawn_argv("python -c 'print(1)'", kwargs)
+    assert argv == [exe, "-c", "print(1)"]
+    if sys.version_info < (3, 10):
+        assert kwargs == {"close_fds": False}
+    runner = ProcessRunner("python -c 'print(1)'")
+    runner.run(fast_spawn=True)
+    assert list(runner.stream()) == [("stdout", "1\n")]
+
+    async def main():
+        runner = ProcessRunner("python -c 'print(1)'")
+        await runner.arun(fast_spawn=True)
+        return [item async for item in runner.astream()]
+
+    assert asyncio.run(main()) == [("stdout", "1\n")]
+
+
+def test_line_decoder():
+    from cmd2func.runner import LineDecoder
+    data = "aéb\nc".encode()
+    decoder = LineDecoder()
+    # split inside the multibyte character
+    assert decoder.feed(data[:2]) == []
+    assert decoder.feed(data[2:]) == ["aéb\n"]
+    assert decoder.flush() == ["c"]
+    decoder = LineDecoder(errors="replace")
+    assert decoder.feed(b"\xff\n") == ["�\n"]
+    decoder = LineDecoder(max_line=4)
+    assert decoder.feed(b"abcdef") == ["abcdef"]
+
+
+def test_long_line():
+    from cmd2func.runner import LineSplitter
+    from cmd2func.session import ShellSessionPool
+    size = 16 << 20
+    code = f"import sys; sys.stdout.write('x' * {size} + '\\\\ny')"
+    pool = ShellSessionPool(1)
+    for factory in (ProcessRunner, SelectorProcessRunner, pool.runner):
+        runner = factory(f"python -c \"{code}\"")
+        runner.run()
+        t0 = time.time()
+        lines = [line for _, batch in runner.stream_batches()
+                 for line in batch]
+        assert time.time() - t0 < 5  # quadratic join take minutes
+        if factory is SelectorProcessRunner:
+            # split at the high water mark
+            assert "".join(lines) == "x" * size + "\ny"
+        else:
+            assert [len(line) for line in lines] == [size + 1, 1]
+    pool.close()
+    splitter = LineSplitter()
+    assert splitter.feed(b"ab") == []
+    assert splitter.feed(b"c\nd") == [b"abc\n"]
+    assert splitter.flush() == [b"d"]
+
+
+def test_stream_batches():
+    code = "import sys; sys.stdout.buffer.write(b'1\\n2\\n\\xff\\n')"
+    for runner_cls in (ProcessRunner, SelectorProcessRunner):
+        runner = runner_cls(f"python -c \"{code}\"")
+        runner.run()
+        g = runner.stream_batches()
+        lines = []
+        while True:
+            try:
+                src, batch = next(g)
+            except StopIteration as e:
+                assert e.value == 0
+                break
+            assert src == "stdout"
+            lines.extend(batch)
+        assert lines == ["1\n", "2\n", "�\n"]
+        assert runner.stats.lines["stdout"] == 3
+        assert runner.stats.bytes["stdout"] == 6
+    out, err = io.StringIO(), io.StringIO()
+    runner = ProcessRunner(f"python -c \"{code}\"", errors="ignore")
+    runner.run()
+    assert runner.write_stream_until_stop(out, err) == 0
+    assert out.getvalue() == "1\n2\n\n"
+
+
+def test_runner_input():
+    data = b"x" * 1000 + b"\n"
+    big = data * 4000  # larger than the pipe buffers in both directions
+    for runner_cls in (ProcessRunner, SelectorProcessRunner):
+        for inp in (big, memoryview(big), io.BytesIO(big),
+                    iter([data] * 4000), big.decode()):
+            runner = runner_cls("cat")
+            runner.run(input=inp)
+            lines = list(runner.stream())
+            assert len(lines) == 4000
+            assert runner.stats.bytes["stdout"] == len(big)
+    # the child exit without reading the input
+    runner = ProcessRunner("true")
+    runner.run(input=iter([data] * 4000))
+    assert list(runner.stream()) == []
+
+    def bad_input():
+        yield b"1\n"
+        raise IOError("bad input")
+
+    for runner_cls in (ProcessRunner, SelectorProcessRunner):
+        runner = runner_cls("cat")
+        runner.run(input=bad_input())
+        out = []
+        try:
+            out.extend(runner.stream())
+        except IOError:
+            pass
+        else:
+            assert False
+        # the stdin is closed, and the child is waited
+        assert out == [("stdout", "1\n")]
+        assert runner.proc.returncode == 0
+
+
+def test_runner_input_async():
+    async def main():
+        runner = ProcessRunner("cat")
+        await runner.arun(input=[b"1\n", "2\n"])
+        return [line async for _, line in runner.astream()]
+
+    assert asyncio.run(main()) == ["1\n", "2\n"]
@@ -0,0 +1,120 @@
+import time
+import asyncio
+import threading
+
+from cmd2func import cmd2func
+from cmd2func.scheduler import (
+    ResourceScheduler, eval_amount, eval_resources, MEMORY_UNITS,
+)
+
+
+def test_eval_resources():
+    assert eval_amount("{n} * 2 + 1", {"n": 3}) == 7
+    assert eval_amount("{n}G", {"n": 2}, MEMORY_UNITS) == 2 << 30
+    assert eval_amount("512 MB", {}, MEMORY_UNITS) == 512 << 20
+    assert eval_amount(4, {}) == 4
+    assert eval_resources(None, {}) == {"cpus": 1, "memory": 0}
+    assert eval_resources({"cpus": "{t}"}, {"t": 4})["cpus"] == 4
+    try:
+        eval_amount("__import__('os')", {})
+    except ValueError:
+        pass
+    else:
+        assert False
+
+
+def test_scheduler_fair():
+    sched = ResourceScheduler(cpus=2)
+    order = []
+    first = sched.acquire({"cpus": 2}, "a")
+    threads = []
+    # caller "a" queue many runs before "b"
+    for caller in ["a", "a", "a", "b"]:
+        def work(caller=caller):
+            with sched.use({"cpus": 2}, caller):
+                order.append(caller)
+        t = threading.Thread(target=work)
+        t.start()
+        threads.append(t)
+        time.sleep(0.05)
+    sched.release(first)
+    for t in threads:
+        t.join()
+    assert order[:2] == ["a", "b"]
+    # larger than the budget is clamped
+    assert sched.acquire({"cpus": 8})["cpus"] == 2
+    assert sched.used["cpus"] == 2
+
+
+def test_scheduler_no_starvation():
+    sched = ResourceScheduler(cpus=2, max_skips=3)
+    stop = threading.Event()
+
+    def cycle(caller):
+        while not stop.is_set():
+            with sched.use({"cpus": 1}, caller):
+                time.sleep(0.01)
+
+    threads = [threading.Thread(target=cycle, args=(c,)) for c in "bc"]
+    for t in threads:
+        t.start()
+    time.sleep(0.05)
+    t0 = time.time()
+    granted = sched.acquire({"cpus": 2}, "a")
+    assert time.time() - t0 < 1.0
+    sched.release(granted)
+    stop.set()
+    for t in threads:
+        t.join()
+    assert sched.used["cpus"] == 0
+
+
+def test_scheduler_async_cancel():
+    sched = ResourceScheduler(cpus=1)
+
+    async def main():
+        first = await sched.aacquire({"cpus": 1}, "a")
+        task = asyncio.ensure_future(sched.aacquire({"cpus": 1}, "b"))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        assert not sched.queues
+        sched.release(first)
+        # granted but cancelled before the waiter resumes
+        task = asyncio.ensure_future(sched.aacquire({"cpus": 1}, "b"))
+        await asyncio.sleep(0)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        assert sched.used["cpus"] == 0
+        granted = await asyncio.wait_for(sched.aacquire({"cpus": 1}), 1)
+        sched.release(granted)
+
+    asyncio.run(main())
+    assert sched.used["cpus"] == 0
+
+
+def test_cmd2func_scheduler():
+    sched = ResourceScheduler(cpus=4, memory=1 << 30)
+    config = {
+        "inputs": {"t": {"type": "int"}},
+        "resources": {"cpus": "{t}", "memory": "512M"},
+    }
+    func = cmd2func(
+        "python -c 'import time; time.sleep(0.2)' {t}", config,
+        scheduler=sched, print_cmd=False)
+    assert func.get_resources((2,), {}) == {
+        "cpus": 2, "memory": 512 << 20}
+    t0 = time.time()
+    res = func.map([1, 1, 1], max_workers=3)
+    # memory allow only 2 runs at once
+    assert time.time() - t0 > 0.4
+    assert [r.ret for r in res] == [0, 0, 0]
+    assert sched.used == {"cpus": 0, "memory": 0}
+
+    @cmd2func(
+        scheduler=sched, resources={"cpus": "{n}"}, print_cmd=False)
+    def echo(n):
+        return f"echo {n}"
+
+    assert echo.get_resources((3,), {})["cpus"] == 3
+    assert echo(3) == 0
@@ -0,0 +1,84 @@
+import io
+import os
+
+from cmd2func import cmd2func
+from cmd2func.session import ShellSessionPool
+
+
+def test_session_runner():
+    pool = ShellSessionPool(1)
+    runner = pool.runner("echo a; printf b; echo c >&2; exit 3")
+    runner.run()
+    g = runner.stream()
+    out = []
+    while True:
+        try:
+            out.append(next(g))
+        except StopIteration as e:
+            ret_code = e.value
+            break
+    assert ret_code == 3
+    assert ("stdout", "a\n") in out
+    assert ("stdout", "b") in out
+    assert ("stderr", "c\n") in out
+    # the session survive the exit of the command
+    shell = pool.sessions[0].proc
+    runner = pool.runner("echo $X; pwd")
+    runner.run(env={"X": "1"}, cwd="/")
+    out = list(runner.stream())
+    assert out == [("stdout", "1\n"), ("stdout", "/\n")]
+    assert pool.sessions[0].proc is shell
+    pool.close()
+
+
+def test_session_restart():
+    pool = ShellSessionPool(1)
+    runner = pool.runner("echo 1")
+    runner.run()
+    list(runner.stream())
+    pool.sessions[0].proc.kill()
+    pool.sessions[0].proc.wait()
+    runner = pool.runner("echo 2")
+    runner.run()
+    assert list(runner.stream()) == [("stdout", "2\n")]
+    pool.close()
+
+
+def test_cmd2func_session():
+    out = io.StringIO()
+
+    @cmd2func(runner="session", out_stream=out)
+    def echo(i):
+        return f"echo {i}; echo $$"
+
+    assert echo(1) == 0
+    assert echo(2) == 0
+    lines = out.getvalue().splitlines()
+    assert lines[0] == "1" and lines[2] == "2"
+    assert lines[1] == lines[3] != str(os.getpid())
+
+
+def test_session_abandoned():
+    pool = ShellSessionPool(1)
+    runner = pool.runner("echo a; sleep .3; echo b")
+    runner.run()
+    g = runner.stream_batches()
+    assert next(g) == ("stdout", ["a\n"])
+    g.close()
+    runner = pool.runner("echo next")
+    runner.run()
+    assert list(runner.stream()) == [("stdout", "next\n")]
+    pool.close()
+
+
+def test_session_syntax_error():
+    out, err = io.StringIO(), io.StringIO()
+    func = cmd2func(
+        "echo {a}", runner="session", print_cmd=False,
+        out_stream=out, err_stream=err)
+    assert func("'x") != 0
+    func("x \\")  # return instead of waiting for the next line
+    out.truncate(0)
+    out.seek(0)
+    assert func("ok") == 0
+    assert out.getvalue() == "ok\n"
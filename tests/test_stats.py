@@ -0,0 +1,48 @@
+import io
+import sys
+
+import pytest
+
+from cmd2func import cmd2func
+from cmd2func.runner import ProcessRunner
+
+
+def test_runner_stats():
+    runner = ProcessRunner(
+        "python -c 'import sys; print(1); print(22); sys.stderr.write(\"e\")'")
+    runner.run()
+    list(runner.stream())
+    stats = runner.stats
+    assert stats.ret_code == 0
+    assert stats.lines == {"stdout": 2, "stderr": 1}
+    assert stats.bytes == {"stdout": 5, "stderr": 1}
+    assert 0 < stats.spawn_latency <= stats.wall_time
+    if sys.platform != "win32":
+        assert stats.user_time is not None
+        assert stats.max_rss > 0
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="no os.wait4")
+def test_runner_stats_signal():
+    runner = ProcessRunner(
+        "python -c 'import os, signal; os.kill(os.getpid(), signal.SIGKILL)'")
+    runner.run()
+    list(runner.stream())
+    assert runner.proc.returncode == -9
+    assert runner.stats.ret_code == -9
+
+
+def test_cmd2func_stats():
+    records = []
+
+    @cmd2func(out_stream=io.StringIO(), stats_callback=records.append)
+    def steps():
+        yield "python -c 'print(1)'"
+        yield "python -c 'print(2)'"
+
+    steps()
+    assert len(steps.last_call_stats) == 2
+    assert steps.last_run_stats is steps.last_call_stats[-1]
+    assert records == steps.last_call_stats
+    assert steps.last_run_stats.cmd == "python -c 'print(2)'"
+    assert steps.last_run_stats.to_dict()["lines"]["stdout"] == 1
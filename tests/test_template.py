@@ -0,0 +1,54 @@
+import pytest
+
+from cmd2func.template import CompiledTemplate, compile_template
+
+
+def test_compiled_template():
+    tpl = CompiledTemplate(
+        "python {verbose} -c 'print({a} + {b})'",
+        config={
+            "inputs": {
+                "verbose": {
+                    "type": "bool",
+                    "true_insert": "-v",
+                    "false_insert": "",
+                },
+                "b": {
+                    "type": "int",
+                    "default": 10,
+                },
+            },
+            "inputs_order": ["a", "b", "verbose"],
+        })
+    assert tpl.render((1, 2, True), {}) == "python -v -c 'print(1 + 2)'"
+    assert tpl.render((1,), {"verbose": False}) == \
+        "python  -c 'print(1 + 10)'"
+    with pytest.raises(TypeError):
+        tpl.render((), {"b": 1, "verbose": True})
+
+
+def test_unbound_placeholder():
+    tpl = CompiledTemplate(
+        "echo {a} {b}",
+        config={"inputs": {}, "inputs_order": ["a"]})
+    with pytest.raises(ValueError):
+        tpl.render((1,), {})
+
+
+def test_compile_template_cache():
+    config = {"inputs": {"a": {"type": "int"}}}
+    tpl1 = compile_template("echo {a}", config)
+    tpl2 = compile_template("echo {a}", {"inputs": {"a": {"type": "int"}}})
+    assert tpl1 is tpl2
+    assert "name" not in config  # config is not modified
+    assert compile_template("echo {a}") is not tpl1
+    # the types of the defaults are part of the key
+    for default in ((1, 2), [1, 2]):
+        tpl = compile_template("echo {a}", {
+            "inputs": {"a": {"type": "str", "default": default}}})
+        assert tpl.render((), {}) == f"echo {default}"
+
+
+def test_compile_format():
+    assert CompiledTemplate("echo 100%").render((), {}) == "echo 100%"
+    assert CompiledTemplate("echo {a} {b}%").render((1, 2), {}) == "echo 1 2%"
@@ -0,0 +1,57 @@
+import asyncio
+import io
+import json
+
+from cmd2func import cmd2func
+from cmd2func.trace import Tracer
+
+
+def test_trace_workflow(tmp_path):
+    path = tmp_path / "trace.json"
+    with Tracer(str(path)) as tracer:
+        @cmd2func(print_cmd=False, out_stream=io.StringIO(), tracer=tracer)
+        def workflow():
+            yield "python -c 'print(1)'"
+            yield ["python -c 'print(2)'", "python -c 'print(3)'"]
+
+        workflow()
+    events = json.loads(path.read_text())["traceEvents"]
+    spans = [e for e in events if e["ph"] == "X"]
+    names = [e["name"] for e in spans]
+    for name in ("call", "format", "workflow", "step", "run", "process",
+                 "spawn", "drain"):
+        assert name in names
+    assert names.count("process") == 3
+    assert names.count("step") == 2
+    assert sum(e["name"] == "first output" for e in events) == 3
+
+    def span(name):
+        return next(e for e in spans if e["name"] == name)
+
+    # nested by time
+    for outer, inner in (
+            ("call", "workflow"), ("workflow", "step"), ("step", "run"),
+            ("run", "process"), ("process", "spawn")):
+        o, i = span(outer), span(inner)
+        assert o["ts"] <= i["ts"] + 1
+        assert i["ts"] + i["dur"] <= o["ts"] + o["dur"] + 1
+    assert span("process")["args"]["ret_code"] == 0
+
+
+def test_trace_off():
+    func = cmd2func("python -c 'print({a})'", print_cmd=False)
+    assert func.tracer is None
+    assert func(1) == 0
+
+
+def test_trace_async(tmp_path):
+    path = tmp_path / "trace.json"
+    with Tracer(str(path)) as tracer:
+        func = cmd2func(
+            "python -c 'print({a})'", print_cmd=False,
+            out_stream=io.StringIO(), tracer=tracer)
+        assert asyncio.run(func.acall(1)) == 0
+    events = json.loads(path.read_text())["traceEvents"]
+    names = [e["name"] for e in events if e["ph"] == "X"]
+    for name in ("process", "spawn", "drain"):
+        assert name in names
@@ -1,7 +1,10 @@
 import sys
 import io
+import time
 
-from cmd2func.utils import Tee
+import pytest
+
+from cmd2func.utils import Tee, get_fds, TailBuffer, SpillBuffer, FanOut
 from cmd2func import cmd2func
 
 
@@ -20,3 +23,111 @@ def test_print_at_same_time():
     func = cmd2func("python -c 'print({a} + {b})'", out_stream=t)
     func(1, 2)
     assert out.getvalue().strip() == "3"
+
+
+def test_get_fds(tmp_path):
+    assert get_fds(io.StringIO()) is None
+    with open(tmp_path / "a", "w") as f1, open(tmp_path / "b", "w") as f2:
+        assert get_fds(f1) == [f1.fileno()]
+        assert get_fds(Tee(f1, f2)) == [f1.fileno(), f2.fileno()]
+        assert get_fds(Tee(f1, io.StringIO())) is None
+
+
+def test_tail_buffer():
+    buf = TailBuffer(max_lines=3)
+    for i in range(10):
+        buf.write(f"line{i}\n")
+    buf.write("part")
+    assert buf.getvalue() == "line7\nline8\nline9\npart"
+    assert buf.tail(2) == "line9\npart"
+    buf = TailBuffer(max_lines=None, max_chars=8)
+    buf.write("abcdef\n123\n")
+    assert buf.getvalue() == "def\n123\n"
+    buf.write("x" * 20)
+    assert buf.getvalue() == "x" * 8
+
+
+def test_spill_buffer(tmp_path):
+    buf = SpillBuffer(max_memory=10, dir=str(tmp_path))
+    buf.write("0123456789")
+    assert not buf.spilled
+    lines = "".join(f"línea {i}\n" for i in range(20000))
+    buf.write(lines)
+    assert buf.spilled
+    assert buf.head.getvalue() == "0123456789"
+    assert buf.getvalue() == "0123456789" + lines
+    assert buf.tail(2) == "línea 19998\nlínea 19999\n"
+    buf.close()
+
+    err = SpillBuffer(max_memory=4)
+    func = cmd2func(
+        "python -c 'import sys; sys.stderr.write(\"a\\nb\\nc\\n\")'",
+        err_stream=err)
+    func()
+    assert err.tail(1) == "c\n"
+    assert err.getvalue() == "a\nb\nc\n"
+
+
+class SlowSink(io.StringIO):
+    def __init__(self, delay):
+        super().__init__()
+        self.delay = delay
+
+    def write(self, s):
+        time.sleep(self.delay)
+        return super().write(s)
+
+
+def test_fan_out():
+    lines = [f"line{i}\n" for i in range(50)]
+    text = "".join(lines)
+    for policy in ("block", "spill"):
+        fast, slow = io.StringIO(), SlowSink(0.005)
+        fan = FanOut(fast, slow, max_buffer=20, policy=policy)
+        for line in lines:
+            fan.write(line)
+        fan.close()
+        assert fast.getvalue() == text
+        assert slow.getvalue() == text
+    # a slow sink does not hold up the writer
+    fast, slow = io.StringIO(), SlowSink(0.05)
+    fan = FanOut(fast, slow, max_buffer=20, policy="drop_oldest")
+    t0 = time.time()
+    for line in lines:
+        fan.write(line)
+    assert time.time() - t0 < 0.5
+    m_fast, m_slow = fan.metrics()
+    assert m_slow["lag"] > 0
+    assert m_slow["buffered"] <= 20
+    fan.close()
+    m_fast, m_slow = fan.metrics()
+    for m in (m_fast, m_slow):
+        assert m["written"] + m["dropped"] == len(text)
+    assert m_slow["dropped"] > 0
+    assert slow.getvalue().endswith(lines[-1])
+
+
+def test_fan_out_spill(tmp_path):
+    slow = SlowSink(0.01)
+    fan = FanOut(slow, max_buffer=10, policy="spill", spill_dir=str(tmp_path))
+    for i in range(20):
+        fan.write(f"{i}é\n")
+    assert fan.metrics()[0]["spilled"] > 0
+    assert fan.drain()
+    assert slow.getvalue() == "".join(f"{i}é\n" for i in range(20))
+    assert fan.metrics()[0]["spill_pending"] == 0
+    fan.close()
+
+
+def test_fan_out_error():
+    class BadSink(io.StringIO):
+        def write(self, s):
+            raise OSError("disk full")
+
+    out = io.StringIO()
+    fan = FanOut(out, BadSink())
+    func = cmd2func("python -c 'print({a} + {b})'", out_stream=fan)
+    func(1, 2)
+    with pytest.raises(OSError):
+        fan.drain()
+    assert out.getvalue() == "3\n"
@@ -0,0 +1,78 @@
+import io
+import os
+import time
+import asyncio
+
+from cmd2func import cmd2func
+from cmd2func.workflow import Parallel, Task
+from cmd2func.checkpoint import Journal
+
+
+def sleep_cmd(t, code=0):
+    return f"python -c 'import time, sys; time.sleep({t}); sys.exit({code})'"
+
+
+def test_parallel_steps():
+    out = io.StringIO()
+
+    @cmd2func(out_stream=out, print_cmd=False)
+    def workflow():
+        r1 = yield [sleep_cmd(0.8), sleep_cmd(0.8, 1)]
+        r2 = yield {"a": sleep_cmd(0.8), "b": sleep_cmd(0.8, 2)}
+        r3 = yield 'python -c "print(1)"'
+        return r1, r2, r3
+
+    t0 = time.time()
+    r1, r2, r3 = workflow()
+    assert time.time() - t0 < 3.0  # 3.2 if run serially
+    assert r1 == [0, 1]
+    assert r2 == {"a": 0, "b": 2}
+    assert r3 == 0
+    assert out.getvalue() == "1\n"
+
+
+def test_parallel_max_workers():
+    @cmd2func(print_cmd=False)
+    def workflow():
+        return (yield Parallel([sleep_cmd(0.3)] * 3, max_workers=1))
+
+    t0 = time.time()
+    assert workflow() == [0, 0, 0]
+    assert time.time() - t0 > 0.8
+
+
+def test_parallel_steps_async():
+    @cmd2func(print_cmd=False, max_parallel=2)
+    def workflow():
+        return (yield [sleep_cmd(0.1), sleep_cmd(0.1, 3), sleep_cmd(0.1)])
+
+    assert asyncio.run(workflow.acall()) == [0, 3, 0]
+
+
+def test_checkpoint(tmp_path):
+    src, dst = tmp_path / "a.txt", tmp_path / "b.txt"
+    log = tmp_path / "log.txt"
+    src.write_text("x")
+    journal = Journal(tmp_path / "journal.jsonl")
+
+    @cmd2func(print_cmd=False, checkpoint=journal)
+    def workflow():
+        r1 = yield Task(f"cp {src} {dst}", inputs=[src], outputs=[dst])
+        r2 = yield [f"sh -c 'echo 1 >> {log}'", "false"]
+        return r1, r2
+
+    assert workflow() == (0, [0, 1])
+    assert workflow() == (0, [0, 1])
+    # the failed step is run again, the completed ones are skipped
+    assert log.read_text() == "1\n"
+    assert len(Journal(journal.path).entries) == 2
+    dst.unlink()
+    mtime = src.stat().st_mtime_ns
+    assert workflow() == (0, [0, 1])
+    assert dst.read_text() == "x"
+    # the input is changed
+    src.write_text("yy")
+    os.utime(src, ns=(mtime + 10**9, mtime + 10**9))
+    assert asyncio.run(workflow.acall()) == (0, [0, 1])
+    assert dst.read_text() == "yy"
+    assert log.read_text() == "1\n"